@@ -0,0 +1,27 @@
+# django
+from django.contrib import admin
+
+# local
+from .models import AuditEntry
+from digitalFablog.routers import ReplicaChangelistMixin
+
+
+class AuditEntryAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    """Read only. Filter by object with ?content_type__id__exact=<type>&object_id=<id>"""
+    list_display = ('timestamp', 'user', 'action', 'content_type', 'object_id', 'parent_type', 'parent_id', 'changes')
+    list_filter = ('action', 'content_type')
+    list_select_related = ('user', 'content_type', 'parent_type')
+    raw_id_fields = ('user', )
+    date_hierarchy = 'timestamp'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(AuditEntry, AuditEntryAdmin)
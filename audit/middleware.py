@@ -0,0 +1,13 @@
+# local
+from .recorder import collect
+
+
+class AuditMiddleware:
+    """Collects the audit entries of a request, with its user, and writes them with one query at the end"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect(request):
+            return self.get_response(request)
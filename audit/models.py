@@ -0,0 +1,108 @@
+# base
+import json
+
+# django
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class AuditEntryQuerySet(models.QuerySet):
+    """Append-only: entries are only ever inserted"""
+
+    def update(self, **kwargs):
+        raise TypeError("Audit entries can't be changed")
+
+    def delete(self):
+        raise TypeError("Audit entries can't be deleted")
+
+    def for_object(self, instance):
+        """Changes of an object and of its child rows (e.g. the machines used of a fablog), oldest first"""
+        content_type = ContentType.objects.get_for_model(instance)
+        return self.filter(
+            Q(content_type=content_type, object_id=instance.pk) | Q(parent_type=content_type, parent_id=instance.pk)
+        ).order_by('timestamp', 'id')
+
+    def by_user(self, user):
+        return self.filter(user_id=user.pk).order_by('-timestamp', '-id')
+
+
+class AuditEntry(models.Model):
+    """A change of one object: the values of its changed fields before and after"""
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = (
+        (CREATE, _('created')),
+        (UPDATE, _('changed')),
+        (DELETE, _('deleted')),
+    )
+    timestamp = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("timestamp"))
+    # no foreign key constraint, deleting a user must not touch the audit log
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        verbose_name=_("user"))
+    action = models.CharField(
+        max_length=6,
+        choices=ACTION_CHOICES,
+        verbose_name=_("action"))
+    content_type = models.ForeignKey(
+        ContentType,
+        related_name='+',
+        on_delete=models.PROTECT,
+        verbose_name=_("object type"))
+    object_id = models.PositiveIntegerField(
+        verbose_name=_("object id"))
+    parent_type = models.ForeignKey(
+        ContentType,
+        related_name='+',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        verbose_name=_("parent type"),
+        help_text=_("e.g. the fablog of machines used"))
+    parent_id = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("parent id"))
+    changes = models.TextField(
+        verbose_name=_("changes"),
+        help_text=_("JSON object of the changed fields: {field: [before, after]}"))
+
+    objects = AuditEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("audit entry")
+        verbose_name_plural = _("audit entries")
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'timestamp']),
+            models.Index(fields=['parent_type', 'parent_id', 'timestamp']),
+            models.Index(fields=['user', '-timestamp']),
+            models.Index(fields=['-timestamp'])]
+
+    def __str__(self):
+        return "{0} {1} {2} {3}".format(
+            self.timestamp.strftime('%d.%m.%Y %H:%M:%S'), self.get_action_display(), self.content_type_id,
+            self.object_id)
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise TypeError("Audit entries can't be changed")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("Audit entries can't be deleted")
+
+    def get_changes(self):
+        return json.loads(self.changes)
@@ -0,0 +1,122 @@
+"""
+    recording of field level changes into the audit log
+
+    The field values of an audited object are remembered when it is loaded or saved (post_init, post_save),
+    so the changes of a save or delete are known without reading the row again. Entries are recorded when
+    the transaction of the change commits, and dropped with it if it is rolled back. Within collect(), e.g.
+    a request (see audit.middleware), the entries are written together with one bulk_create at the end,
+    otherwise each one right away.
+"""
+# base
+import json
+import threading
+from contextlib import contextmanager
+
+# django
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+from django.utils import timezone
+
+# local
+from .models import AuditEntry
+
+# audited models and the field of their parent (the fablog of machines used, ...)
+audited = {}
+
+_local = threading.local()
+
+
+def register(model, parent=None):
+    audited[model] = parent
+
+
+def tracked_fields(model):
+    return [field for field in model._meta.concrete_fields if not field.primary_key]
+
+
+def remember(instance):
+    """Remember the current field values, skipping deferred fields (loading them would need a query)"""
+    values = instance.__dict__
+    instance._audit_values = {
+        field.attname: values[field.attname] for field in tracked_fields(type(instance)) if field.attname in values}
+
+
+def changes_of(instance, action):
+    """{field: [before, after]} of an instance being created, updated or deleted"""
+    before = getattr(instance, '_audit_values', {})
+    changes = {}
+    for field in tracked_fields(type(instance)):
+        if field.attname not in instance.__dict__:
+            continue
+        value = instance.__dict__[field.attname]
+        if action == AuditEntry.CREATE:
+            changes[field.name] = [None, value]
+        elif action == AuditEntry.DELETE:
+            changes[field.name] = [before.get(field.attname, value), None]
+        elif field.attname in before and before[field.attname] != value:
+            changes[field.name] = [before[field.attname], value]
+    return changes
+
+
+class Collector:
+    """Audit entries of a request, written at its end"""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.entries = []
+        self.open = True
+
+    def user_id(self):
+        user = getattr(self.request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+
+def current():
+    return getattr(_local, 'collector', None)
+
+
+@contextmanager
+def collect(request=None):
+    """Buffer the audit entries recorded inside, and write them with one query at the end"""
+    collector, previous = Collector(request), current()
+    _local.collector = collector
+    try:
+        yield collector
+    finally:
+        _local.collector = previous
+        collector.open = False
+        write(collector.entries)
+
+
+def write(entries):
+    if entries:
+        AuditEntry.objects.bulk_create(entries)
+
+
+def record(instance, action, changes):
+    """Add an entry for a change of an audited object, once its transaction commits"""
+    if not changes:
+        return
+    parent = audited.get(type(instance))
+    parent_id = getattr(instance, parent + '_id', None) if parent else None
+    collector = current()
+    entry = AuditEntry(
+        timestamp=timezone.now(),
+        user_id=collector.user_id() if collector else None,
+        action=action,
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk,
+        parent_type=ContentType.objects.get_for_model(
+            instance._meta.get_field(parent).related_model) if parent_id else None,
+        parent_id=parent_id,
+        changes=json.dumps(changes, cls=DjangoJSONEncoder, sort_keys=True))
+
+    def committed():
+        if collector is not None and collector.open:
+            collector.entries.append(entry)
+        else:
+            write([entry])
+
+    # right away outside of a transaction
+    transaction.on_commit(committed, using=router.db_for_write(type(instance), instance=instance))
@@ -0,0 +1,42 @@
+# django
+from django.db.models.signals import post_delete, post_init, post_save
+
+# local
+from .models import AuditEntry
+from .recorder import audited, changes_of, record, register, remember
+from cashier.models import Booking, CashCount, Payment
+from fablog.models import Fablog, FablogBookings, FablogMemberships, FablogPayments, MachinesUsed, MaterialsUsed
+
+register(Fablog)
+register(MachinesUsed, parent='fablog')
+register(MaterialsUsed, parent='fablog')
+register(FablogMemberships, parent='fablog')
+register(FablogPayments, parent='fablog')
+register(FablogBookings, parent='fablog')
+register(Payment)
+register(Booking)
+register(CashCount)
+
+
+def remember_values(sender, instance, **kwargs):
+    remember(instance)
+
+
+def record_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        # loading fixtures
+        return
+    action = AuditEntry.CREATE if created else AuditEntry.UPDATE
+    record(instance, action, changes_of(instance, action))
+    remember(instance)
+
+
+def record_delete(sender, instance, **kwargs):
+    record(instance, AuditEntry.DELETE, changes_of(instance, AuditEntry.DELETE))
+
+
+for model in audited:
+    uid = 'audit_' + model._meta.label_lower
+    post_init.connect(remember_values, sender=model, dispatch_uid=uid)
+    post_save.connect(record_save, sender=model, dispatch_uid=uid)
+    post_delete.connect(record_delete, sender=model, dispatch_uid=uid)
@@ -0,0 +1,75 @@
+# base
+from datetime import date
+from decimal import Decimal
+
+# django
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+# local
+from audit.middleware import AuditMiddleware
+from audit.models import AuditEntry
+from cashier.models import Booking, Journal
+from members.models import User
+
+
+class AuditTest(TransactionTestCase):
+    """Committed changes of audited objects are written at the end of the request, rolled back ones never"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='labmanager@example.com', first_name='Lab', last_name='Manager', street_and_number='-',
+            zip_code='8000', city='Zürich', phone='-', birthday=date(1990, 1, 1))
+        self.journal = Journal.objects.create(number=1000, name='Kasse', default_account=True)
+
+    def request(self, view):
+        request = RequestFactory().post('/')
+        request.user = self.user
+        with CaptureQueriesContext(connection) as queries:
+            AuditMiddleware(view)(request)
+        table = connection.ops.quote_name(AuditEntry._meta.db_table)
+        return [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO ' + table)]
+
+    def book(self, amount):
+        return Booking.objects.create(journal=self.journal, account='3000', amount=Decimal(amount))
+
+    def entries(self):
+        return AuditEntry.objects.filter(content_type=ContentType.objects.get_for_model(Booking))
+
+    def test_one_insert_per_request(self):
+        def view(request):
+            booking = self.book('10.00')
+            with transaction.atomic():
+                self.book('20.00')
+            booking.text = 'corrected'
+            booking.save()
+            return HttpResponse()
+
+        self.assertEqual(len(self.request(view)), 1)
+        self.assertEqual(
+            sorted(self.entries().values_list('action', 'user')),
+            [(AuditEntry.CREATE, self.user.pk), (AuditEntry.CREATE, self.user.pk), (AuditEntry.UPDATE, self.user.pk)])
+
+    def test_rolled_back_changes(self):
+        def view(request):
+            with transaction.atomic():
+                self.book('10.00')
+                try:
+                    with transaction.atomic():
+                        self.book('20.00')
+                        raise ValueError
+                except ValueError:
+                    pass
+            try:
+                with transaction.atomic():
+                    self.book('30.00')
+                    raise ValueError
+            except ValueError:
+                pass
+            return HttpResponse()
+
+        self.assertEqual(len(self.request(view)), 1)
+        self.assertEqual([entry.get_changes()['amount'][1] for entry in self.entries()], ['10.00'])
@@ -2,7 +2,9 @@
 from django.contrib import admin
 
 # local
-from .models import CashCount, Journal, Payment, PaymentMethod, Booking, JournalBalance
+from .models import (ArchivedBooking, CashCount, DailyReport, Journal, Payment, PaymentMethod, Booking, JournalBalance,
+                     OpeningBalance)
+from digitalFablog.routers import ReplicaChangelistMixin
 
 
 class BookingInline(admin.TabularInline):
@@ -16,13 +18,43 @@ class CashCountInline(admin.TabularInline):
     extra = 1
 
 
-class JournalAdmin(admin.ModelAdmin):
+class JournalAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     inlines = (BookingInline, CashCountInline)
 
 
-admin.site.register(CashCount)
+class ReplicaAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    pass
+
+
+class DailyReportAdmin(admin.ModelAdmin):
+    """Read only, reports are stored when a day is closed"""
+    list_display = ('fabday', 'created_at', 'created_by')
+    list_select_related = ('fabday', 'created_by')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedBookingAdmin(ReplicaChangelistMixin, DailyReportAdmin):
+    """Read only, bookings are archived by archive_bookings"""
+    list_display = ('id', 'timestamp', 'journal', 'account', 'amount', 'financial_year')
+    list_filter = ('journal', 'financial_year')
+    list_select_related = ('journal', )
+    raw_id_fields = ('fablog', 'cash_count')
+
+
+admin.site.register(CashCount, ReplicaAdmin)
 admin.site.register(Journal, JournalAdmin)
-admin.site.register(Payment)
+admin.site.register(Payment, ReplicaAdmin)
 admin.site.register(PaymentMethod)
-admin.site.register(Booking)
-admin.site.register(JournalBalance)
+admin.site.register(Booking, ReplicaAdmin)
+admin.site.register(JournalBalance, ReplicaAdmin)
+admin.site.register(DailyReport, DailyReportAdmin)
+admin.site.register(ArchivedBooking, ArchivedBookingAdmin)
+admin.site.register(OpeningBalance)
@@ -0,0 +1,90 @@
+# base
+from datetime import datetime
+
+# django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+# local
+from audit.recorder import collect
+from cashier.models import (ArchivedBooking, Booking, CashCount, JournalBalance, OpeningBalance,
+                            financial_year)
+from fablog.models import FablogBookings
+from stats.rollups import refresh
+
+# rows inserted or deleted per query
+CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the bookings and balances of the financial years up to YEAR into the archive (ArchivedBooking) "
+        "and carry the balances forward into YEAR + 1 (OpeningBalance), so the booking and balance tables only "
+        "hold the open years. The daily reports and the statistics of the archived days are stored first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int, help="last financial year to archive")
+        parser.add_argument('--dry-run', action='store_true', help="only count the bookings")
+
+    def handle(self, *args, **options):
+        year = options['year']
+        if year >= timezone.localdate().year:
+            raise CommandError("{0} is not over yet, only past financial years can be archived.".format(year))
+        end = timezone.make_aware(datetime(year + 1, 1, 1))
+        bookings = Booking.objects.filter(timestamp__lt=end)
+        journals = bookings.order_by().values('journal').annotate(count=Count('id'), last_balance=Max('balance'))
+        if not journals:
+            self.stdout.write("No bookings up to {0}.".format(year))
+            return
+        for journal in journals:
+            self.stdout.write("Journal {0}: {1} bookings".format(journal['journal'], journal['count']))
+        if options['dry_run']:
+            return
+
+        # both are built from the bookings, which are gone afterwards
+        call_command('close_fabdays', until_year=year, stdout=self.stdout)
+        refresh()
+
+        db = router.db_for_write(Booking)
+        # the deletes below are recorded in the audit log, with one bulk insert at the end
+        with collect(), transaction.atomic(using=db):
+            for balance in JournalBalance.objects.filter(pk__in=[journal['last_balance'] for journal in journals]):
+                OpeningBalance.objects.update_or_create(
+                    journal_id=balance.journal_id, financial_year=year + 1, defaults={
+                        'balance_expected': balance.balance_expected,
+                        'balance_counted': balance.balance_counted})
+
+            archived = []
+            for row in bookings.order_by('id').values(
+                    'id', 'booking_type', 'journal', 'account', 'timestamp', 'amount', 'text', 'balance',
+                    'balance__balance_expected', 'balance__balance_counted', 'fablogbookings__fablog',
+                    'cashcount').iterator():
+                archived.append(ArchivedBooking(
+                    id=row['id'], financial_year=financial_year(row['timestamp']),
+                    booking_type=row['booking_type'], journal_id=row['journal'], account=row['account'],
+                    timestamp=row['timestamp'], amount=row['amount'], text=row['text'], balance_id=row['balance'],
+                    balance_expected=row['balance__balance_expected'],
+                    balance_counted=row['balance__balance_counted'], fablog_id=row['fablogbookings__fablog'],
+                    cash_count_id=row['cashcount']))
+                if len(archived) == CHUNK_SIZE:
+                    ArchivedBooking.objects.bulk_create(archived)
+                    archived = []
+            ArchivedBooking.objects.bulk_create(archived)
+
+            # the archived bookings keep their fablog and cash count (see Fablog.total_bookings)
+            for cash_count in CashCount.objects.filter(booking__timestamp__lt=end):
+                cash_count.booking = None
+                cash_count.save(update_fields=['booking'])
+            booking_ids = list(bookings.order_by('id').values_list('id', flat=True))
+            balance_ids = list(bookings.order_by('id').values_list('balance', flat=True))
+            for i in range(0, len(booking_ids), CHUNK_SIZE):
+                chunk = booking_ids[i:i + CHUNK_SIZE]
+                FablogBookings.objects.filter(booking__in=chunk).delete()
+                Booking.objects.filter(pk__in=chunk).delete()
+            for i in range(0, len(balance_ids), CHUNK_SIZE):
+                JournalBalance.objects.filter(pk__in=balance_ids[i:i + CHUNK_SIZE]).delete()
+        self.stdout.write(self.style.SUCCESS("Archived the bookings up to {0}.".format(year)))
@@ -1,3 +1,6 @@
+# base
+import json
+
 # django
 from django.db import models
 from django.utils import timezone
@@ -46,6 +49,8 @@ class JournalBalance(models.Model):
         'Journal',
         related_name='journals',
         on_delete=models.PROTECT,
+        # no index of its own, the composite indexes in Meta.indexes start with it
+        db_index=False,
         verbose_name=_('journal'),
         help_text=pgettext(
             'Cashier',
@@ -68,6 +73,8 @@ class JournalBalance(models.Model):
     class Meta:
         verbose_name = _('Journal Balance')
         verbose_name_plural = _('Journal Balances')
+        # the latest balance of a journal
+        indexes = [models.Index(fields=['journal', 'id'])]
         permissions = (
             ('view_journal_balance', _('Can view journal balances')),)
 
@@ -101,6 +108,8 @@ class Booking(models.Model):
         'Journal',
         related_name='bookings',
         on_delete=models.PROTECT,
+        # no index of its own, the composite indexes in Meta.indexes start with it
+        db_index=False,
         verbose_name=_('journal'),
         help_text=pgettext(
             'Cashier',
@@ -146,6 +155,9 @@ class Booking(models.Model):
         verbose_name = _('Booking')
         verbose_name_plural = _('Bookings')
         ordering = ['-timestamp', ]
+        indexes = [
+            models.Index(fields=['journal', '-timestamp']),
+            models.Index(fields=['-timestamp'])]
         permissions = (
             ('view_bookings', _('Can view bookings')),)
 
@@ -161,9 +173,11 @@ class Booking(models.Model):
 
     def save(self, *args, **kwargs):
         # get previous balance
-        if JournalBalance.objects.filter(journal=self.journal).exists():
-            last_balance = JournalBalance.objects.filter(
-                journal=self.journal).order_by('id').last()
+        last_balance = JournalBalance.objects.filter(journal=self.journal).order_by('id').last()
+        if last_balance is None:
+            # all balances of the journal archived, continue from the balance carried forward
+            last_balance = OpeningBalance.objects.filter(journal=self.journal).order_by('financial_year').last()
+        if last_balance is not None:
             last_balance_expected = last_balance.balance_expected
             last_balance_counted = last_balance.balance_counted
         else:
@@ -186,6 +200,132 @@ class Booking(models.Model):
         super(Booking, self).save(*args, **kwargs)
 
 
+def financial_year(timestamp):
+    """Financial years are calendar years (see Fablog.get_positions)"""
+    return timezone.localtime(timestamp).year
+
+
+class OpeningBalance(models.Model):
+    """
+    Balance of a journal carried forward into a financial year, written when the years before are archived
+    (see archive_bookings). Booking.save continues from it once all balances of the journal are archived.
+    """
+    journal = models.ForeignKey(
+        'Journal',
+        related_name='opening_balances',
+        on_delete=models.PROTECT,
+        verbose_name=_('journal'))
+    financial_year = models.PositiveSmallIntegerField(
+        verbose_name=_('financial year'))
+    balance_expected = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        verbose_name=_('Balance expected'))
+    balance_counted = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        verbose_name=_('Balance true'))
+
+    class Meta:
+        verbose_name = _('opening balance')
+        verbose_name_plural = _('opening balances')
+        ordering = ['journal', 'financial_year']
+        unique_together = ('journal', 'financial_year')
+
+    def __str__(self):
+        return _('%(journal)s %(year)s: %(true)s (%(expected)s)') % {
+            'journal': self.journal_id,
+            'year': self.financial_year,
+            'true': self.balance_counted,
+            'expected': self.balance_expected}
+
+
+class ArchivedBooking(models.Model):
+    """
+    A booking of an archived financial year, moved out of Booking together with its balance and the fablog or
+    cash count it belonged to (see archive_bookings). Keeps the ids it had.
+    """
+    id = models.IntegerField(
+        primary_key=True)
+    financial_year = models.PositiveSmallIntegerField(
+        verbose_name=_('financial year'))
+    booking_type = models.PositiveSmallIntegerField(
+        choices=Booking.BOOKING_TYPE_CHOICES,
+        verbose_name=_('booking type'))
+    journal = models.ForeignKey(
+        'Journal',
+        related_name='archived_bookings',
+        on_delete=models.PROTECT,
+        # no index of its own, the composite index in Meta.indexes starts with it
+        db_index=False,
+        verbose_name=_('journal'))
+    account = models.CharField(
+        max_length=4,
+        verbose_name=_("contra account"))
+    timestamp = models.DateTimeField(
+        verbose_name=_('Date & Time'))
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name=_('amount'))
+    text = models.CharField(
+        max_length=1000,
+        blank=True,
+        verbose_name=_('booking text'))
+    balance_id = models.IntegerField(
+        verbose_name=_('Balance'),
+        help_text=_('id of the JournalBalance after the booking'))
+    balance_expected = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        verbose_name=_('Balance expected'))
+    balance_counted = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        verbose_name=_('Balance true'))
+    fablog = models.ForeignKey(
+        'fablog.Fablog',
+        related_name='archived_bookings',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name=_('fablog'))
+    cash_count = models.ForeignKey(
+        'CashCount',
+        related_name='archived_bookings',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name=_('cash count'))
+
+    class Meta:
+        verbose_name = _('archived booking')
+        verbose_name_plural = _('archived bookings')
+        ordering = ['-timestamp', ]
+        indexes = [models.Index(fields=['journal', 'financial_year', '-timestamp'])]
+
+    def __str__(self):
+        name = _('%(datetime)s | %(type)s | %(journal)s - %(account)s:  %(amount)s ') % {
+            'type': self.get_booking_type_display(),
+            'datetime': self.timestamp.strftime('%d.%m.%Y %H:%M'),
+            'journal': self.journal_id,
+            'account': self.account,
+            'amount': self.amount
+            }
+        return name
+
+    @property
+    def balance(self):
+        """The archived balance, like Booking.balance"""
+        return JournalBalance(
+            id=self.balance_id, journal_id=self.journal_id, balance_expected=self.balance_expected,
+            balance_counted=self.balance_counted)
+
+
 class Payment(models.Model):
     """
     A Payment for a fablog
@@ -338,6 +478,7 @@ class CashCount(models.Model):
         verbose_name = _('cash count')
         verbose_name_plural = _('cash counts')
         ordering = ['-cashier_date', '-created_at']
+        indexes = [models.Index(fields=['-cashier_date', '-created_at'])]
         permissions = (
             ('view_cash_counts', _('Can view cash counts')),)
 
@@ -347,3 +488,65 @@ class CashCount(models.Model):
             'date': self.cashier_date.strftime('%d.%m.%Y'),
             'total': self.total}
         return name
+
+
+class DailyReportQuerySet(models.QuerySet):
+    """Snapshots are only ever inserted"""
+
+    def update(self, **kwargs):
+        raise TypeError("Daily reports can't be changed")
+
+    def delete(self):
+        raise TypeError("Daily reports can't be deleted")
+
+
+class DailyReport(models.Model):
+    """
+    Snapshot of the daily close report of a FabDay (see cashier.reports), stored when the day is closed.
+
+    Immutable, the report of a closed day is never recomputed.
+    """
+    fabday = models.OneToOneField(
+        'fablog.FabDay',
+        related_name='daily_report',
+        on_delete=models.PROTECT,
+        verbose_name=_('fabday'))
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('created at'))
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='daily_reports',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        verbose_name=_('created by'),
+        help_text=pgettext(
+            'DailyReport',
+            'Labmanager who closed the day, empty if closed by close_fabdays'))
+    data = models.TextField(
+        verbose_name=_('report'),
+        help_text=_('JSON of the report'))
+
+    objects = DailyReportQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('daily report')
+        verbose_name_plural = _('daily reports')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return _('%(name)s %(date)s') % {
+            'name': self._meta.verbose_name,
+            'date': self.fabday.date.strftime('%d.%m.%Y')}
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise TypeError("Daily reports can't be changed")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("Daily reports can't be deleted")
+
+    def get_data(self):
+        return json.loads(self.data)
@@ -0,0 +1,213 @@
+"""
+    daily close report of a FabDay
+
+    Revenue per contra account, payment method, machine, material and membership, the donations, the open
+    fablogs and the cash expected and counted per journal. Built from a few grouped queries; machines and
+    memberships are priced in Python from one query each, since their price depends on the price list
+    valid at the time. Once the day is closed the report is stored as a DailyReport and never recomputed.
+"""
+# base
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+# django
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils.translation import gettext as _
+
+# local
+from .models import Booking, CashCount, DailyReport, Payment
+
+CENTS = Decimal('0.01')
+
+
+def cents(amount):
+    # sums of decimals come back with float noise from SQLite
+    return Decimal(amount or 0).quantize(CENTS)
+
+
+def fablog_counts(fabday):
+    Fablog = apps.get_model('fablog', 'Fablog')
+    closed = Q(closed_at__isnull=False)
+    return Fablog.objects.filter(fabday=fabday).aggregate(
+        closed=Count('id', filter=closed),
+        open=Count('id', filter=Q(closed_at__isnull=True)),
+        donations=Sum('donation', filter=closed))
+
+
+def account_bookings(fabday):
+    """{(journal id, contra account): (count, amount)} of the bookings of the day's fablogs"""
+    bookings = Booking.objects.filter(booking_type=Booking.BOOKING, fablogbookings__fablog__fabday=fabday).order_by()
+    return {
+        (row['journal'], row['account']): (row['count'], cents(row['amount']))
+        for row in bookings.values('journal', 'account').annotate(count=Count('id'), amount=Sum('amount'))}
+
+
+def payment_methods(fabday):
+    payments = Payment.objects.filter(fablogpayments__fablog__fabday=fabday).order_by('payment_method__short_name')
+    return [
+        {'name': '{0} ({1})'.format(row['payment_method__short_name'], row['payment_method__long_name']),
+         'count': row['count'], 'amount': cents(row['amount'])}
+        for row in payments.values('payment_method__short_name', 'payment_method__long_name').annotate(
+            count=Count('id'), amount=Sum('amount'))]
+
+
+def machines(fabday):
+    MachinesUsed = apps.get_model('fablog', 'MachinesUsed')
+    rows = {}
+    for used in MachinesUsed.objects.filter(
+            fablog__fabday=fabday, fablog__closed_at__isnull=False, machine__isnull=False).select_related('machine'):
+        row = rows.setdefault(used.machine_id, {'name': used.machine.name, 'count': 0, 'hours': 0, 'amount': 0})
+        row['count'] += 1
+        row['hours'] += used.duration().total_seconds() / 3600
+        row['amount'] += used.price()
+    for row in rows.values():
+        row['hours'] = cents(row['hours'])
+        row['amount'] = cents(row['amount'])
+    return sorted(rows.values(), key=lambda row: row['name'])
+
+
+def materials(fabday):
+    MaterialsUsed = apps.get_model('fablog', 'MaterialsUsed')
+    used = MaterialsUsed.objects.filter(
+        fablog__fabday=fabday, fablog__closed_at__isnull=False, material__isnull=False).order_by(
+            'material__name', 'variant')
+    return [
+        {'name': " ".join(x for x in (row['material__name'], row['variant']) if x), 'units': row['total_units'],
+         'amount': cents(row['amount'])}
+        for row in used.values('material__name', 'variant').annotate(
+            total_units=Sum('units'),
+            amount=Sum(ExpressionWrapper(
+                F('units') * F('price_per_unit'), output_field=DecimalField(max_digits=12, decimal_places=2))))]
+
+
+def memberships(fabday):
+    FablogMemberships = apps.get_model('fablog', 'FablogMemberships')
+    rows = {}
+    for sold in FablogMemberships.objects.filter(
+            fablog__fabday=fabday, fablog__closed_at__isnull=False, membership__isnull=False).select_related(
+                'membership', 'fablog'):
+        row = rows.setdefault(sold.membership_id, {'name': sold.membership.name, 'count': 0, 'amount': 0})
+        row['count'] += 1
+        row['amount'] += sold.price()
+    for row in rows.values():
+        row['amount'] = cents(row['amount'])
+    return sorted(rows.values(), key=lambda row: row['name'])
+
+
+def open_fablogs(fabday):
+    Fablog = apps.get_model('fablog', 'Fablog')
+    fablogs = Fablog.objects.with_positions().prefetch_related('fablogpayments_set__payment').filter(
+        fabday=fabday, closed_at__isnull=True).order_by('created_at')
+    return [
+        {'id': fablog.pk, 'member': fablog.member.get_full_name() if fablog.member else '',
+         'total': cents(fablog.total()), 'dues': cents(fablog.dues())}
+        for fablog in fablogs]
+
+
+def cash(fabday, bookings):
+    """
+    Per journal counted during the day: the first count against the balance of the books at that time, and
+    the first count plus the bookings of the day against the last count, if the journal was counted again.
+    """
+    counts = defaultdict(list)
+    for count in CashCount.objects.filter(fabday=fabday).select_related('journal', 'booking__balance').order_by(
+            'created_at'):
+        counts[count.journal].append(count)
+    booked = defaultdict(Decimal)
+    for (journal_id, account), (number, amount) in bookings.items():
+        booked[journal_id] += amount
+    rows = []
+    for journal, journal_counts in sorted(counts.items(), key=lambda item: item[0].number):
+        opening = journal_counts[0]
+        closing = journal_counts[-1] if len(journal_counts) > 1 else None
+        expected = opening.total + booked[journal.pk]
+        rows.append({
+            'journal': str(journal),
+            'opening_counted': opening.total,
+            'opening_expected': opening.booking.balance.balance_expected if opening.booking else None,
+            'bookings': cents(booked[journal.pk]),
+            'expected': expected,
+            'counted': closing.total if closing else None,
+            'difference': closing.total - expected if closing else None})
+    return rows
+
+
+def build(fabday):
+    """The report of a FabDay, as JSON compatible data (amounts are strings)"""
+    counts = fablog_counts(fabday)
+    bookings = account_bookings(fabday)
+    accounts = defaultdict(lambda: [0, Decimal(0)])
+    for (journal_id, account), (number, amount) in bookings.items():
+        accounts[account][0] += number
+        accounts[account][1] += amount
+    report = {
+        'date': fabday.date,
+        'fablogs': {'closed': counts['closed'], 'open': counts['open']},
+        'accounts': [
+            {'account': account, 'count': number, 'amount': amount}
+            for account, (number, amount) in sorted(accounts.items())],
+        'total': cents(sum(amount for number, amount in accounts.values())),
+        'payment_methods': payment_methods(fabday),
+        'machines': machines(fabday),
+        'materials': materials(fabday),
+        'memberships': memberships(fabday),
+        'donations': cents(counts['donations']),
+        'open_fablogs': open_fablogs(fabday),
+        'cash': cash(fabday, bookings),
+    }
+    return json.loads(json.dumps(report, cls=DjangoJSONEncoder))
+
+
+def get_report(fabday):
+    """(report, snapshot): the stored report of a closed FabDay, else the report computed now"""
+    snapshot = DailyReport.objects.filter(fabday=fabday).first()
+    if snapshot is not None:
+        return snapshot.get_data(), snapshot
+    return build(fabday), None
+
+
+def close(fabday, user=None):
+    """Store the report of a FabDay without open fablogs, return the snapshot (existing or new)"""
+    report = build(fabday)
+    if report['fablogs']['open']:
+        raise ValueError(_("The FabDay has open fablogs."))
+    try:
+        with transaction.atomic():
+            return DailyReport.objects.create(
+                fabday=fabday, created_by=user, data=json.dumps(report, cls=DjangoJSONEncoder))
+    except IntegrityError:
+        # closed concurrently
+        return DailyReport.objects.get(fabday=fabday)
+
+
+def rows(report):
+    """CSV rows of a report: section, name, count, amount"""
+    yield [_('section'), _('name'), _('count'), _('amount')]
+    yield [_('date'), report['date'], '', '']
+    yield [_('closed fablogs'), '', report['fablogs']['closed'], '']
+    yield [_('open fablogs'), '', report['fablogs']['open'], '']
+    for row in report['accounts']:
+        yield [_('contra account'), row['account'], row['count'], row['amount']]
+    yield [_('total'), '', '', report['total']]
+    for row in report['payment_methods']:
+        yield [_('payment method'), row['name'], row['count'], row['amount']]
+    for row in report['machines']:
+        yield [_('machine'), row['name'], row['count'], row['amount']]
+    for row in report['materials']:
+        yield [_('material'), row['name'], row['units'], row['amount']]
+    for row in report['memberships']:
+        yield [_('membership'), row['name'], row['count'], row['amount']]
+    yield [_('donations'), '', '', report['donations']]
+    for row in report['open_fablogs']:
+        yield [_('open fablog'), '{0} {1}'.format(row['id'], row['member']), '', row['dues']]
+    for row in report['cash']:
+        yield [_('cash counted at opening'), row['journal'], '', row['opening_counted']]
+        yield [_('cash expected at opening'), row['journal'], '', row['opening_expected']]
+        yield [_('cash bookings'), row['journal'], '', row['bookings']]
+        yield [_('cash expected'), row['journal'], '', row['expected']]
+        yield [_('cash counted'), row['journal'], '', row['counted']]
+        yield [_('cash difference'), row['journal'], '', row['difference']]
@@ -1,3 +1,75 @@
-from django.test import TestCase
+# base
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+# django
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+# local
+from audit.models import AuditEntry
+from cashier.models import ArchivedBooking, Booking, Journal, JournalBalance, OpeningBalance
+from fablog.models import FabDay, Fablog, FablogBookings
+from members.models import User
+
+
+class ArchiveBookingsTest(TransactionTestCase):
+    """archive_bookings moves a year out of the booking tables, and the open years continue from it"""
+
+    def setUp(self):
+        self.year = timezone.localdate().year - 1
+        self.user = User.objects.create_superuser(
+            email='labmanager@example.com', first_name='Lab', last_name='Manager', street_and_number='-',
+            zip_code='8000', city='Zürich', phone='-', birthday=date(1990, 1, 1), password='secret')
+        self.cash = Journal.objects.create(number=1000, name='Kasse', default_account=True)
+        self.bank = Journal.objects.create(number=1020, name='Bank')
+        fablog = Fablog.objects.create(
+            created_by=self.user, member=self.user, fabday=FabDay.objects.create(date=date(self.year, 6, 1)),
+            closed_at=timezone.make_aware(datetime(self.year, 6, 1, 18)), closed_by=self.user)
+        self.fablog_id = fablog.pk
+        for amount in ('10.00', '20.00'):
+            booking = self.book(self.cash, amount, datetime(self.year, 6, 1, 12))
+        FablogBookings.objects.create(fablog=fablog, booking=booking)
+        self.book(self.bank, '50.00', datetime(self.year, 12, 31, 12))
+        # the open year
+        self.book(self.bank, '5.00', datetime(self.year + 1, 1, 2, 12))
+
+    def book(self, journal, amount, timestamp):
+        booking = Booking.objects.create(journal=journal, account='3000', amount=Decimal(amount))
+        Booking.objects.filter(pk=booking.pk).update(timestamp=timezone.make_aware(timestamp))
+        return booking
+
+    def test_archive(self):
+        call_command('archive_bookings', self.year, stdout=StringIO())
+
+        self.assertEqual(ArchivedBooking.objects.filter(financial_year=self.year).count(), 3)
+        self.assertEqual(list(Booking.objects.values_list('amount', flat=True)), [Decimal('5.00')])
+        self.assertFalse(JournalBalance.objects.filter(journal=self.cash).exists())
+        self.assertFalse(FablogBookings.objects.exists())
+        self.assertEqual(Fablog.objects.get(pk=self.fablog_id).total_bookings(), Decimal('20.00'))
+        opening = {balance.journal_id: balance.balance_expected for balance in OpeningBalance.objects.filter(
+            financial_year=self.year + 1)}
+        self.assertEqual(opening, {self.cash.pk: Decimal('30.00'), self.bank.pk: Decimal('50.00')})
+
+        # all balances of the cash journal are archived, new bookings continue from the opening balance
+        booking = Booking.objects.create(journal=self.cash, account='3000', amount=Decimal('7.00'))
+        self.assertEqual(booking.balance.balance_expected, Decimal('37.00'))
+        booking = Booking.objects.create(journal=self.bank, account='3000', amount=Decimal('1.00'))
+        self.assertEqual(booking.balance.balance_expected, Decimal('56.00'))
+
+        # the moved rows are in the audit log
+        deleted = AuditEntry.objects.filter(
+            action=AuditEntry.DELETE, content_type=ContentType.objects.get_for_model(Booking))
+        self.assertEqual(deleted.count(), 3)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('cashier:account', args=[self.cash.pk]), {'year': self.year})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(x.amount for x in response.context['bookings']), [Decimal('10.00'), Decimal('20.00')])
+        self.assertEqual(list(response.context['archived_years']), [self.year])
+        response = self.client.get(reverse('cashier:account', args=[self.cash.pk]))
+        self.assertEqual(response.context['opening_balance'].balance_expected, Decimal('30.00'))
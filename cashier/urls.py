@@ -7,5 +7,7 @@ from . import views
 app_name = 'cashier'
 urlpatterns = [
     path("<int:pk>/", views.JournalBookingListView.as_view(), name="account"),
-    path("cashcount/", views.CashCountCreateView.as_view(), name="new_cash_count")
+    path("cashcount/", views.CashCountCreateView.as_view(), name="new_cash_count"),
+    path("report/<int:pk>/", views.DailyReportView.as_view(), name="daily_report"),
+    path("report/<int:pk>/csv", views.DailyReportCSVView.as_view(), name="daily_report_csv")
 ]
@@ -1,9 +1,12 @@
 # base
+import csv
 from decimal import Decimal
 
 # django
-from django.views.generic import CreateView, ListView
-from django.http import HttpResponseRedirect
+from django.views import View
+from django.views.generic import CreateView, DetailView, ListView
+from django.views.generic.detail import SingleObjectMixin
+from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse
 from django.apps import apps
 from django.core.exceptions import ValidationError
@@ -13,12 +16,14 @@ from django.contrib.auth.mixins import PermissionRequiredMixin
 
 
 # local
-from .models import Payment, Booking, Journal, CashCount
+from .models import Payment, Booking, Journal, CashCount, ArchivedBooking
 from .forms import FablogPaymentForm, CashCountForm
+from .reports import close, get_report, rows
 from fablog.models import FabDay
+from digitalFablog.routers import ReplicaReadMixin
 
 
-class JournalBookingListView(PermissionRequiredMixin, ListView):
+class JournalBookingListView(PermissionRequiredMixin, ReplicaReadMixin, ListView):
     permission_required = 'cashier.can_view_bookings'
 
     template_name = 'cashier/journal_booking_listview.html'
@@ -26,11 +31,21 @@ class JournalBookingListView(PermissionRequiredMixin, ListView):
 
     def get_queryset(self):
         self.journal = get_object_or_404(Journal, pk=self.kwargs['pk'])
-        return Booking.objects.filter(journal=self.journal)
+        self.year = self.request.GET.get('year', '')
+        if self.year.isdigit():
+            # archived financial year, see archive_bookings
+            return ArchivedBooking.objects.filter(journal=self.journal, financial_year=int(self.year))
+        self.year = None
+        return Booking.objects.filter(journal=self.journal).select_related('balance')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['journal'] = self.journal
+        context['year'] = self.year
+        context['archived_years'] = ArchivedBooking.objects.filter(journal=self.journal).order_by(
+            '-financial_year').values_list('financial_year', flat=True).distinct()
+        if self.year is None:
+            context['opening_balance'] = self.journal.opening_balances.last()
         return context
 
 
@@ -43,7 +58,8 @@ class FablogPaymentCreateView(PermissionRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         Fablog = apps.get_model('fablog', 'Fablog')
-        fablog = Fablog.objects.get(pk=self.kwargs['pk'])
+        fablog = Fablog.objects.with_positions().prefetch_related(
+            'fablogpayments_set__payment__payment_method').get(pk=self.kwargs['pk'])
         self.initial = {'amount': fablog.dues}
         context = super().get_context_data(**kwargs)
         context['fablog'] = fablog
@@ -53,7 +69,8 @@ class FablogPaymentCreateView(PermissionRequiredMixin, CreateView):
         self.object = None
         form = self.get_form()
         Fablog = apps.get_model('fablog', 'Fablog')
-        fablog = Fablog.objects.get(pk=self.kwargs['pk'])
+        fablog = Fablog.objects.with_positions().prefetch_related(
+            'fablogpayments_set__payment').get(pk=self.kwargs['pk'])
         form_is_valid = form.is_valid()
         dues = fablog.dues()
         entered_amount = Decimal(request.POST.get('amount'))
@@ -76,7 +93,8 @@ class FablogPaymentCreateView(PermissionRequiredMixin, CreateView):
 
     def form_valid(self, form):
         Fablog = apps.get_model('fablog', 'Fablog')
-        fablog = Fablog.objects.get(pk=self.kwargs['pk'])
+        # payments are not prefetched, the bookings signal needs the new one
+        fablog = Fablog.objects.with_positions().get(pk=self.kwargs['pk'])
         # add donation to fablog if necessary
         if self.donation_amount:
             fablog.donation = fablog.donation + self.donation_amount
@@ -117,7 +135,43 @@ class CashCountCreateView(PermissionRequiredMixin, CreateView):
         '''
         self.object = form.save(commit=False)
         self.object.created_by = self.request.user
-        self.object.fabday, new = FabDay.objects.get_or_create(date=self.object.cashier_date)
-        self.object.save()
+        FabDay.objects.save_with(self.object, self.object.cashier_date)
 
         return HttpResponseRedirect(self.get_success_url())
+
+
+class DailyReportView(PermissionRequiredMixin, ReplicaReadMixin, DetailView):
+    """Daily close report of a FabDay. POST closes the day, i.e. stores the report for good."""
+    permission_required = 'cashier.add_cashcount'
+
+    template_name = 'cashier/daily_report.html'
+    model = FabDay
+    context_object_name = 'fabday'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['report'], context['snapshot'] = get_report(self.object)
+        return context
+
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        try:
+            close(self.object, request.user)
+        except ValueError as error:
+            return self.render_to_response(self.get_context_data(object=self.object, error=error))
+        return HttpResponseRedirect(reverse('cashier:daily_report', args=[self.object.pk]))
+
+
+class DailyReportCSVView(PermissionRequiredMixin, ReplicaReadMixin, SingleObjectMixin, View):
+    """The daily close report of a FabDay as CSV"""
+    permission_required = 'cashier.add_cashcount'
+
+    model = FabDay
+
+    def get(self, request, *args, **kwargs):
+        fabday = self.get_object()
+        report, snapshot = get_report(fabday)
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="fabday_{0}.csv"'.format(fabday.date.isoformat())
+        csv.writer(response).writerows(rows(report))
+        return response
@@ -0,0 +1,328 @@
+"""
+ASGI config for digitalFablog project.
+
+It exposes the ASGI callable as a module-level variable named ``application``, served e.g. with
+``uvicorn digitalFablog.asgi:application``.
+
+The board endpoints (board status, machine status and member search) are answered by the coroutines
+below. Their database access runs in a thread pool, and long-polling board clients wait for a change of
+the board version without holding a thread: one task per process checks the version and wakes all
+waiting clients at once. Every other request is handed to the regular WSGI application, in the same
+thread pool.
+"""
+# base
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from importlib import import_module
+from io import BytesIO
+from urllib.parse import parse_qsl
+
+# django
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "digitalFablog.settings")
+
+# sets up django, so it has to run before the imports below
+wsgi_application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+from django.contrib import auth  # noqa: E402
+from django.db import close_old_connections  # noqa: E402
+from django.http import HttpRequest  # noqa: E402
+from django.http.cookie import parse_cookie  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+# local
+from digitalFablog.routers import use_replica  # noqa: E402
+from digitalFablog.startup import warm_up  # noqa: E402
+from fablog.board import board_status, board_version, long_poll_params, machine_status, member_search  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=settings.ASGI_THREADS)
+
+# the pages are rendered by the WSGI application, import their views and compile their templates before the
+# first request
+warm_up()
+
+
+def call_with_connections(func, *args):
+    # like a request: drop expired database connections of the thread before and after
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args):
+    """Run a blocking function (database access) in the thread pool"""
+    return await asyncio.get_event_loop().run_in_executor(executor, call_with_connections, func, *args)
+
+
+class Request:
+    """The parts of an http scope the board endpoints need"""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.headers = {}
+        for name, value in scope['headers']:
+            self.headers[name.decode('latin1').lower()] = value.decode('latin1')
+        self.GET = dict(parse_qsl(scope['query_string'].decode('latin1')))
+        self.COOKIES = parse_cookie(self.headers.get('cookie', ''))
+
+    def get_user(self):
+        """The user of the session cookie, blocking"""
+        request = HttpRequest()
+        request.COOKIES = self.COOKIES
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore(
+            self.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        return auth.get_user(request)
+
+
+async def send_json(send, data, status=200, cache_control='no-store'):
+    body = json.dumps(data).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'cache-control', cache_control.encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class BoardNotifier:
+    """Checks the board version once per BOARD_POLL_INTERVAL and wakes all clients waiting for a change"""
+
+    def __init__(self):
+        self.version = None
+        self.changed = None
+        self.task = None
+        self.lock = None
+
+    async def start(self):
+        if self.task is None:
+            if self.lock is None:
+                self.lock = asyncio.Lock()
+            # clients arriving while the first version is read wait for it instead of starting a second poll
+            async with self.lock:
+                if self.task is None:
+                    self.changed = asyncio.Event()
+                    self.version = await run_sync(board_version)
+                    self.task = asyncio.ensure_future(self.poll())
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(settings.BOARD_POLL_INTERVAL)
+            try:
+                version = await run_sync(board_version)
+            except Exception:
+                logger.exception('reading the board version failed')
+                continue
+            if version != self.version:
+                self.version = version
+                changed, self.changed = self.changed, asyncio.Event()
+                changed.set()
+
+    async def wait(self, version, wait):
+        """Wait until the board version differs from `version`, for at most `wait` seconds"""
+        await self.start()
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + wait
+        while str(self.version) == version and loop.time() < deadline:
+            try:
+                await asyncio.wait_for(self.changed.wait(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+
+
+notifier = BoardNotifier()
+
+
+async def board_endpoint(request, send, data):
+    user = await run_sync(request.get_user)
+    if not user.is_authenticated:
+        return await send_json(send, 'Unauthorized', status=401)
+    version, wait = long_poll_params(request.GET)
+    if wait:
+        await notifier.wait(version, wait)
+    await send_json(send, await run_sync(data))
+
+
+async def board(request, send):
+    await board_endpoint(request, send, board_status)
+
+
+async def machines(request, send):
+    await board_endpoint(request, send, machine_status)
+
+
+def search_members(request):
+    user = request.get_user()
+    if not user.is_authenticated:
+        return 401, 'Unauthorized'
+    if not user.has_perm('members.view_members'):
+        return 403, 'Forbidden'
+    term = request.GET.get('q', '').strip()
+    with use_replica():
+        return 200, member_search(term) if term else {'members': []}
+
+
+async def members(request, send):
+    # one trip to the thread pool for the user, the permissions and the search
+    status, data = await run_sync(search_members, request)
+    await send_json(send, data, status=status, cache_control='private, no-cache')
+
+
+_endpoints = {}
+
+
+def get_endpoints():
+    if not _endpoints:
+        _endpoints.update({
+            reverse('board'): board,
+            reverse('board_machines'): machines,
+            reverse('board_members'): members})
+    return _endpoints
+
+
+class ResponseChannel:
+    """Hands a response from a thread of the pool to the event loop, at most a few chunks ahead of the client"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=4)
+        self.closed = threading.Event()
+
+    def put(self, item):
+        """Blocking, from the thread. Return False once the client is gone."""
+        future = asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop)
+        while not self.closed.is_set():
+            try:
+                future.result(timeout=1)
+                return True
+            except TimeoutError:
+                continue
+        future.cancel()
+        return False
+
+
+def call_wsgi(environ, put):
+    """
+    Run the WSGI application and put the status and headers, then the body chunk by chunk, then None.
+
+    Runs in one thread from start to end, so streamed bodies (files, CSV exports) are read chunk by chunk, with
+    the database connections of the thread which closes them afterwards. The thread is held until the client
+    has received the response.
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        # cookies come with a leading space, which the http protocol implementations of ASGI servers reject
+        response['headers'] = [(name.encode('latin1'), value.strip().encode('latin1')) for name, value in headers]
+
+    try:
+        result = wsgi_application(environ, start_response)
+        try:
+            if put((response['status'], response['headers'])):
+                for chunk in result:
+                    if chunk and not put(chunk):
+                        break
+        finally:
+            # sends request_finished, which handles the database connections of the thread
+            if hasattr(result, 'close'):
+                result.close()
+    finally:
+        put(None)
+
+
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{0}'.format(scope['http_version']),
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin1')
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+async def read_body(receive):
+    body = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(body)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        raise ValueError("unsupported scope type {0}".format(scope['type']))
+
+    endpoint = get_endpoints().get(scope['path'])
+    if endpoint is not None and scope['method'] == 'GET':
+        return await endpoint(Request(scope), send)
+
+    body = await read_body(receive)
+    if body is None:
+        return
+    channel = ResponseChannel(asyncio.get_event_loop())
+    thread = asyncio.ensure_future(run_sync(call_wsgi, wsgi_environ(scope, body), channel.put))
+    try:
+        start = await channel.queue.get()
+        if start is None:
+            # the application raised
+            return await thread
+        status, headers = start
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        while True:
+            chunk = await channel.queue.get()
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        # lets the thread close the response if the client is gone
+        channel.closed.set()
+    await thread
@@ -0,0 +1,55 @@
+"""
+gunicorn configuration for production, used with
+
+    gunicorn -c python:digitalFablog.gunicorn digitalFablog.wsgi
+
+Every setting can be overridden in the environment (or .env), e.g. GUNICORN_WORKERS=4.
+
+The application is loaded once in the master process before the workers are forked (preload_app), so
+Django, the views, the translation catalog and the compiled templates are shared by all workers and a new
+worker answers its first request without importing anything. Code changes therefore need a restart, a
+HUP only replaces the workers. Database and cache connections are opened per worker after the fork.
+
+Workers are replaced after a number of requests (with jitter, so they don't restart all at once), which
+bounds slow memory growth, and get `GUNICORN_GRACEFUL_TIMEOUT` seconds to finish their requests.
+"""
+# base
+import multiprocessing
+
+# additional
+# (gunicorn reads every module level name as a setting, and `config` is one of them)
+import decouple
+
+bind = decouple.config('GUNICORN_BIND', default='0.0.0.0:8000')
+
+# sync workers, one request at a time each; the usual rule of thumb for mostly database bound requests
+workers = decouple.config('GUNICORN_WORKERS', default=multiprocessing.cpu_count() * 2 + 1, cast=int)
+# set to uvicorn.workers.UvicornWorker and serve digitalFablog.asgi:application for long-polling board clients
+worker_class = decouple.config('GUNICORN_WORKER_CLASS', default='sync')
+
+preload_app = decouple.config('GUNICORN_PRELOAD', default=True, cast=bool)
+
+# graceful worker recycling
+max_requests = decouple.config('GUNICORN_MAX_REQUESTS', default=1000, cast=int)
+max_requests_jitter = decouple.config('GUNICORN_MAX_REQUESTS_JITTER', default=100, cast=int)
+
+# a worker silent for this long is killed and replaced
+timeout = decouple.config('GUNICORN_TIMEOUT', default=30, cast=int)
+graceful_timeout = decouple.config('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)
+# seconds to keep idle connections of a proxy in front open
+keepalive = decouple.config('GUNICORN_KEEPALIVE', default=5, cast=int)
+
+accesslog = decouple.config('GUNICORN_ACCESSLOG', default='-')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # the master must not share its connections with the workers, should the preloaded code have opened any
+    if not server.cfg.preload_app:
+        return
+    from django.core.cache import caches
+    from django.db import connections
+    for connection in connections.all():
+        connection.close()
+    for cache in caches.all():
+        cache.close()
@@ -1,13 +1,255 @@
+# base
+import json
+import logging
+import mimetypes
+import os
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import lru_cache
+
 import pytz
 
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.db import connections
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
 from django.utils import timezone
+from django.utils._os import safe_join
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date, parse_etags
+
+# local
+from utils.templates import TemplateProfile
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    return pytz.timezone(name)
 
 
 class TimezoneMiddleware(MiddlewareMixin):
     def process_request(self, request):
         tzname = request.session.get('django_timezone')
         if tzname:
-            timezone.activate(pytz.timezone(tzname))
+            timezone.activate(get_timezone(tzname))
         else:
             timezone.deactivate()
+
+
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Normalize a query, so repetitions with different parameters or IN list lengths compare equal.
+
+    Works on both raw SQL with placeholders and on SQL with interpolated parameters (as captured by
+    the test utilities).
+    """
+    return WHITESPACE.sub(' ', IN_LIST.sub('IN (...)', LITERAL.sub('%s', sql))).strip()
+
+
+class QueryRecorder:
+    """Database execute wrapper collecting query count, time and fingerprints"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Per request SQL and timing instrumentation.
+
+    Enabled with the QUERY_INSTRUMENTATION setting, otherwise the middleware removes itself at
+    startup. Adds a Server-Timing header, logs one line per request and warns when the same
+    normalized query runs more than QUERY_INSTRUMENTATION_REPEAT_LIMIT times (N+1 queries).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.repeat_limit = getattr(settings, 'QUERY_INSTRUMENTATION_REPEAT_LIMIT', 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        response['Server-Timing'] = ', '.join([
+            'db;dur={0:.1f};desc="{1} queries"'.format(recorder.duration * 1000, recorder.count),
+            'app;dur={0:.1f}'.format((total - recorder.duration) * 1000),
+            'total;dur={0:.1f}'.format(total * 1000)])
+
+        repeated = [(sql, n) for sql, n in recorder.fingerprints.most_common() if n > self.repeat_limit]
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': getattr(getattr(request, 'resolver_match', None), 'view_name', None),
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'duplicates': sum(n - 1 for n in recorder.fingerprints.values() if n > 1),
+        }
+        logger.info(json.dumps(record), extra={'instrumentation': record})
+        for sql, n in repeated:
+            logger.warning('%s %s: query repeated %d times: %s', request.method, request.path, n, sql)
+        return response
+
+
+class TemplateProfilerMiddleware:
+    """
+    Per request template render profile.
+
+    Enabled with the TEMPLATE_PROFILING setting in DEBUG mode only. Logs the templates and template tags
+    with the highest self time of every rendered response (see utils.templates.TemplateProfile).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'TEMPLATE_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limit = getattr(settings, 'TEMPLATE_PROFILING_LIMIT', 15)
+
+    def __call__(self, request):
+        with TemplateProfile() as profile:
+            response = self.get_response(request)
+            # template responses are rendered on the way out
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+        if profile.templates:
+            logger.info('%s %s: %.1f ms rendering templates\n%s', request.method, request.path,
+                        profile.total() * 1000, profile.report(self.limit))
+        return response
+
+
+class ConnectionHealthCheckMiddleware:
+    """
+    Health check of persistent database connections.
+
+    With CONN_MAX_AGE > 0 a connection outlives the request, and may be dropped meanwhile by the
+    server, a pooler or the network. If CONN_HEALTH_CHECKS is set for a database, a reused connection is
+    pinged once at the start of each request and replaced if it is no longer usable, instead of failing
+    the first query of the request.
+    """
+
+    def __init__(self, get_response):
+        self.databases = [
+            alias for alias in connections if connections.databases[alias].get('CONN_HEALTH_CHECKS')]
+        if not self.databases:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for alias in self.databases:
+            connection = connections[alias]
+            if (connection.connection is not None and connection.settings_dict['CONN_MAX_AGE'] != 0
+                    and not connection.in_atomic_block and not connection.is_usable()):
+                logger.info('closing unusable persistent connection to database %s', alias)
+                connection.close()
+        return self.get_response(request)
+
+
+def accepted_encodings(header):
+    """{encoding: q} of an Accept-Encoding header, e.g. 'gzip, br;q=0' -> {'gzip': 1.0, 'br': 0.0}"""
+    accepted = {}
+    for item in header.split(','):
+        token, *params = [part.strip() for part in item.split(';')]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _sep, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token.lower()] = q
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Serve the collected static files (STATIC_ROOT) with far-future cache headers.
+
+    Enabled with the STATIC_SERVE setting, for deployments without a web server serving STATIC_ROOT.
+    Files with a content hash in their name (listed in the manifest of digitalFablog.storage) are
+    cached by browsers for a year and never revalidated, all other files are revalidated with their
+    ETag. Precompressed .br and .gz variants are served to clients which accept them.
+    """
+    immutable = 'public, max-age=31536000, immutable'
+    revalidate = 'public, no-cache'
+    encodings = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, get_response):
+        if not settings.STATIC_SERVE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # the manifest is read once per process, like the storage does
+        self.hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(settings.STATIC_URL):
+            response = self.serve(request, request.path[len(settings.STATIC_URL):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        served, encoding, best = path, None, 0
+        for candidate, suffix in self.encodings:
+            # the highest q wins, on a tie the first (smallest) of our encodings
+            q = accepted.get(candidate, accepted.get('*', 0))
+            if q > best and os.path.isfile(path + suffix):
+                served, encoding, best = path + suffix, candidate, q
+        stat = os.stat(served)
+        etag = '"{0:x}-{1:x}{2}"'.format(int(stat.st_mtime), stat.st_size, '-' + encoding if encoding else '')
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=content_type)
+                response['Content-Length'] = stat.st_size
+            else:
+                response = FileResponse(open(served, 'rb'), content_type=content_type)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = self.immutable if name in self.hashed_names else self.revalidate
+        response['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,121 @@
+"""
+    routing of reads to an optional read replica
+
+    Reads go to the 'replica' database alias only inside use_replica() (views opt in with
+    ReplicaReadMixin, admin changelists with ReplicaChangelistMixin) and only as long as the current
+    request has not written anything. Writes always go to the primary and pin the rest of the request,
+    and (through a cookie set by ReplicaPinningMiddleware) the requests of the next seconds, to the
+    primary, so a redirect after a POST reads its own writes.
+"""
+# base
+import threading
+from contextlib import contextmanager
+
+# django
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_pinned'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# the table of the database cache backend, invalidations must be visible right away
+PRIMARY_ONLY_APPS = ('django_cache', )
+
+_state = threading.local()
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def reset():
+    _state.replica = False
+    _state.pinned = False
+    _state.wrote = False
+
+
+def pin_to_primary():
+    """Send all further reads of this request (or thread) to the primary"""
+    _state.pinned = True
+
+
+@contextmanager
+def use_replica():
+    """Send the reads in this block to the replica, unless the current request is pinned to the primary"""
+    previous = getattr(_state, 'replica', False)
+    _state.replica = True
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+class ReplicaRouter:
+    """Database router for a primary and an optional read replica"""
+
+    def db_for_read(self, model, **hints):
+        if (getattr(_state, 'replica', False) and not getattr(_state, 'pinned', False) and replica_configured()
+                and model._meta.app_label not in PRIMARY_ONLY_APPS):
+            return REPLICA
+        # explicitly, otherwise instances loaded from the replica would read their relations from there
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinningMiddleware:
+    """
+    Reset the routing state for every request and pin requests to the primary if they write (or may
+    write, like every POST) or follow a writing request within REPLICA_PIN_SECONDS.
+    """
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset()
+        if request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES:
+            pin_to_primary()
+        try:
+            response = self.get_response(request)
+            if getattr(_state, 'wrote', False) or request.method not in SAFE_METHODS:
+                response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+            return response
+        finally:
+            reset()
+
+
+def render_within(response):
+    """Render a lazy TemplateResponse now, so the queries of its template run in the current context"""
+    if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+        response.render()
+    return response
+
+
+class ReplicaReadMixin:
+    """View mixin sending the reads of the view and its template to the replica"""
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_replica():
+            return render_within(super().dispatch(request, *args, **kwargs))
+
+
+class ReplicaChangelistMixin:
+    """ModelAdmin mixin sending the reads of the changelist to the replica"""
+
+    def changelist_view(self, request, extra_context=None):
+        with use_replica():
+            return render_within(super().changelist_view(request, extra_context))
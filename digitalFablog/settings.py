@@ -3,9 +3,12 @@ Django settings for digitalFablog project.
 '''
 
 import os
+import tempfile
 from decouple import config, Csv
 import dj_database_url
 
+from digitalFablog.storage import static_lazy
+
 VERSION = '0.5.0'
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -36,7 +39,6 @@ INSTALLED_APPS = [
     'django.contrib.postgres',
     'django.forms',
     # additional
-    'django_extensions',
     'bootstrap4',
     'mathfilters',
     'widget_tweaks',
@@ -46,30 +48,60 @@ INSTALLED_APPS = [
     'materials',
     'memberships',
     'members',
-    'cashier'
+    'cashier',
+    'stats',
+    'audit',
+    'jobs'
 ]
 
+# development tools, not loaded in production
+if DEBUG:
+    INSTALLED_APPS += ['django_extensions']
+
 MIDDLEWARE = [
+    'digitalFablog.middleware.StaticFilesMiddleware',
+    'digitalFablog.middleware.QueryInstrumentationMiddleware',
+    'digitalFablog.middleware.TemplateProfilerMiddleware',
+    'digitalFablog.middleware.ConnectionHealthCheckMiddleware',
+    'digitalFablog.routers.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # 'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'audit.middleware.AuditMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'digitalFablog.middleware.TimezoneMiddleware'
 ]
 
+# per request query and timing instrumentation (see digitalFablog.middleware)
+QUERY_INSTRUMENTATION = config('QUERY_INSTRUMENTATION', default=False, cast=bool)
+QUERY_INSTRUMENTATION_REPEAT_LIMIT = config('QUERY_INSTRUMENTATION_REPEAT_LIMIT', default=5, cast=int)
+
+# per request template render profile, DEBUG only (see utils.templates)
+TEMPLATE_PROFILING = DEBUG and config('TEMPLATE_PROFILING', default=False, cast=bool)
+TEMPLATE_PROFILING_LIMIT = config('TEMPLATE_PROFILING_LIMIT', default=15, cast=int)
+
 ROOT_URLCONF = 'digitalFablog.urls'
 
+# compile templates once per process and warm them at worker start (see digitalFablog.wsgi)
+TEMPLATE_CACHE = config('TEMPLATE_CACHE', default=not DEBUG, cast=bool)
+template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader']
+if TEMPLATE_CACHE:
+    template_loaders = [('django.template.loaders.cached.Loader', template_loaders)]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [
             os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
+        'APP_DIRS': False,
         'OPTIONS': {
+            'loaders': template_loaders,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -77,10 +109,16 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'utils.context_processors.global_variables'
             ],
+            'libraries': {
+                'cache_tags': 'utils.cache_tags',
+            },
         },
     },
 ]
 
+# render form widgets with the engine above, so the widget templates are cached and warmed as well
+FORM_RENDERER = 'django.forms.renderers.TemplatesSetting'
+
 WSGI_APPLICATION = 'digitalFablog.wsgi.application'
 
 
@@ -89,9 +127,74 @@ WSGI_APPLICATION = 'digitalFablog.wsgi.application'
 
 DATABASES = {
     'default': dj_database_url.config(
-        default=config('DATABASE_URL')
+        default=config('DATABASE_URL'),
+        # seconds a connection is kept open for the next requests, 0 closes it after every request
+        conn_max_age=config('DATABASE_CONN_MAX_AGE', default=0, cast=int)
+    )
+}
+# ping reused persistent connections at the start of a request (see digitalFablog.middleware)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = config('DATABASE_CONN_HEALTH_CHECKS', default=True, cast=bool)
+# behind PgBouncer in transaction pooling mode: server side cursors (used by QuerySet.iterator()) do not
+# survive the end of a transaction, since the next one may run on another server connection
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = config('DATABASE_PGBOUNCER', default=False, cast=bool)
+
+# optional read replica for list views, reports and admin changelists (see digitalFablog.routers)
+REPLICA_DATABASE_URL = config('REPLICA_DATABASE_URL', default='')
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        **dj_database_url.parse(REPLICA_DATABASE_URL, conn_max_age=DATABASES['default']['CONN_MAX_AGE'])
     )
+    # tests run against the test database of the primary through the replica alias
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['digitalFablog.routers.ReplicaRouter']
+# seconds the requests of a client keep reading from the primary after it wrote (reads after writes)
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=15, cast=int)
+
+# ASGI (see digitalFablog.asgi): threads running database access and all other views
+ASGI_THREADS = config('ASGI_THREADS', default=10, cast=int)
+# longest wait of a long-polling board client, and how often the board version is checked meanwhile
+BOARD_LONG_POLL_TIMEOUT = config('BOARD_LONG_POLL_TIMEOUT', default=25, cast=int)
+BOARD_POLL_INTERVAL = config('BOARD_POLL_INTERVAL', default=1.0, cast=float)
+
+# database job queue (see jobs.queue): worker processes of run_worker, seconds between polls of an idle
+# worker, retries of a failed job (the delay doubles with every attempt), seconds after which a running
+# job counts as lost and is retried, days finished jobs are kept
+JOB_WORKERS = config('JOB_WORKERS', default=2, cast=int)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1.0, cast=float)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=5, cast=int)
+JOB_RETRY_DELAY = config('JOB_RETRY_DELAY', default=30, cast=int)
+JOB_RETRY_MAX_DELAY = config('JOB_RETRY_MAX_DELAY', default=3600, cast=int)
+JOB_TIMEOUT = config('JOB_TIMEOUT', default=600, cast=int)
+JOB_KEEP_DAYS = config('JOB_KEEP_DAYS', default=7, cast=int)
+
+# the statistics rollups take rows older than STATS_SETTLE_SECONDS as settled (see stats.rollups), rows of
+# transactions committing later than that are only counted once their month is recomputed
+STATS_SETTLE_SECONDS = config('STATS_SETTLE_SECONDS', default=300, cast=int)
+
+
+# Caches
+# the shared cache is file based by default, so all processes of a host share sessions, users,
+# permissions and the application caches (see utils.cache). Use memcached, Redis (with django-redis
+# installed: CACHE_BACKEND=django_redis.cache.RedisCache) or the database cache (run createcachetable)
+# as soon as more than one host serves requests.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'digitalfablog_cache')),
+    }
 }
+# in-process tier of the application caches in front of the shared cache, entries live at most
+# TIERED_CACHE_LOCAL_TIMEOUT seconds, which is also how long other processes may serve invalidated data
+TIERED_CACHE_LOCAL_TIMEOUT = config('TIERED_CACHE_LOCAL_TIMEOUT', default=5, cast=int)
+TIERED_CACHE_LOCAL_MAX_ENTRIES = config('TIERED_CACHE_LOCAL_MAX_ENTRIES', default=1000, cast=int)
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# users and their permissions are cached for up to AUTH_CACHE_TIMEOUT seconds (see members.backends)
+AUTHENTICATION_BACKENDS = ['members.backends.CachedModelBackend']
+AUTH_CACHE_TIMEOUT = config('AUTH_CACHE_TIMEOUT', default=300, cast=int)
 
 
 # Password validation
@@ -136,9 +239,48 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'assets')
 
+# collectstatic writes copies with content hashed names, a manifest of them and compressed variants
+# (see digitalFablog.storage). Templates then need the collected files, so it is off for development.
+STATIC_MANIFEST = config('STATIC_MANIFEST', default=not DEBUG, cast=bool)
+if STATIC_MANIFEST:
+    STATICFILES_STORAGE = 'digitalFablog.storage.CompressedManifestStaticFilesStorage'
+# serve STATIC_ROOT with far-future cache headers from the application (see digitalFablog.middleware),
+# unless a web server in front of it does
+STATIC_SERVE = config('STATIC_SERVE', default=not DEBUG, cast=bool)
+
 # Media files (uploaded files)
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Logging
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'digitalFablog': {
+            'handlers': ['console'],
+            'level': config('LOG_LEVEL', default='INFO'),
+        },
+        'jobs': {
+            'handlers': ['console'],
+            'level': config('LOG_LEVEL', default='INFO'),
+        },
+    },
+}
+
+# Email
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='webmaster@localhost')
+
 # Fixtures
 FIXTURE_DIRS = (
    os.path.join(BASE_DIR, 'fixtures'),
@@ -154,12 +296,12 @@ LOGOUT_REDIRECT_URL = '/'
 # Bootstrap 4
 BOOTSTRAP4 = {
     'base_url': None,
-    'css_url': {'url': STATIC_URL + 'css/df-bootstrap.min.css'},
+    'css_url': {'url': static_lazy('css/df-bootstrap.min.css')},
     'theme_url': None,
-    'jquery_url': {'url': STATIC_URL + 'js/jquery.min.js'},
+    'jquery_url': {'url': static_lazy('js/jquery.min.js')},
     'jquery_slim_url': None,
-    'popper_url': {'url': STATIC_URL + 'js/popper.min.js'},
-    'javascript_url':  {'url': STATIC_URL + 'js/bootstrap.min.js'},
+    'popper_url': {'url': static_lazy('js/popper.min.js')},
+    'javascript_url':  {'url': static_lazy('js/bootstrap.min.js')},
     'javascript_in_head': False,
     'include_jquery': True,
     'use_i18n': True,
@@ -0,0 +1,30 @@
+"""
+    work done once per process before the first request
+
+    Called by the WSGI and ASGI entry points. With gunicorn's preload_app (see digitalFablog.gunicorn) it
+    runs once in the master process, and the forked workers share the result.
+"""
+# base
+import logging
+import time
+
+# django
+from django.conf import settings
+from django.urls import reverse
+from django.utils.translation import trans_real
+
+# local
+from utils.templates import warm_templates
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """Import all views, load the translation catalog and compile the templates, without touching the database"""
+    start = time.perf_counter()
+    # builds the url resolver, which imports the views of all apps
+    reverse('fablog:home')
+    # LocaleMiddleware is not used, so the default language is the only one needed
+    trans_real.translation(settings.LANGUAGE_CODE)
+    templates = warm_templates() if settings.TEMPLATE_CACHE else 0
+    logger.info('warmed up in %.0f ms (%d templates)', (time.perf_counter() - start) * 1000, templates)
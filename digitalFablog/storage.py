@@ -0,0 +1,73 @@
+"""
+    static files storage with content hashed names and precompressed variants
+"""
+# base
+import gzip
+import os
+
+# django
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.utils.functional import lazy
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def gzip_compress(content):
+    return gzip.compress(content, compresslevel=9)
+
+
+def brotli_compress(content):
+    return brotli.compress(content)
+
+
+def static(path):
+    # imported late, settings use static_lazy before the apps are loaded
+    from django.templatetags.static import static
+    return static(path)
+
+
+# url of a static file for settings, resolved to the hashed name when used
+static_lazy = lazy(static, str)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage which also writes a gzip (.gz) and, with the brotli package installed, a
+    brotli (.br) compressed copy next to every collected text file, for the static files middleware to
+    serve to clients which accept them.
+    """
+    compress_extensions = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.eot', '.ttf')
+    # smaller files don't get smaller
+    compress_min_size = 512
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            yield name, hashed_name, processed
+            if not isinstance(processed, Exception):
+                names.update(x for x in (name, hashed_name) if x)
+        if not dry_run:
+            for name in sorted(names):
+                if os.path.splitext(name)[1] in self.compress_extensions:
+                    self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            content = source.read()
+        if len(content) < self.compress_min_size:
+            return
+        compressors = [('.gz', gzip_compress)]
+        if brotli is not None:
+            compressors.append(('.br', brotli_compress))
+        for suffix, compressor in compressors:
+            compressed = compressor(content)
+            # only worth a separate file if it saves at least 5%
+            if len(compressed) < len(content) * 0.95:
+                with open(path + suffix, 'wb') as target:
+                    target.write(compressed)
+            elif os.path.exists(path + suffix):
+                os.remove(path + suffix)
@@ -17,6 +17,7 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import RedirectView
 from members.views import Login, Logout, Registration
+from .views import BoardStatusView, CacheStatsView, JobStatusView, MachineStatusView, MemberSearchView, ReadinessView
 
 urlpatterns = [
     # admin
@@ -27,9 +28,23 @@ urlpatterns = [
     path("fablog/", include("fablog.urls", namespace="fablog")),
     # members
     path("members/", include("members.urls", namespace="members")),
+    # materials
+    path("materials/", include("materials.urls", namespace="materials")),
     # accounts
     path("cashier/", include("cashier.urls", namespace="cashier")),
+    # statistics
+    path("stats/", include("stats.urls", namespace="stats")),
     path("login/", Login.as_view(), name="login"),
     path("logout/", Logout.as_view(), name="logout"),
-    path("registration/", Registration.as_view(), name="registration")
+    path("registration/", Registration.as_view(), name="registration"),
+    # read endpoints of the board screens, served asynchronously by digitalFablog.asgi
+    path("board/", BoardStatusView.as_view(), name="board"),
+    path("board/machines/", MachineStatusView.as_view(), name="board_machines"),
+    path("board/members/", MemberSearchView.as_view(), name="board_members"),
+    # readiness probe (database connections)
+    path("ready/", ReadinessView.as_view(), name="ready"),
+    # hit and miss counters of the application caches
+    path("cache-stats/", CacheStatsView.as_view(), name="cache_stats"),
+    # queue length and lag of the background jobs
+    path("jobs/", JobStatusView.as_view(), name="job_status")
 ]
@@ -0,0 +1,126 @@
+"""
+    project level views
+"""
+# base
+import os
+import time
+
+# django
+from django.contrib.auth.mixins import UserPassesTestMixin
+from django.db import DatabaseError, connections
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+
+# local
+from digitalFablog.routers import use_replica
+from fablog.board import board_status, long_poll_params, machine_status, member_search, wait_for_change
+from jobs.queue import metrics as job_metrics
+from utils import cache
+from utils.decorators import ajax_login_required
+
+
+class ReadinessView(View):
+    """
+    Readiness probe for load balancers and process managers.
+
+    Runs a query on every database, on the persistent connection of this process if there is one, and
+    answers 503 if a database is not usable. Broken connections are closed, so the next request opens
+    a new one.
+    """
+
+    def get(self, request):
+        ready = True
+        databases = {}
+        for alias in connections:
+            connection = connections[alias]
+            reused = connection.connection is not None
+            start = time.perf_counter()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+                usable = True
+            except DatabaseError:
+                usable = ready = False
+                try:
+                    connection.close()
+                except DatabaseError:
+                    pass
+            databases[alias] = {
+                'usable': usable,
+                'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+                'reused_connection': reused,
+                'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+                'health_checks': bool(connection.settings_dict.get('CONN_HEALTH_CHECKS')),
+                'server_side_cursors': not connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'),
+            }
+        response = JsonResponse({'ready': ready, 'databases': databases}, status=200 if ready else 503)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class CacheStatsView(UserPassesTestMixin, View):
+    """Hits and misses of the application cache namespaces in the process serving the request (staff only)"""
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        response = JsonResponse({'pid': os.getpid(), 'namespaces': cache.stats()})
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class JobStatusView(UserPassesTestMixin, View):
+    """
+    State of the database job queue (staff only): jobs per status and the lag of due jobs, i.e. how far the
+    workers are behind. Monitoring should alert on a growing lag_seconds.
+    """
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        response = JsonResponse(job_metrics())
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+@method_decorator(ajax_login_required, name='dispatch')
+class BoardStatusView(View):
+    """
+    Today's open fablogs as JSON.
+
+    With ?version=<version>&wait=<seconds> the request waits until the board changes. Under WSGI that
+    blocks a worker for the whole time; digitalFablog.asgi serves the same url without holding a thread.
+    """
+    data = staticmethod(board_status)
+
+    def get(self, request):
+        version, wait = long_poll_params(request.GET)
+        if wait:
+            wait_for_change(version, wait)
+        response = JsonResponse(self.data())
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class MachineStatusView(BoardStatusView):
+    """Current status of all machines as JSON, long-polls like BoardStatusView"""
+    data = staticmethod(machine_status)
+
+
+@method_decorator(ajax_login_required, name='dispatch')
+class MemberSearchView(View):
+    """Members whose name or email starts with ?q= as JSON"""
+
+    def get(self, request):
+        if not request.user.has_perm('members.view_members'):
+            return JsonResponse('Forbidden', status=403, safe=False)
+        term = request.GET.get('q', '').strip()
+        with use_replica():
+            data = member_search(term) if term else {'members': []}
+        response = JsonResponse(data)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "digitalFablog.settings")
 
 application = get_wsgi_application()
+
+# imports the views and compiles the templates before the first request
+from digitalFablog.startup import warm_up  # noqa: E402
+warm_up()
@@ -1,6 +1,13 @@
 #!/bin/bash
 
 python manage.py makemigrations
+# duplicate FabDays of older versions would fail the unique date
+python manage.py merge_fabdays
 python manage.py migrate
 python manage.py loaddata initial_cashier initial_machines initial_materials initial_authgroups initial_memberships
-python manage.py runserver 0.0.0.0:80
+if [ "$DEBUG" = "True" ]; then
+    python manage.py runserver 0.0.0.0:80
+else
+    python manage.py collectstatic --noinput
+    exec gunicorn -c python:digitalFablog.gunicorn --bind 0.0.0.0:80 digitalFablog.wsgi
+fi
@@ -1,5 +1,7 @@
 from django.contrib import admin
 from .models import Fablog, MachinesUsed, MaterialsUsed, FablogMemberships, FablogPayments, FablogBookings, FabDay
+from cashier.models import ArchivedBooking
+from digitalFablog.routers import ReplicaChangelistMixin
 
 
 class MachinesUsedInline(admin.TabularInline):
@@ -30,9 +32,23 @@ class FablogBookingsInline(admin.TabularInline):
     extra = 1
 
 
-class FablogAdmin(admin.ModelAdmin):
+class ArchivedBookingsInline(admin.TabularInline):
+    """Bookings of archived financial years, read-only"""
+    model = ArchivedBooking
+    fields = ('financial_year', 'timestamp', 'journal', 'account', 'amount', 'text')
+    readonly_fields = fields
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class FablogAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     inlines = (MachinesUsedInline, MaterialsUsedInline, FablogMembershipsInline,
-               FablogBookingsInline, FablogPaymentsInline)
+               FablogBookingsInline, ArchivedBookingsInline, FablogPaymentsInline)
     readonly_fields = ("total_machines", "total_materials", "total_memberships", "total")
 
 
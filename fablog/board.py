@@ -0,0 +1,110 @@
+"""
+    the board of the lab: today's open fablogs, the machines in use and the machine states
+
+    Read as JSON by board screens, which long-poll for changes when served by digitalFablog.asgi. All
+    board data is cached in the 'board' namespace. Its version changes whenever a fablog, a machine
+    position or a machine status is saved (see fablog.signals), so it doubles as change notification.
+"""
+# base
+import time
+
+# django
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+# local
+from utils.cache import Namespace
+
+# no local tier, waiting clients must see a new version right away
+board_cache = Namespace('board', timeout=600, local_timeout=0)
+
+
+def board_version():
+    return board_cache.version()
+
+
+def long_poll_params(params):
+    """
+    The version a client has and how many seconds it is willing to wait for a newer one.
+
+    Clients without a version (or with wait=0) are answered right away.
+    """
+    version = params.get('version') or None
+    try:
+        wait = max(0, min(int(params.get('wait', 0)), settings.BOARD_LONG_POLL_TIMEOUT))
+    except ValueError:
+        wait = 0
+    return version, wait if version else 0
+
+
+def wait_for_change(version, wait):
+    """Block until the board version differs from `version`, for at most `wait` seconds"""
+    deadline = time.monotonic() + wait
+    current = board_version()
+    while str(current) == version and time.monotonic() < deadline:
+        time.sleep(settings.BOARD_POLL_INTERVAL)
+        current = board_version()
+    return current
+
+
+def load_board():
+    Fablog = apps.get_model('fablog', 'Fablog')
+    fablogs = Fablog.objects.filter(fabday__date=timezone.localdate(), closed_at__isnull=True).select_related(
+        'member').prefetch_related('machinesused_set__machine').order_by('created_at')
+    return {
+        'date': timezone.localdate().isoformat(),
+        'fablogs': [{
+            'id': fablog.id,
+            'member': fablog.member.get_full_name() if fablog.member else None,
+            'created_at': fablog.created_at.isoformat(),
+            'machines_in_use': [
+                x.machine.name for x in fablog.machinesused_set.all() if x.start_time and not x.end_time],
+        } for fablog in fablogs],
+    }
+
+
+def load_machine_status():
+    Machine = apps.get_model('machines', 'Machine')
+    MachineStatus = apps.get_model('machines', 'MachineStatus')
+    current = {}
+    # ordered by start time, the latest status of a machine wins
+    for machine_status in MachineStatus.objects.current().select_related('status').order_by('start_time'):
+        current[machine_status.machine_id] = machine_status
+    machines = []
+    for machine in Machine.objects.all():
+        machine_status = current.get(machine.id)
+        machines.append({
+            'id': machine.id,
+            'name': machine.name,
+            'abbreviation': machine.abbreviation,
+            'color': machine.color,
+            'status': machine_status.status.name if machine_status and machine_status.status else "OK",
+            'severity': machine_status.status.severity if machine_status and machine_status.status else 0,
+            'details': machine_status.details if machine_status else '',
+        })
+    return {'machines': machines}
+
+
+def board_status():
+    """Today's open fablogs and the machines in use, with the version to wait for changes on"""
+    version = board_version()
+    return dict(board_cache.get_or_set('status', load_board), version=version)
+
+
+def machine_status():
+    """Current status of all machines, with the version to wait for changes on"""
+    version = board_version()
+    return dict(board_cache.get_or_set('machines', load_machine_status), version=version)
+
+
+def member_search(term, limit=20):
+    User = apps.get_model('members', 'User')
+    users = User.objects.search(term).order_by('search_name', 'id').only(
+        'id', 'first_name', 'last_name', 'email', 'membership_end_date')[:limit]
+    return {'members': [{
+        'id': user.id,
+        'name': user.get_full_name(),
+        'email': user.email,
+        'membership_end_date': user.membership_end_date.isoformat() if user.membership_end_date else None,
+    } for user in users]}
@@ -2,7 +2,7 @@
 from datetime import timedelta
 
 # django
-from django.forms import ModelForm, ModelChoiceField, Select, BaseInlineFormSet
+from django.forms import ModelForm, ModelChoiceField, Select, TextInput, BaseInlineFormSet
 from django.utils.translation import gettext_lazy as _
 
 # additional
@@ -11,6 +11,10 @@ from extra_views import InlineFormSetFactory
 # local
 from .models import Fablog, MachinesUsed, MaterialsUsed, FablogMemberships
 from members.models import User
+from utils.cache import Namespace, hash_key
+
+# choices of select fields of machines, materials and memberships, shared by all processes
+choice_cache = Namespace('choices')
 
 
 class FablogForm(ModelForm):
@@ -30,7 +34,46 @@ class NewFablogForm(ModelForm):
         fields = ("created_at", "member", )
 
 
-class FablogMachinesUsedInlineFormset(BaseInlineFormSet):
+class SharedChoicesMixin:
+    """
+    Evaluate the choices of select fields once per formset, and cache them across requests.
+
+    Otherwise every form in the formset runs the queryset of its ModelChoiceFields again when rendered.
+    The cache is invalidated whenever a machine, material or membership changes (see fablog.signals).
+    """
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        shared_choices = self.__dict__.setdefault('_shared_choices', {})
+        for name, field in form.fields.items():
+            if isinstance(field, ModelChoiceField) and isinstance(field.widget, Select):
+                if name not in shared_choices:
+                    shared_choices[name] = self.cached_choices(field)
+                field.choices = shared_choices[name]
+        return form
+
+    @staticmethod
+    def cached_choices(field):
+        sql, params = field.queryset.query.sql_with_params()
+        # not list(), it asks the iterator for its length first, which is an extra COUNT query
+        return choice_cache.get_or_set(
+            hash_key(sql, params, str(field.empty_label)), lambda: [choice for choice in field.choices])
+
+
+class ParentInstanceMixin:
+    """
+    Give the instances of the forms the parent object, not just its id.
+
+    Positions are priced at the date of their fablog, which would otherwise be fetched once per form.
+    """
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        setattr(form.instance, self.fk.name, self.instance)
+        return form
+
+
+class FablogMachinesUsedInlineFormset(ParentInstanceMixin, SharedChoicesMixin, BaseInlineFormSet):
 
     def close_check(self, valid):
         form_valid = True
@@ -42,7 +85,7 @@ class FablogMachinesUsedInlineFormset(BaseInlineFormSet):
         return form_valid
 
 
-class FablogMembershipInlineFormset(BaseInlineFormSet):
+class FablogMembershipInlineFormset(ParentInstanceMixin, SharedChoicesMixin, BaseInlineFormSet):
 
     def close_check(self, valid):
         if not valid:
@@ -57,7 +100,7 @@ class FablogMembershipInlineFormset(BaseInlineFormSet):
             return True
 
 
-class FablogInlineFormset(BaseInlineFormSet):
+class FablogInlineFormset(ParentInstanceMixin, SharedChoicesMixin, BaseInlineFormSet):
 
     def close_check(self, valid):
         return True
@@ -66,6 +109,7 @@ class FablogInlineFormset(BaseInlineFormSet):
 class MachinesUsedInline(InlineFormSetFactory):
     model = MachinesUsed
     formset_class = FablogMachinesUsedInlineFormset
+    formset_kwargs = {'queryset': MachinesUsed.objects.select_related('machine')}
     factory_kwargs = {
         'extra': 1,
         'fields': ("machine", "start_time", "end_time"),
@@ -75,16 +119,20 @@ class MachinesUsedInline(InlineFormSetFactory):
 class MaterialsUsedInline(InlineFormSetFactory):
     model = MaterialsUsed
     formset_class = FablogInlineFormset
+    formset_kwargs = {'queryset': MaterialsUsed.objects.select_related('material')}
     factory_kwargs = {
         'extra': 1,
         'fields': '__all__',
-        'widgets': {'material': Select(attrs={'class': "custom-select"})}
+        'widgets': {
+            'material': Select(attrs={'class': "custom-select", 'data-prefill': "price_per_unit"}),
+            'variant': TextInput(attrs={'list': "material-variants", 'data-prefill': "price_per_unit"})}
     }
 
 
 class FablogMembershipsInline(InlineFormSetFactory):
     model = FablogMemberships
     formset_class = FablogMembershipInlineFormset
+    formset_kwargs = {'queryset': FablogMemberships.objects.select_related('membership')}
     factory_kwargs = {
         'extra': 1,
         'max_num': 1,
@@ -93,8 +141,9 @@ class FablogMembershipsInline(InlineFormSetFactory):
     }
 
     def get_initial(self):
-        if self.object.member.membership.exists():
-            end_date_previous = self.object.member.membership.first().end_date
+        previous_membership = self.object.member.membership.first()
+        if previous_membership is not None:
+            end_date_previous = previous_membership.end_date
             # set start date to the next day after expiry
             start_date = end_date_previous + timedelta(days=1)
             # set end_date to the same date the next year (sorry for the leap year folks ;))
@@ -0,0 +1,111 @@
+# base
+import asyncio
+import json
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+
+# django
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+# local
+from fablog.board import board_cache
+from members.models import User
+
+
+async def get(host, port, path, cookie, timeout):
+    """GET path on a fresh connection, return the status and the body"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write((
+            "GET {0} HTTP/1.1\r\nHost: {1}\r\nCookie: {2}\r\nConnection: close\r\n\r\n".format(path, host, cookie)
+        ).encode('latin1'))
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _sep, body = response.partition(b'\r\n\r\n')
+    return int(head.split(b' ', 2)[1]), body
+
+
+class Command(BaseCommand):
+    help = (
+        "Hold concurrent long-polling board clients against a running server, e.g. "
+        "'uvicorn digitalFablog.asgi:application' or 'gunicorn digitalFablog.wsgi', then change the board. "
+        "Reports how long a probe request takes while the clients wait, and how long it takes until all "
+        "clients have their answer after the change. Server and command must share the cache and database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="base url of the server")
+        parser.add_argument('--clients', default='10,50,200', help="comma separated numbers of clients")
+        parser.add_argument('--login', default='labmanager@load.test', help="email of the board user")
+        parser.add_argument('--hold', type=float, default=3, help="seconds to hold the clients before the change")
+        parser.add_argument('--wait', type=int, default=settings.BOARD_LONG_POLL_TIMEOUT,
+                            help="seconds the clients are willing to wait")
+        parser.add_argument('--output', help="write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        self.host, self.port = url.hostname, url.port or 80
+        self.cookie = self.login(options['login'])
+        results = {}
+        for clients in [int(x) for x in options['clients'].split(',')]:
+            result = asyncio.get_event_loop().run_until_complete(
+                self.measure(clients, options['hold'], options['wait']))
+            results[clients] = result
+            self.stdout.write(
+                "{0:>5} clients  probe while waiting {probe_ms:>8} ms  all answered {answered_ms:>8} ms after "
+                "the change  answered {answered:>5}  failed {failed:>5}".format(clients, **result))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+    def login(self, email):
+        try:
+            user = User.objects.get(email=email)
+        except User.DoesNotExist:
+            raise CommandError("No user {0}, generate load data first".format(email))
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return '{0}={1}'.format(settings.SESSION_COOKIE_NAME, session.session_key)
+
+    async def measure(self, clients, hold, wait):
+        timeout = hold + wait + 30
+        status, body = await get(self.host, self.port, reverse('board'), self.cookie, timeout)
+        if status != 200:
+            raise CommandError("{0} returned {1}".format(reverse('board'), status))
+        path = '{0}?version={1}&wait={2}'.format(reverse('board'), json.loads(body.decode())['version'], wait)
+
+        async def client():
+            try:
+                status, _body = await get(self.host, self.port, path, self.cookie, timeout)
+            except (OSError, asyncio.TimeoutError):
+                return None
+            return time.perf_counter() if status == 200 else None
+
+        waiting = [asyncio.ensure_future(client()) for i in range(clients)]
+        await asyncio.sleep(hold / 2)
+        start = time.perf_counter()
+        try:
+            await get(self.host, self.port, reverse('ready'), '', timeout)
+            probe_ms = round((time.perf_counter() - start) * 1000, 1)
+        except (OSError, asyncio.TimeoutError):
+            probe_ms = None
+        await asyncio.sleep(hold / 2)
+
+        board_cache.invalidate()
+        changed = time.perf_counter()
+        answers = await asyncio.gather(*waiting)
+        answered = [x for x in answers if x is not None]
+        return {
+            'probe_ms': probe_ms,
+            'answered_ms': round((max(answered) - changed) * 1000, 1) if answered else None,
+            'answered': len(answered),
+            'failed': clients - len(answered),
+        }
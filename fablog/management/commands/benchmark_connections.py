@@ -0,0 +1,83 @@
+# base
+import json
+import time
+
+# django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import Client
+from django.urls import reverse
+
+# local
+from members.models import User
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare request latency with a new database connection per request (DATABASE_CONN_MAX_AGE=0) and "
+        "with persistent connections. Requests are served in process; connections are handled at the start "
+        "and end of every request like the WSGI handler does. Point DATABASE_URL at PgBouncer to measure the "
+        "pooled setup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="timed requests per mode")
+        parser.add_argument('--url', help="url to request, defaults to the readiness probe")
+        parser.add_argument('--login', help="email of the user to log in as, e.g. labmanager@load.test")
+        parser.add_argument('--max-age', type=int, default=600, help="CONN_MAX_AGE of the persistent mode")
+        parser.add_argument('--output', help="write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        url = options['url'] or reverse('ready')
+        client = Client()
+        if options['login']:
+            client.force_login(User.objects.get(email=options['login']))
+
+        results = {}
+        for mode, max_age in (('per_request', 0), ('persistent', options['max_age'])):
+            latencies = self.measure(client, url, max_age, options['requests'])
+            results[mode] = {
+                'conn_max_age': max_age,
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p90_ms': round(percentile(latencies, 90), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'mean_ms': round(sum(latencies) / len(latencies), 2),
+            }
+            self.stdout.write("{0:<12} CONN_MAX_AGE {1:>4}  p50 {p50_ms:>7.2f} ms  p90 {p90_ms:>7.2f} ms".format(
+                mode, max_age, **results[mode]))
+        saved = results['per_request']['p50_ms'] - results['persistent']['p50_ms']
+        self.stdout.write("persistent connections save {0:.2f} ms per request (p50)".format(saved))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+    def measure(self, client, url, max_age, count):
+        connection = connections['default']
+        original_max_age = connection.settings_dict['CONN_MAX_AGE']
+        connection.close()
+        # the connection reads its maximum age when it is opened
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        latencies = []
+        try:
+            # one untimed request to load the middleware and url configuration
+            for i in range(count + 1):
+                start = time.perf_counter()
+                # the test client skips the connection handling of request_started and request_finished
+                close_old_connections()
+                response = client.get(url)
+                close_old_connections()
+                duration = time.perf_counter() - start
+                if response.status_code >= 400:
+                    raise CommandError("{0} returned {1}".format(url, response.status_code))
+                if i:
+                    latencies.append(duration * 1000)
+        finally:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = original_max_age
+        return latencies
@@ -0,0 +1,83 @@
+# base
+import json
+import os
+import subprocess
+import sys
+import time
+from statistics import median
+
+# django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+# runs in a fresh interpreter: import the WSGI application and send it two requests
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from digitalFablog.wsgi import application
+imported = time.perf_counter()
+from io import BytesIO
+
+
+def request(path, host):
+    status = []
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': host,
+        'REMOTE_ADDR': '127.0.0.1', 'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False}
+    result = application(environ, lambda s, headers, exc_info=None: status.append(int(s.split()[0])))
+    b''.join(result)
+    result.close()
+    return status[0]
+
+
+status = request(sys.argv[1], sys.argv[2])
+first = time.perf_counter()
+request(sys.argv[1], sys.argv[2])
+second = time.perf_counter()
+print(json.dumps({'status': status, 'import': imported - start, 'first': first - imported, 'second': second - first}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the cold start of digitalFablog.wsgi in fresh processes: the import (Django setup and the warm "
+        "up of digitalFablog.startup), the first and a second response. Without preloading every worker pays "
+        "import and first response, with gunicorn's preload_app only the first response."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="number of fresh processes")
+        parser.add_argument('--url', help="page to request, defaults to the login page")
+        parser.add_argument('--host', default='localhost', help="host header, has to be in ALLOWED_HOSTS")
+
+    def handle(self, *args, **options):
+        url = options['url'] or reverse('login')
+        environment = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'digitalFablog.settings'))
+        runs = []
+        for i in range(options['runs']):
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, '-c', CHILD, url, options['host']], cwd=settings.BASE_DIR, env=environment,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+            process = time.perf_counter() - start
+            if result.returncode:
+                raise CommandError("The application failed to start:\n" + result.stderr)
+            run = json.loads(result.stdout.strip().splitlines()[-1])
+            if run['status'] >= 400:
+                raise CommandError("{0} returned {1}".format(url, run['status']))
+            run['process'] = process
+            runs.append(run)
+
+        def ms(key):
+            return median(run[key] for run in runs) * 1000
+
+        self.stdout.write("{0} fresh processes, GET {1}, median times:".format(len(runs), url))
+        self.stdout.write("  import of digitalFablog.wsgi        {0:>8.1f} ms".format(ms('import')))
+        self.stdout.write("  first response                     {0:>8.1f} ms".format(ms('first')))
+        self.stdout.write("  second response                    {0:>8.1f} ms".format(ms('second')))
+        self.stdout.write("  import to first response           {0:>8.1f} ms".format(ms('import') + ms('first')))
+        self.stdout.write("  process, including the interpreter {0:>8.1f} ms".format(ms('process')))
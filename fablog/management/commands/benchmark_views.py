@@ -0,0 +1,134 @@
+# base
+import json
+import time
+
+# django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+# local
+from cashier.models import Journal, PaymentMethod
+from fablog.models import Fablog
+from members.models import User
+from utils.query_budgets import form_data
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the main views against the current database (e.g. after generate_load_data) and record query "
+        "counts and latency percentiles as JSON. With --baseline the results are compared to a previous run "
+        "and the command fails on regressions. Requests that write are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help="timed requests per view")
+        parser.add_argument('--warmup', type=int, default=2, help="untimed requests per view")
+        parser.add_argument('--output', help="write the results to this JSON file")
+        parser.add_argument('--baseline', help="compare with the results in this JSON file")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="allowed latency increase (0.2 = 20%%)")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            results = self.run_benchmarks(options)
+        finally:
+            teardown_test_environment()
+
+        for name, result in results.items():
+            self.stdout.write("{0:<28} queries {1:>4}  p50 {2:>8.1f} ms  p90 {3:>8.1f} ms  p99 {4:>8.1f} ms".format(
+                name, result['queries'], result['p50_ms'], result['p90_ms'], result['p99_ms']))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def get_targets(self):
+        open_fablog = Fablog.objects.filter(closed_at__isnull=True).order_by('-created_at').first()
+        if open_fablog is None:
+            raise CommandError("No open fablog found, generate a dataset first (generate_load_data).")
+        journal = Journal.objects.get(default_account=True)
+        update_url = reverse('fablog:update', args=[open_fablog.pk])
+        payment_url = reverse('fablog:payment', args=[open_fablog.pk])
+        return [
+            ('home', 'get', reverse('fablog:home'), None),
+            ('fablog_update_get', 'get', update_url, None),
+            ('fablog_update_post', 'post', update_url, self.update_post_data),
+            ('fablog_payment_close', 'post', payment_url, lambda client, url: {
+                'amount': str(Fablog.objects.get(pk=open_fablog.pk).dues()),
+                'payment_method': PaymentMethod.objects.filter(selectable=True).values_list('pk', flat=True)[0]}),
+            ('member_list', 'get', reverse('members:members_list'), None),
+            ('journal_booking_list', 'get', reverse('cashier:account', args=[journal.pk]), None),
+        ]
+
+    def update_post_data(self, client, url):
+        """The data the update form would submit unchanged, with the save button"""
+        context = client.get(url).context
+        data = form_data(context['form'], {'save': ''})
+        for formset in context['inlines']:
+            management_form = formset.management_form
+            form_data(management_form, data)
+            for form in formset.forms:
+                form_data(form, data)
+        return data
+
+    def run_benchmarks(self, options):
+        client = Client()
+        user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError("No superuser found.")
+        client.force_login(user)
+
+        results = {}
+        for name, method, url, get_data in self.get_targets():
+            latencies = []
+            queries = 0
+            for i in range(options['warmup'] + options['iterations']):
+                data = get_data(client, url) if get_data else None
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        response = getattr(client, method)(url, data)
+                        duration = time.perf_counter() - start
+                    # keep the dataset unchanged
+                    transaction.set_rollback(True)
+                if response.status_code >= 400:
+                    raise CommandError("{0}: {1} returned {2}".format(name, url, response.status_code))
+                if i >= options['warmup']:
+                    latencies.append(duration * 1000)
+                    queries = max(queries, len(captured.captured_queries))
+            results[name] = {
+                'url': url,
+                'queries': queries,
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p90_ms': round(percentile(latencies, 90), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+            }
+        return results
+
+    def compare(self, results, baseline_file, tolerance):
+        with open(baseline_file) as baseline_input:
+            baseline = json.load(baseline_input)
+        regressions = []
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            if result['queries'] > previous['queries']:
+                regressions.append("{0}: {1} queries (baseline {2})".format(
+                    name, result['queries'], previous['queries']))
+            if result['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+                regressions.append("{0}: p50 {1} ms (baseline {2} ms)".format(
+                    name, result['p50_ms'], previous['p50_ms']))
+        if regressions:
+            raise CommandError("Regressions:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions compared to {0}.".format(baseline_file)))
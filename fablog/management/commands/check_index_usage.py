@@ -0,0 +1,159 @@
+# base
+import re
+from datetime import timedelta
+from io import StringIO
+
+# django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.utils import timezone
+
+# local
+from cashier.models import Booking, CashCount, Journal, JournalBalance
+from fablog.models import Fablog, FabDay, MachinesUsed
+from machines.models import Machine, MachineStatus, Status
+from members.models import Membership, User
+from utils.indexes import PartialIndex
+from utils.pagination import KeysetPaginator
+
+# plan lines, PostgreSQL: "Seq Scan on t", "Index Scan using i on t", "Bitmap Heap Scan on t", "Sort",
+# SQLite: "SCAN t", "SCAN TABLE t USING INDEX i", "SEARCH t USING INDEX i (...)", "USE TEMP B-TREE FOR ORDER BY"
+POSTGRES_FULL_SCAN = r'Seq Scan on {0}\b'
+POSTGRES_INDEX_SCAN = r'(?:Index(?: Only)? Scan(?: Backward)? using \w+|Bitmap Heap Scan) on {0}\b'
+POSTGRES_INDEX = re.compile(r'(?:using|Bitmap Index Scan on) (\w+)')
+POSTGRES_SORT = re.compile(r'\bSort\b')
+SQLITE_FULL_SCAN = r'SCAN(?: TABLE)? {0}\b(?! USING)'
+SQLITE_INDEX_SCAN = r'(?:SCAN|SEARCH)(?: TABLE)? {0}\b(?: AS \w+)? USING'
+# reads the whole index in its order, and the table row of every entry
+SQLITE_INDEX_WALK = r'SCAN(?: TABLE)? {0}\b(?: AS \w+)? USING (?:COVERING )?INDEX (\w+)'
+SQLITE_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR')
+
+
+def main_queries():
+    """(name, model, queryset) of the hot queries, against the data at hand"""
+    fabday = FabDay.objects.order_by('-date').first()
+    member = Fablog.objects.exclude(member=None).order_by('-created_at').values_list('member', flat=True).first()
+    journal = Journal.objects.filter(default_account=True).first()
+    now = timezone.now()
+    # a page in the middle of the member list, by name and by end of membership
+    members = User.objects.exclude(membership_end_date=None)
+    middle = members.order_by('search_name', 'pk')[members.count() // 2:].first()
+    by_name = KeysetPaginator(User.objects.all(), 'search_name')
+    by_end_date = KeysetPaginator(User.objects.all(), 'membership_end_date', descending=True)
+    return [
+        ('fablogs of a day', Fablog, Fablog.objects.filter(fabday=fabday)),
+        ('open fablogs of today', Fablog, Fablog.objects.filter(
+            fabday__date=timezone.localdate(), closed_at__isnull=True).order_by('created_at')),
+        ('fablogs of a member', Fablog, Fablog.objects.filter(member=member)[:20]),
+        ('latest fablogs', Fablog, Fablog.objects.all()[:50]),
+        ('running machines', MachinesUsed, MachinesUsed.objects.filter(end_time__isnull=True)),
+        ('current machine statuses', MachineStatus, MachineStatus.objects.current()),
+        ('statuses of a machine', MachineStatus, MachineStatus.objects.filter(machine=Machine.objects.first())[:20]),
+        ('latest balance of a journal', JournalBalance,
+         JournalBalance.objects.filter(journal=journal).order_by('-id')[:1]),
+        ('bookings of a journal', Booking, Booking.objects.filter(journal=journal)[:50]),
+        ('bookings of a day', Booking,
+         Booking.objects.filter(timestamp__gte=now - timedelta(days=1), timestamp__lt=now)),
+        ('memberships of a member', Membership, Membership.objects.filter(member=member)),
+        ('latest cash counts', CashCount, CashCount.objects.all()[:50]),
+        ('member list page by name', User,
+         by_name.seek(False, (middle.search_name, middle.pk))[:51] if middle else User.objects.none()),
+        ('member list page by status', User,
+         by_end_date.seek(False, (middle.membership_end_date, middle.pk))[:51] if middle else User.objects.none()),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a dataset in a test database and check that the hot queries (fablogs by day and member, "
+        "open fablogs, running machines, machine statuses, bookings, balances, memberships, cash counts, pages "
+        "of the member list) read their tables through an index instead of scanning them. Tables with fewer than "
+        "--min-rows rows are skipped, the planner rightly scans small tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help="members of the dataset")
+        parser.add_argument('--days', type=int, default=120, help="open lab days of the dataset")
+        parser.add_argument('--fablogs-per-day', type=int, default=20, help="fablogs per open lab day")
+        parser.add_argument('--min-rows', type=int, default=1000, help="smallest table to check")
+        parser.add_argument('--verbose-plans', action='store_true', help="print the query plans")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            failures = self.check_plans(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        if failures:
+            raise CommandError("Full table scans: " + ", ".join(failures))
+        self.stdout.write(self.style.SUCCESS("All main queries use an index."))
+
+    def check_plans(self, options):
+        call_command(
+            'generate_load_data', users=options['users'], days=options['days'],
+            fablogs_per_day=options['fablogs_per_day'], weekdays='0,1,2,3,4,5,6', stdout=StringIO())
+        self.make_machine_statuses(options['days'])
+        models = {model for name, model, queryset in main_queries()}
+        with connection.cursor() as cursor:
+            for model in models:
+                cursor.execute('ANALYZE ' + connection.ops.quote_name(model._meta.db_table))
+
+        if connection.vendor == 'postgresql':
+            full_scan, index_scan, index_walk = POSTGRES_FULL_SCAN, POSTGRES_INDEX_SCAN, None
+            index_name, sort = POSTGRES_INDEX, POSTGRES_SORT
+        elif connection.vendor == 'sqlite':
+            full_scan, index_scan, index_walk = SQLITE_FULL_SCAN, SQLITE_INDEX_SCAN, SQLITE_INDEX_WALK
+            index_name, sort = SQLITE_INDEX, SQLITE_SORT
+        else:
+            raise CommandError("Query plans of {0} are not supported".format(connection.vendor))
+
+        failures = []
+        for name, model, queryset in main_queries():
+            table = model._meta.db_table
+            rows = model._base_manager.count()
+            if rows < options['min_rows']:
+                self.stdout.write("{0:<30} skipped, {1} rows in {2}".format(name, rows, table))
+                continue
+            plan = queryset.explain()
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+            if re.search(full_scan.format(re.escape(table)), plan) or not re.search(
+                    index_scan.format(re.escape(table)), plan) or self.walks_index(queryset, plan, index_walk):
+                result = "full scan"
+                failures.append(name)
+            else:
+                result = "index " + ", ".join(sorted(set(index_name.findall(plan))))
+                if sort.search(plan):
+                    result += " (sorted)"
+            self.stdout.write("{0:<30} {1:>8} rows  {2}".format(name, rows, result))
+        return failures
+
+    @staticmethod
+    def walks_index(queryset, plan, index_walk):
+        """
+        A filtered query reading a whole index, i.e. the order of an index without a condition on it. Fine for a
+        partial index, which only holds the matching rows, and for unfiltered queries ("latest 50").
+        """
+        if index_walk is None or not queryset.query.where:
+            return False
+        partial = {index.name for index in queryset.model._meta.indexes if isinstance(index, PartialIndex)}
+        walked = re.findall(index_walk.format(re.escape(queryset.model._meta.db_table)), plan)
+        return any(name not in partial for name in walked)
+
+    def make_machine_statuses(self, days):
+        """A status history per machine: maintenance windows over the dataset, some still open"""
+        status = Status.objects.create(name='maintenance', severity=1)
+        now = timezone.now()
+        statuses = []
+        for machine in Machine.objects.all():
+            for day in range(days * 3):
+                start = now - timedelta(days=days) + timedelta(hours=8 * day)
+                statuses.append(MachineStatus(
+                    machine=machine, status=status, start_time=start, end_time=start + timedelta(hours=2)))
+            statuses.append(MachineStatus(machine=machine, status=status, start_time=now - timedelta(hours=1)))
+        MachineStatus.objects.bulk_create(statuses)
@@ -0,0 +1,181 @@
+# base
+from collections import Counter
+from datetime import date, timedelta
+from io import StringIO
+from os import path
+
+# django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+from django.urls import reverse
+from django.utils import timezone
+
+# local
+from cashier.models import Journal, PaymentMethod
+from digitalFablog.middleware import fingerprint
+from fablog.models import Fablog, FabDay, FablogMemberships, MachinesUsed, MaterialsUsed
+from machines.models import Machine, machine_prices
+from materials.models import Material, material_prices
+from members.models import Membership, User
+from memberships.models import Membership as MembershipType, membership_prices
+from utils.cache import clear_local
+from utils.query_budgets import BUDGETS, form_data
+
+
+class Probe:
+    """Fablogs with a fixed set of positions, so only the surrounding dataset differs between runs"""
+
+    def __init__(self):
+        self.labmanager = User.objects.get(email='labmanager@load.test')
+        # a new member without membership history
+        member = User.objects.create_user(
+            email='probe@load.test', first_name='Probe', last_name='Member', street_and_number='-', zip_code='8000',
+            city='Zürich', phone='-', birthday=date(1990, 1, 1), password=None)
+        fabday = FabDay.objects.get(date=date.today())
+        self.fablog = self.make_fablog(member, fabday)
+        self.open_fablog = [self.fablog.pk]
+        closed = self.make_fablog(member, fabday)
+        closed.closed_at = timezone.now()
+        closed.closed_by = self.labmanager
+        closed.save()
+        self.closed_fablog = [closed.pk]
+        self.journal = [Journal.objects.get(default_account=True).pk]
+        self.fabday = [fabday.pk]
+        membership = Membership.objects.exclude(legitimation='').order_by('pk').first()
+        self.legitimation = membership and [membership.pk, 'original', path.basename(membership.legitimation.name)]
+
+    def make_fablog(self, member, fabday):
+        fablog = Fablog.objects.create(created_by=self.labmanager, member=member, fabday=fabday)
+        start = timezone.now() - timedelta(hours=1)
+        for machine, end_time in zip(Machine.objects.order_by('pk')[:2], [start + timedelta(minutes=30), None]):
+            MachinesUsed.objects.create(fablog=fablog, machine=machine, start_time=start, end_time=end_time)
+        MaterialsUsed.objects.create(fablog=fablog, material=Material.objects.order_by('pk').first(), units=2)
+        FablogMemberships.objects.create(fablog=fablog, membership=MembershipType.objects.order_by('pk').first())
+        return fablog
+
+    def update_data(self, client, url):
+        context = client.get(url).context
+        data = form_data(context['form'], {'save': ''})
+        for formset in context['inlines']:
+            form_data(formset.management_form, data)
+            for form in formset.forms:
+                form_data(form, data)
+        return data
+
+    def cash_count_data(self, client, url):
+        data = form_data(client.get(url).context['form'], {})
+        data.update(cashier_date=date.today().isoformat(), total='100.00')
+        return data
+
+    def payment_data(self, client, url):
+        return {
+            'amount': str(Fablog.objects.get(pk=self.fablog.pk).dues()),
+            'payment_method': PaymentMethod.objects.filter(selectable=True).values_list('pk', flat=True)[0]}
+
+
+class Command(BaseCommand):
+    help = (
+        "Render every view of the fablog, cashier and members apps against test databases with a growing "
+        "number of fablogs per day and check the query counts against the budgets in utils.query_budgets. "
+        "Fails if a view exceeds its budget or needs more queries on a larger dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,10,100', help="fablogs per day of the datasets")
+        parser.add_argument('--days', type=int, default=3, help="open lab days per dataset")
+        parser.add_argument('--users', type=int, default=200, help="members per dataset")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            runs = {size: self.measure(size, options) for size in sizes}
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        self.evaluate(sizes, runs)
+
+    def check_budgets(self, sizes, days, users):
+        """Measure and evaluate in the current (test) database, which is flushed for every dataset"""
+        self.evaluate(sizes, {size: self.measure(size, {'days': days, 'users': users}) for size in sizes})
+
+    def evaluate(self, sizes, runs):
+        failures = []
+        for budget in BUDGETS:
+            queries = [runs[size].get(budget) for size in sizes]
+            if queries[0] is None:
+                self.stdout.write("{0:<32} skipped, nothing to request in the dataset".format(budget.name))
+                continue
+            counts = [len(q) for q in queries]
+            problems = []
+            if max(counts) > budget.max_queries:
+                problems.append("over budget ({0})".format(budget.max_queries))
+            if counts[-1] > counts[0]:
+                problems.append("grows with the data")
+            self.stdout.write("{0:<32} {1}  budget {2:>3}  {3}".format(
+                budget.name,
+                "  ".join("{0:>4}: {1:>4}".format(size, count) for size, count in zip(sizes, counts)),
+                budget.max_queries,
+                ", ".join(problems) or "ok"))
+            if problems:
+                failures.append(budget.name)
+                self.report_repeated(queries[0], queries[-1])
+
+        if failures:
+            raise CommandError("Query budgets exceeded: " + ", ".join(failures))
+        self.stdout.write(self.style.SUCCESS("All views within their query budgets."))
+
+    def measure(self, size, options):
+        call_command('flush', interactive=False, verbosity=0)
+        # flush sends no delete signals, the process caches must be dropped explicitly
+        for index in (machine_prices, material_prices, membership_prices):
+            index.invalidate()
+        cache.clear()
+        clear_local()
+        call_command(
+            'generate_load_data', users=options['users'], days=options['days'], fablogs_per_day=size,
+            weekdays='0,1,2,3,4,5,6', stdout=StringIO())
+        probe = Probe()
+        client = Client()
+        client.force_login(probe.labmanager)
+
+        results = {}
+        for budget in BUDGETS:
+            args = getattr(probe, budget.args) if budget.args else []
+            if args is None:
+                continue
+            url = reverse(budget.url_name, args=args)
+            # the first request fills the per process caches (content types, price lists, ...)
+            for i in range(2):
+                data = getattr(probe, budget.data)(client, url) if budget.data else None
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as captured:
+                        response = getattr(client, budget.method)(url, data)
+                        if response.streaming:
+                            # streamed responses query while they are read
+                            b''.join(response.streaming_content)
+                    transaction.set_rollback(True)
+                if response.status_code >= 400:
+                    raise CommandError("{0}: {1} returned {2}".format(budget.name, url, response.status_code))
+                if budget.method == 'post' and response.status_code != 302:
+                    # a rerendered form measures the validation errors, not the view
+                    raise CommandError("{0}: {1} did not accept the data".format(budget.name, url))
+            results[budget] = [query['sql'] for query in captured.captured_queries]
+        return results
+
+    def report_repeated(self, smallest, largest):
+        """List the queries which are repeated, most often (or most grown) first"""
+        before = Counter(fingerprint(sql) for sql in smallest)
+        after = Counter(fingerprint(sql) for sql in largest)
+        repeated = sorted(
+            ((count, before[sql], sql) for sql, count in after.items() if count > 1),
+            key=lambda item: (item[0] - item[1], item[0]), reverse=True)
+        for count, count_before, sql in repeated:
+            self.stdout.write("    {0:>4}x (smallest dataset {1:>3}x)  {2}".format(
+                count, count_before, sql if len(sql) <= 300 else sql[:297] + '...'))
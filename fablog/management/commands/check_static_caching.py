@@ -0,0 +1,111 @@
+# base
+import gzip
+import re
+from urllib.parse import urljoin, urlsplit
+
+# django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+# local
+from digitalFablog.storage import brotli
+from members.models import User
+
+ASSET = re.compile(r'(?:src|href)=["\']?([^"\'\s>]+)')
+CSS_URL = re.compile(r'url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)')
+
+
+def decode(response, content):
+    encoding = response.get('Content-Encoding')
+    if encoding == 'gzip':
+        return gzip.decompress(content)
+    if encoding == 'br':
+        return brotli.decompress(content)
+    return content
+
+
+class Command(BaseCommand):
+    help = (
+        "Load pages twice like a browser, first with an empty then with a warm cache, and report the static "
+        "bytes transferred. Fails unless the repeat load transfers no static bytes at all. Run collectstatic "
+        "first, with STATIC_MANIFEST=True and STATIC_SERVE=True."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--login', default='labmanager@load.test',
+                            help="email of the user to log in as, empty for the login page only")
+        parser.add_argument('--page', action='append', help="page to load, defaults to the main pages")
+
+    def handle(self, *args, **options):
+        if not settings.STATIC_SERVE:
+            raise CommandError("Static files are not served, set STATIC_SERVE=True")
+        client = Client(HTTP_ACCEPT_ENCODING='br, gzip')
+        pages = options['page'] or [reverse('login')]
+        if options['login']:
+            client.force_login(User.objects.get(email=options['login']))
+            if not options['page']:
+                pages = [reverse('fablog:home'), reverse('fablog:create'), reverse('members:members_list')]
+
+        browser_cache = {}
+        first = self.load(client, pages, browser_cache)
+        for url, entry in sorted(browser_cache.items()):
+            self.stdout.write("{0:>9} B  {1:<5} {2:<36} {3}".format(
+                entry['bytes'], entry['encoding'] or '-', entry['cache_control'], url))
+        repeat = self.load(client, pages, browser_cache)
+        self.stdout.write("first load:  {0} requests, {1} bytes".format(*first))
+        self.stdout.write("repeat load: {0} requests, {1} bytes".format(*repeat))
+
+        revalidated = [url for url, entry in browser_cache.items() if 'immutable' not in entry['cache_control']]
+        if revalidated:
+            self.stdout.write(self.style.WARNING(
+                "not cached as immutable (unhashed, revalidated on every load): " + ", ".join(sorted(revalidated))))
+        if repeat[1]:
+            raise CommandError("The repeat load transferred {0} static bytes".format(repeat[1]))
+        self.stdout.write(self.style.SUCCESS("Repeat loads transfer no static bytes."))
+
+    def load(self, client, pages, browser_cache):
+        """Load the pages with their static files, return the number of static requests and bytes"""
+        requests = transferred = 0
+        for page in pages:
+            response = client.get(page, follow=True)
+            if response.status_code != 200:
+                raise CommandError("{0} returned {1}".format(page, response.status_code))
+            queue = [url for url in ASSET.findall(response.content.decode())
+                     if url.startswith(settings.STATIC_URL)]
+            seen = set()
+            while queue:
+                url = urlsplit(queue.pop(0)).path
+                if url in seen:
+                    continue
+                seen.add(url)
+                entry = browser_cache.get(url)
+                if entry and 'immutable' in entry['cache_control']:
+                    # answered from the browser cache without a request
+                    queue.extend(entry['references'])
+                    continue
+                headers = {'HTTP_IF_NONE_MATCH': entry['etag']} if entry else {}
+                response = client.get(url, **headers)
+                requests += 1
+                if response.status_code == 304:
+                    queue.extend(entry['references'])
+                    continue
+                if response.status_code != 200:
+                    raise CommandError("{0} returned {1}".format(url, response.status_code))
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+                transferred += len(content)
+                references = []
+                if url.endswith('.css'):
+                    references = [urljoin(url, x) for x in CSS_URL.findall(decode(response, content).decode())
+                                  if not x.startswith('data:')]
+                    references = [x for x in references if x.startswith(settings.STATIC_URL)]
+                browser_cache[url] = {
+                    'etag': response.get('ETag', ''),
+                    'cache_control': response.get('Cache-Control', ''),
+                    'encoding': response.get('Content-Encoding'),
+                    'bytes': len(content),
+                    'references': references,
+                }
+                queue.extend(references)
+        return requests, transferred
@@ -0,0 +1,30 @@
+# django
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+# local
+from cashier.reports import close
+from fablog.models import FabDay
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the daily report of every past FabDay which has not been closed yet (run e.g. nightly from cron). "
+        "Days with open fablogs are left open and listed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until-year', type=int, help="only close the FabDays up to this year")
+
+    def handle(self, *args, **options):
+        fabdays = FabDay.objects.filter(date__lt=timezone.localdate(), daily_report__isnull=True).order_by('date')
+        if options['until_year']:
+            fabdays = fabdays.filter(date__year__lte=options['until_year'])
+        closed = 0
+        for fabday in fabdays:
+            try:
+                close(fabday)
+                closed += 1
+            except ValueError as error:
+                self.stdout.write("{0}: {1}".format(fabday.date, error))
+        self.stdout.write(self.style.SUCCESS("Closed {0} FabDays.".format(closed)))
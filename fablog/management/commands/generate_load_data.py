@@ -0,0 +1,254 @@
+# base
+import random
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from math import ceil
+
+# django
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+# local
+from cashier.models import Booking, CashCount, Journal, JournalBalance, Payment, PaymentMethod
+from fablog.models import (Fablog, FabDay, FablogBookings, FablogMemberships, FablogPayments, MachinesUsed,
+                           MaterialsUsed)
+from machines.models import Machine
+from materials.models import Material
+from members.models import Membership, User
+from memberships.models import Membership as MembershipType
+
+FIRST_NAMES = ['Anna', 'Beat', 'Claudia', 'Daniel', 'Eva', 'Fabian', 'Gabriela', 'Hans', 'Ines', 'Jonas',
+               'Karin', 'Lukas', 'Maria', 'Nico', 'Olivia', 'Peter', 'Rahel', 'Simon', 'Tanja', 'Urs']
+LAST_NAMES = ['Meier', 'Müller', 'Schmid', 'Keller', 'Weber', 'Huber', 'Schneider', 'Steiner', 'Fischer',
+              'Gerber', 'Brunner', 'Baumann', 'Frei', 'Zimmermann', 'Moser', 'Widmer', 'Wyss', 'Graf']
+CITIES = [('8000', 'Zürich'), ('8400', 'Winterthur'), ('3000', 'Bern'), ('4000', 'Basel')]
+
+
+@contextmanager
+def historic_timestamps(*fields):
+    """Let bulk_create write given values into auto_now_add fields"""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class IdAllocator:
+    """Hand out primary keys up front, so bulk created rows can be referenced on every database"""
+
+    def __init__(self, *models):
+        self.next_ids = {model: (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1 for model in models}
+
+    def __call__(self, model):
+        pk = self.next_ids[model]
+        self.next_ids[model] += 1
+        return pk
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk create a realistic, reproducible dataset for performance work: members, open lab days "
+        "with fablogs, machines, materials, memberships, payments, bookings and cash counts. "
+        "Do not run this against a production database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000, help="number of members")
+        parser.add_argument('--years', type=int, default=3, help="years of open lab days up to today")
+        parser.add_argument('--days', type=int, help="days of open lab days up to today, overrides --years")
+        parser.add_argument('--fablogs-per-day', type=int, default=15, help="average fablogs per open lab day")
+        parser.add_argument('--weekdays', default='1,3', help="open lab weekdays (0 = monday)")
+        parser.add_argument('--seed', type=int, default=42, help="random seed")
+        parser.add_argument('--batch-size', type=int, default=2000, help="rows per INSERT")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        if options['days'] is None:
+            options['days'] = 365 * options['years']
+        self.ensure_reference_data()
+
+        with transaction.atomic():
+            labmanager = self.make_labmanager()
+            members = self.make_users(options['users'])
+            self.make_fabdays(members, labmanager, options)
+            self.reset_sequences()
+        call_command('refresh_member_list', stdout=self.stdout)
+
+    def ensure_reference_data(self):
+        if not Machine.objects.exists():
+            call_command('loaddata', 'initial_cashier', 'initial_machines', 'initial_materials',
+                         'initial_memberships', stdout=self.stdout)
+        self.machines = list(Machine.objects.all())
+        self.materials = [(material, Decimal(self.random.randrange(100, 3000)) / 100)
+                          for material in Material.objects.all()]
+        self.membership_types = list(MembershipType.objects.all())
+        self.payment_methods = list(PaymentMethod.objects.filter(journal__isnull=False))
+        self.default_journal = Journal.objects.get(default_account=True)
+
+    def get_batch_size(self, model, objs):
+        # SQLite limits the number of rows per INSERT, Django does not cap an explicit batch size there
+        fields = [field for field in model._meta.concrete_fields]
+        return min(self.batch_size, connection.ops.bulk_batch_size(fields, objs) or self.batch_size)
+
+    def make_labmanager(self):
+        labmanager, new = User.objects.get_or_create(email='labmanager@load.test', defaults={
+            'first_name': 'Lab', 'last_name': 'Manager', 'street_and_number': '-', 'zip_code': '8000',
+            'city': 'Zürich', 'phone': '-', 'birthday': date(1980, 1, 1), 'is_staff': True, 'is_superuser': True})
+        if new:
+            labmanager.set_password('labmanager')
+            labmanager.save()
+        return labmanager
+
+    def make_users(self, count):
+        # hashing once is enough, all generated members share the password "member"
+        password = make_password('member')
+        offset = User.objects.count()
+        start = timezone.now() - timedelta(days=365 * 5)
+        users = []
+        for i in range(offset, offset + count):
+            zip_code, city = self.random.choice(CITIES)
+            user = User(
+                email='member{0}@load.test'.format(i),
+                first_name=self.random.choice(FIRST_NAMES),
+                last_name=self.random.choice(LAST_NAMES),
+                street_and_number='Teststrasse {0}'.format(i % 200 + 1),
+                zip_code=zip_code,
+                city=city,
+                phone='044 000 00 00',
+                birthday=date(1950, 1, 1) + timedelta(days=self.random.randrange(365 * 55)),
+                date_joined=start + timedelta(minutes=self.random.randrange(60 * 24 * 365 * 5)),
+                password=password)
+            user.update_search_name()
+            users.append(user)
+        User.objects.bulk_create(users, batch_size=self.get_batch_size(User, users))
+        self.stdout.write("{0} members".format(count))
+        return list(User.objects.filter(email__endswith='@load.test').exclude(
+            email='labmanager@load.test').values_list('pk', flat=True))
+
+    def open_days(self, days, weekdays):
+        day = date.today() - timedelta(days=days)
+        while day <= date.today():
+            if day.weekday() in weekdays:
+                yield day
+            day += timedelta(days=1)
+
+    def make_fabdays(self, members, labmanager, options):
+        weekdays = [int(x) for x in options['weekdays'].split(',')]
+        existing = set(FabDay.objects.values_list('date', flat=True))
+        FabDay.objects.bulk_create([
+            FabDay(date=day) for day in self.open_days(options['days'], weekdays) if day not in existing])
+        fabdays = list(FabDay.objects.filter(
+            date__gte=date.today() - timedelta(days=options['days'])).order_by('date'))
+
+        ids = IdAllocator(Fablog, Payment, Booking, JournalBalance, CashCount)
+        balances = {journal.pk: Decimal(0) for journal in Journal.objects.all()}
+        last_balance = dict(JournalBalance.objects.order_by('journal', 'id').values_list(
+            'journal', 'balance_expected'))
+        balances.update(last_balance)
+        paid_until = {}
+        rows = {model: [] for model in (Fablog, MachinesUsed, MaterialsUsed, FablogMemberships, Payment,
+                                        FablogPayments, JournalBalance, Booking, FablogBookings, CashCount,
+                                        Membership)}
+
+        def book(journal_id, account, amount, text, timestamp, booking_type=Booking.BOOKING, counted=None):
+            if booking_type == Booking.BOOKING:
+                balances[journal_id] += amount
+            balance = JournalBalance(id=ids(JournalBalance), journal_id=journal_id,
+                                     balance_expected=balances[journal_id], balance_counted=counted)
+            booking = Booking(id=ids(Booking), booking_type=booking_type, journal_id=journal_id,
+                              account=account, amount=amount if booking_type == Booking.BOOKING else 0,
+                              text=text, timestamp=timestamp, balance_id=balance.id)
+            rows[JournalBalance].append(balance)
+            rows[Booking].append(booking)
+            return booking
+
+        fablog_count = 0
+        for fabday in fabdays:
+            opening = timezone.make_aware(datetime.combine(fabday.date, time(18, 0)))
+            count = CashCount(id=ids(CashCount), created_by_id=labmanager.pk, created_at=opening,
+                              cashier_date=fabday.date, journal_id=self.default_journal.pk, fabday_id=fabday.pk,
+                              total=balances[self.default_journal.pk])
+            count.booking_id = book(self.default_journal.pk, str(self.default_journal.number), count.total,
+                                    'Kassenstand', opening, Booking.COUNT, counted=count.total).id
+            rows[CashCount].append(count)
+
+            is_today = fabday.date == date.today()
+            per_day = options['fablogs_per_day']
+            for n in range(max(0, round(self.random.gauss(per_day, per_day / 5)))):
+                member_id = self.random.choice(members)
+                created_at = opening + timedelta(minutes=self.random.randrange(240))
+                fablog = Fablog(id=ids(Fablog), created_by_id=labmanager.pk, created_at=created_at,
+                                member_id=member_id, fabday_id=fabday.pk, notes='')
+                rows[Fablog].append(fablog)
+                fablog_count += 1
+                positions = []
+
+                for machine in self.random.sample(self.machines, self.random.choice([1, 1, 1, 2])):
+                    start = created_at + timedelta(minutes=self.random.randrange(30))
+                    end = start + timedelta(minutes=self.random.randrange(10, 180))
+                    rows[MachinesUsed].append(MachinesUsed(
+                        fablog_id=fablog.id, machine_id=machine.pk, start_time=start, end_time=end))
+                    price = ceil((end - start) / machine.unit) * machine.price_per_unit
+                    positions.append((machine.contra_account, price, machine.name))
+
+                if self.materials and self.random.random() < 0.4:
+                    material, price_per_unit = self.random.choice(self.materials)
+                    units = self.random.randrange(1, 5)
+                    rows[MaterialsUsed].append(MaterialsUsed(
+                        fablog_id=fablog.id, material_id=material.pk, units=units, price_per_unit=price_per_unit))
+                    positions.append((material.contra_account, units * price_per_unit, material.name))
+
+                if self.membership_types and paid_until.get(member_id, date.min) < fabday.date:
+                    membership_type = self.random.choice(self.membership_types)
+                    # one year (a membership starting on february 29 ends on february 28)
+                    end_date = date(fabday.date.year + 1, fabday.date.month, 1) + timedelta(days=fabday.date.day - 2)
+                    rows[FablogMemberships].append(FablogMemberships(
+                        fablog_id=fablog.id, membership_id=membership_type.pk,
+                        start_date=fabday.date, end_date=end_date))
+                    # membership history rows are written when a fablog is closed
+                    if not is_today:
+                        rows[Membership].append(Membership(
+                            member_id=member_id, fablog_id=fablog.id, start_date=fabday.date, end_date=end_date))
+                    paid_until[member_id] = end_date
+                    positions.append((membership_type.contra_account_currentperiod, membership_type.price,
+                                      membership_type.name))
+
+                # the fablogs of today stay open, all others are paid and closed
+                if is_today:
+                    continue
+                closed_at = created_at + timedelta(hours=3)
+                fablog.closed_at = closed_at
+                fablog.closed_by_id = labmanager.pk
+                method = self.random.choice(self.payment_methods)
+                payment = Payment(id=ids(Payment), payment_method_id=method.pk, timestamp=closed_at,
+                                  amount=sum(price for _account, price, _text in positions))
+                rows[Payment].append(payment)
+                rows[FablogPayments].append(FablogPayments(fablog_id=fablog.id, payment_id=payment.id))
+                for account, price, text in positions:
+                    booking = book(method.journal_id, account, price, text, closed_at)
+                    rows[FablogBookings].append(FablogBookings(fablog_id=fablog.id, booking_id=booking.id))
+
+        with historic_timestamps(Payment._meta.get_field('timestamp'), Booking._meta.get_field('timestamp'),
+                                 CashCount._meta.get_field('created_at')):
+            for model, objs in rows.items():
+                model.objects.bulk_create(objs, batch_size=self.get_batch_size(model, objs))
+                self.stdout.write("{0} {1}".format(len(objs), model._meta.verbose_name_plural))
+        self.stdout.write("{0} fabdays, {1} fablogs".format(len(fabdays), fablog_count))
+
+    def reset_sequences(self):
+        """Explicit primary keys leave PostgreSQL sequences behind"""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Fablog, Payment, Booking, JournalBalance, CashCount])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -0,0 +1,44 @@
+# django
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Min
+
+# local
+from fablog.models import FabDay
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge FabDays with the same date into the oldest of them: their fablogs, cash counts and everything "
+        "else referencing them is moved over and the duplicates are deleted. Run it before migrating to the "
+        "unique FabDay.date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="only list the duplicates")
+
+    def handle(self, *args, **options):
+        if FabDay._meta.db_table not in connection.introspection.table_names():
+            self.stdout.write("No FabDays yet.")
+            return
+        duplicates = FabDay.objects.order_by('date').values('date').annotate(
+            count=Count('id'), keep=Min('id')).filter(count__gt=1)
+        relations = [relation for relation in FabDay._meta.related_objects if relation.one_to_many]
+        merged = 0
+        with transaction.atomic():
+            for duplicate in duplicates:
+                others = list(FabDay.objects.filter(date=duplicate['date']).exclude(
+                    pk=duplicate['keep']).values_list('pk', flat=True))
+                moved = []
+                for relation in relations:
+                    name = relation.field.name
+                    count = relation.related_model._base_manager.filter(**{name + '__in': others}).update(
+                        **{name: duplicate['keep']}) if not options['dry_run'] else 0
+                    moved.append("{0} {1}".format(count, relation.related_model._meta.verbose_name_plural))
+                if not options['dry_run']:
+                    FabDay.objects.filter(pk__in=others).delete()
+                merged += len(others)
+                self.stdout.write("{0}: {1} duplicates of FabDay {2}{3}".format(
+                    duplicate['date'], len(others), duplicate['keep'],
+                    "" if options['dry_run'] else ", moved " + ", ".join(moved)))
+        self.stdout.write("{0} {1} duplicate FabDays.".format("Found" if options['dry_run'] else "Merged", merged))
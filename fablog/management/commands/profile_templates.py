@@ -0,0 +1,69 @@
+# base
+import time
+
+# django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+# local
+from fablog.models import Fablog
+from members.models import User
+from utils.templates import TemplateProfile, warm_templates
+
+
+class Command(BaseCommand):
+    help = (
+        "Render pages against the current database (e.g. after generate_load_data) and report the time spent "
+        "per template and per template tag ({% include %}, {% bootstrap_field %}, ...), as self time without "
+        "and total time including nested templates and tags, averaged per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--login', default='labmanager@load.test', help="email of the user to log in as")
+        parser.add_argument('--url', action='append',
+                            help="page to profile, defaults to the home page and the update view of an open fablog")
+        parser.add_argument('--repeat', type=int, default=5, help="profiled requests per page")
+        parser.add_argument('--limit', type=int, default=25, help="number of templates and tags to report")
+
+    def handle(self, *args, **options):
+        if settings.TEMPLATE_CACHE:
+            start = time.perf_counter()
+            compiled = warm_templates()
+            self.stdout.write("warmed {0} templates in {1:.0f} ms".format(
+                compiled, (time.perf_counter() - start) * 1000))
+        else:
+            self.stdout.write(self.style.WARNING(
+                "TEMPLATE_CACHE is off, templates are compiled on every render and the times include compiling"))
+
+        client = Client()
+        client.force_login(User.objects.get(email=options['login']))
+        # allows the testserver host of the client
+        setup_test_environment()
+        try:
+            for url in options['url'] or self.default_urls():
+                self.profile(client, url, options['repeat'], options['limit'])
+        finally:
+            teardown_test_environment()
+
+    def default_urls(self):
+        fablog = Fablog.objects.filter(closed_at__isnull=True).order_by('-created_at').first()
+        if fablog is None:
+            raise CommandError("No open fablog found, generate a dataset first (generate_load_data).")
+        return [reverse('fablog:home'), reverse('fablog:update', args=[fablog.pk])]
+
+    def profile(self, client, url, repeat, limit):
+        # the first request fills the caches
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError("{0} returned {1}".format(url, response.status_code))
+        start = time.perf_counter()
+        with TemplateProfile() as profile:
+            for i in range(repeat):
+                client.get(url)
+        duration = (time.perf_counter() - start) / repeat
+        self.stdout.write("\n{0}: {1:.1f} ms per request, {2:.1f} ms rendering templates".format(
+            url, duration * 1000, profile.total() * 1000 / repeat))
+        self.stdout.write(profile.report(limit, per=repeat))
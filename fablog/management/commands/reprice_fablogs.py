@@ -0,0 +1,52 @@
+# base
+import csv
+
+# django
+from django.core.management.base import BaseCommand
+
+# local
+from fablog.models import Fablog
+
+
+class Command(BaseCommand):
+    help = "Recompute the totals of all fablogs of a year with the prices valid at the time (CSV to stdout)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int, help="year of the fablogs to reprice")
+        parser.add_argument('--chunk-size', type=int, default=500, help="fablogs loaded per batch")
+
+    def handle(self, *args, **options):
+        queryset = Fablog.objects.filter(
+            created_at__year=options['year']
+        ).select_related('member').prefetch_related(
+            'machinesused_set__machine',
+            'materialsused_set',
+            'fablogmemberships_set',
+            'fablogpayments_set__payment'
+        ).order_by('created_at', 'pk')
+
+        writer = csv.writer(self.stdout)
+        writer.writerow(['fablog', 'created_at', 'member', 'machines', 'materials', 'memberships',
+                         'donation', 'total', 'payments', 'dues'])
+        chunk_size = options['chunk_size']
+        offset = 0
+        while True:
+            # every chunk costs one query per prefetched relation, prices are resolved in memory
+            chunk = list(queryset[offset:offset + chunk_size])
+            if not chunk:
+                break
+            for fablog in chunk:
+                total = fablog.total()
+                total_payments = fablog.total_payments()
+                writer.writerow([
+                    fablog.pk,
+                    fablog.created_at.isoformat(),
+                    fablog.member.get_full_name() if fablog.member else '',
+                    fablog.total_machines(),
+                    fablog.total_materials(),
+                    fablog.total_memberships(),
+                    fablog.donation,
+                    total,
+                    total_payments,
+                    total - total_payments])
+            offset += chunk_size
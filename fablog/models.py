@@ -4,7 +4,7 @@ from decimal import Decimal
 from math import ceil
 
 # Django
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.conf import settings
@@ -13,6 +13,18 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.translation import pgettext_lazy
 from django.urls import reverse
 
+# local
+from materials.models import material_prices
+from memberships.models import membership_prices
+from utils.indexes import PartialIndex
+
+
+class FablogManager(models.Manager):
+    def with_positions(self):
+        """Fablogs with their member and all positions needed to list and price them"""
+        return self.select_related('member').prefetch_related(
+            'machinesused_set__machine', 'materialsused_set__material', 'fablogmemberships_set__membership')
+
 
 class Fablog(models.Model):
     """Fablog object"""
@@ -58,6 +70,8 @@ class Fablog(models.Model):
         related_name="fablogs",
         on_delete=models.SET_NULL,
         null=True,
+        # no index of its own, the composite indexes in Meta.indexes start with it
+        db_index=False,
         verbose_name=_("member"),
         help_text=pgettext_lazy(
             "Fablog",
@@ -75,6 +89,8 @@ class Fablog(models.Model):
         related_name="fablogs",
         verbose_name=_("fabday"),
         on_delete=models.PROTECT,
+        # no index of its own, the composite indexes in Meta.indexes start with it
+        db_index=False,
         help_text=pgettext_lazy(
             "Fablog",
             "FabDay of this Fablog"))
@@ -111,10 +127,18 @@ class Fablog(models.Model):
         through="fablogBookings",
         verbose_name=_("Bookings"))
 
+    objects = FablogManager()
+
     class Meta:
         verbose_name = _('fablog')
         verbose_name_plural = _('fablogs')
         ordering = ['-created_at', '-closed_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-closed_at']),
+            models.Index(fields=['fabday', '-created_at', '-closed_at']),
+            models.Index(fields=['member', '-created_at', '-closed_at']),
+            # the open fablogs of a day (board, closing the day)
+            PartialIndex(fields=['fabday', 'created_at'], where='closed_at IS NULL', name='fablog_open_idx')]
 
     def __str__(self):
         return self._meta.verbose_name + " " + str(self.id)
@@ -159,6 +183,9 @@ class Fablog(models.Model):
         total_bookings = 0
         for payment in bookings:
             total_bookings += payment.booking.amount
+        # bookings of archived financial years (see archive_bookings)
+        for booking in self.archived_bookings.all():
+            total_bookings += booking.amount
         return total_bookings
     total_bookings.short_description = _("total bookings")
 
@@ -190,7 +217,7 @@ class Fablog(models.Model):
         materials_list = [{
             'contra_account': x.material.contra_account,
             'amount': x.price(),
-            'text': _('Sale of {material_name}').format(material_name=x.material.name)
+            'text': _('Sale of {material_name}').format(material_name=str(x))
             } for x in self.materialsused_set.all()]
         positions.extend(materials_list)
 
@@ -281,6 +308,9 @@ class MachinesUsed(models.Model):
     class Meta:
         verbose_name = _('machine used')
         verbose_name_plural = _('machines used')
+        indexes = [
+            # machines running right now
+            PartialIndex(fields=['machine'], where='end_time IS NULL', name='machinesused_running_idx')]
 
     def __str__(self):
         return str(self.machine.name)
@@ -306,7 +336,7 @@ class MachinesUsed(models.Model):
     units.short_description = _("units")
 
     def price(self):
-        return self.units() * self.machine.price_per_unit
+        return self.units() * self.machine.price_at(self.start_time)
     price.short_description = _("price")
 
     def clean(self):
@@ -331,6 +361,12 @@ class MaterialsUsed(models.Model):
         on_delete=models.SET_NULL,
         null=True)
 
+    variant = models.CharField(
+        max_length=50,
+        blank=True,
+        verbose_name=_("variant"),
+        help_text=_("variant of the price list, e.g. thickness or color"))
+
     units = models.PositiveSmallIntegerField(
         default=1,
         verbose_name=_("units"),
@@ -339,20 +375,44 @@ class MaterialsUsed(models.Model):
     price_per_unit = models.DecimalField(
         max_digits=5,
         decimal_places=2,
+        null=True,
+        blank=True,
         validators=[MinValueValidator(0)],
         verbose_name=_("price/unit"),
-        help_text=_("price per unit"))
+        help_text=_("price per unit, leave empty to use the price list"))
 
     class Meta:
         verbose_name = _('material used')
         verbose_name_plural = _('materials used')
 
     def __str__(self):
-        return str(self.material.name)
+        return " ".join(x for x in (self.material.name, self.variant) if x)
+
+    def clean(self):
+        super().clean()
+        # materials priced per variant have no price without one
+        if self.material_id and self.price_per_unit is None and self.listed_price_per_unit() is None:
+            variants = material_prices.variants(self.material_id)
+            if variants:
+                raise ValidationError({'variant': _("Choose one of %(variants)s or enter a price per unit.") % {
+                    'variants': ", ".join(variant or "-" for variant in variants)}})
+
+    def save(self, *args, **kwargs):
+        # freeze the price list price at the time of the fablog
+        if self.price_per_unit is None:
+            self.price_per_unit = self.listed_price_per_unit()
+        super().save(*args, **kwargs)
+
+    def listed_price_per_unit(self):
+        timestamp = self.fablog.created_at if self.fablog_id else None
+        return material_prices.price_at(self.material_id, timestamp, variant=self.variant)
 
     def price(self):
-        if self.price_per_unit:
-            return self.units * self.price_per_unit
+        price_per_unit = self.price_per_unit
+        if price_per_unit is None:
+            price_per_unit = self.listed_price_per_unit()
+        if price_per_unit:
+            return self.units * price_per_unit
         else:
             return 0
     price.short_description = _("price")
@@ -382,7 +442,8 @@ class FablogMemberships(models.Model):
         help_text=_("Last day of membership"))
 
     def price(self):
-        return self.membership.price
+        timestamp = self.fablog.created_at if self.fablog_id else None
+        return membership_prices.price_at(self.membership_id, timestamp, default=lambda: self.membership.price)
     price.short_description = _("price")
 
     class Meta:
@@ -427,13 +488,81 @@ class FablogBookings(models.Model):
         verbose_name_plural = _('associated Bookings')
 
 
+# id of today's FabDay, per process (see FabDayManager.id_for)
+_today = {}
+
+
+class FabDayManager(models.Manager):
+    def id_for(self, day):
+        """
+        Id of the FabDay of a date (or of the date of a datetime), created if there is none yet.
+
+        The FabDay is inserted with ON CONFLICT DO NOTHING on the unique date, so concurrent first requests of
+        a day end up with the same FabDay instead of duplicates. Today's id is cached per process (see save_with).
+        """
+        day = self.model._meta.get_field('date').to_python(day)
+        if day in _today:
+            return _today[day]
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        column = connection.ops.quote_name(self.model._meta.get_field('date').column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {0} ({1}) VALUES (%s) ON CONFLICT ({1}) DO NOTHING'.format(table, column),
+                [self.model._meta.get_field('date').get_db_prep_value(day, connection)])
+        pk = self.using(db).filter(date=day).values_list('pk', flat=True).get()
+        if day == timezone.localdate():
+            _today.clear()
+            _today[day] = pk
+        return pk
+
+    def save_with(self, instance, day):
+        """
+        Save `instance` with the FabDay of `day`.
+
+        Another process may have deleted today's FabDay since its id was cached here. Then the cached id is
+        dropped and the instance saved with a fresh one: outside of a transaction when the insert fails on the
+        foreign key, inside one (where foreign keys are only checked at the commit) after checking the id.
+        """
+        db = router.db_for_write(type(instance), instance=instance)
+        adding = instance._state.adding
+        for retry in (False, True):
+            instance.fabday_id = self.id_for(day)
+            cached = not retry and instance.fabday_id in _today.values()
+            if cached and connections[db].in_atomic_block:
+                if not self.using(db).filter(pk=instance.fabday_id).exists():
+                    self.clear_cache()
+                    continue
+                cached = False
+            if not cached:
+                instance.save(using=db)
+                return
+            try:
+                with transaction.atomic(using=db):
+                    instance.save(using=db)
+                return
+            except IntegrityError:
+                self.clear_cache()
+                if adding:
+                    instance.pk = None
+                    instance._state.adding = True
+
+    def clear_cache(self):
+        """Forget the cached id of today's FabDay, e.g. after it was deleted"""
+        _today.clear()
+
+
 class FabDay(models.Model):
     """ helper model to facilitate views by date"""
 
     date = models.DateField(
+        unique=True,
         verbose_name=_("FabDay"),
         help_text=_("A fabulous day of fabbing at the Fablab"))
 
+    objects = FabDayManager()
+
     class Meta:
         verbose_name = _('Fabday')
         verbose_name_plural = _('Fabdays')
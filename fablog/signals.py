@@ -2,14 +2,33 @@
 from operator import itemgetter
 
 # Django
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.apps import apps
 from django.conf import settings
 from django.utils import timezone
 
 # local
-from .models import Fablog
+from .board import board_cache
+from .forms import choice_cache
+from .models import Fablog, FabDay, MachinesUsed
+from audit.models import AuditEntry
+from audit.recorder import record
+from jobs.queue import enqueue_on_commit
+from machines.models import Machine, MachineStatus, Status
+from materials.models import Material
+from memberships.models import Membership as MembershipType
+from stats.rollups import refresh as refresh_stats
+
+# changes of the board notify waiting board clients
+board_cache.invalidate_on(Fablog, MachinesUsed, Machine, MachineStatus, Status)
+# the choices of the select fields of the fablog formsets
+choice_cache.invalidate_on(Machine, Material, MembershipType)
+
+
+@receiver(post_delete, sender=FabDay)
+def forget_fabday(sender, instance, **kwargs):
+    FabDay.objects.clear_cache()
 
 
 @receiver(post_save, sender=Fablog)
@@ -20,7 +39,7 @@ def make_fablog_bookings(sender, instance, **kwargs):
         FablogBookings = apps.get_model('fablog', 'FablogBookings')
 
         # payments
-        payments = instance.payments.all().order_by('-amount')
+        payments = instance.payments.select_related('payment_method').order_by('-amount')
         # create list of fablog positions
         positions = instance.get_positions()
         positions.sort(key=itemgetter('amount'))
@@ -63,14 +82,23 @@ def make_fablog_bookings(sender, instance, **kwargs):
                 booking=booking)
 
         # if a memebership was payed, add it to member model
-        if instance.memberships.exists():
+        fablog_memberships = instance.fablogmemberships_set.all()
+        if fablog_memberships:
             Membership = apps.get_model('members', 'Membership')
             Membership.objects.create(
                 member=instance.member,
                 fablog=instance,
                 # use first, because only on should be present. (as defined in the modelform)
-                start_date=instance.fablogmemberships_set.first().start_date,
-                end_date=instance.fablogmemberships_set.first().end_date)
+                start_date=fablog_memberships[0].start_date,
+                end_date=fablog_memberships[0].end_date)
 
         # set fablog to closed
-        Fablog.objects.filter(pk=instance.pk).update(closed_at=timezone.now())
+        closed_at = timezone.now()
+        Fablog.objects.filter(pk=instance.pk).update(closed_at=closed_at)
+        # update() sends no signals, the audit log and the board are told explicitly
+        record(instance, AuditEntry.UPDATE, {'closed_at': [instance.closed_at, closed_at]})
+        board_cache.invalidate()
+
+        # bookings, membership and closing above belong together and stay in the request. Work that
+        # may lag behind is left to the job queue, the labmanager doesn't wait for it.
+        enqueue_on_commit(refresh_stats, unique=True)
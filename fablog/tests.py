@@ -1,3 +1,132 @@
-from django.test import TestCase
+# base
+import asyncio
+import json
+import threading
+from datetime import date
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+# django
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+# local
+from digitalFablog import asgi
+from fablog.board import board_cache
+from fablog.management.commands.check_index_usage import Command as CheckIndexUsage
+from fablog.management.commands.check_query_budgets import Command as CheckQueryBudgets
+from members.models import User
+
+
+class QueryBudgetTest(TransactionTestCase):
+    """The views stay within their budgets of utils.query_budgets (see check_query_budgets)"""
+
+    def test_query_budgets(self):
+        output = StringIO()
+        try:
+            CheckQueryBudgets(stdout=output).check_budgets(sizes=[1, 10], days=2, users=50)
+        except CommandError as error:
+            self.fail("{0}\n{1}".format(error, output.getvalue()))
+
+
+@skipUnless(connection.vendor in ('postgresql', 'sqlite'), "query plans are only read on PostgreSQL and SQLite")
+class IndexUsageTest(TransactionTestCase):
+    """The hot queries read their tables through an index (see check_index_usage)"""
+
+    def test_index_usage(self):
+        output = StringIO()
+        failures = CheckIndexUsage(stdout=output).check_plans({
+            'users': 300, 'days': 30, 'fablogs_per_day': 20, 'min_rows': 200, 'verbose_plans': False})
+        self.assertEqual(failures, [], output.getvalue())
+
+
+@override_settings(BOARD_POLL_INTERVAL=0.05)
+class AsgiTest(TransactionTestCase):
+    """digitalFablog.asgi wakes long-polling board clients and streams the responses of the WSGI application"""
+
+    def setUp(self):
+        user = User.objects.create_user(
+            email='labmanager@example.com', first_name='Lab', last_name='Manager', street_and_number='-',
+            zip_code='8000', city='Zürich', phone='-', birthday=date(1990, 1, 1))
+        self.client.force_login(user)
+        self.cookie = '{0}={1}'.format(
+            settings.SESSION_COOKIE_NAME, self.client.cookies[settings.SESSION_COOKIE_NAME].value).encode()
+        # the poll task of the notifier belongs to the event loop of a test
+        patcher = mock.patch.object(asgi, 'notifier', asgi.BoardNotifier())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def call(self, path, query='', send=None):
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(), 'http_version': '1.1',
+            'headers': [(b'cookie', self.cookie)]}
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def append(message):
+            messages.append(message)
+
+        await asgi.application(scope, receive, send or append)
+        return messages
+
+    @staticmethod
+    def body(messages):
+        return b''.join(message.get('body', b'') for message in messages if message['type'] == 'http.response.body')
+
+    def test_long_poll_wakes_up(self):
+        async def long_poll():
+            version = json.loads(self.body(await self.call(reverse('board'))))['version']
+            waiting = asyncio.ensure_future(self.call(reverse('board'), 'version={0}&wait=20'.format(version)))
+            await asyncio.sleep(0.3)
+            self.assertFalse(waiting.done())
+            # a fablog is saved
+            board_cache.invalidate()
+            messages = await asyncio.wait_for(waiting, 2)
+            self.assertNotEqual(json.loads(self.body(messages))['version'], version)
+
+        asyncio.run(long_poll())
+
+    def test_wsgi_response_is_streamed(self):
+        release = threading.Event()
+        closed = threading.Event()
+
+        class Body:
+            def __iter__(self):
+                yield b'first'
+                release.wait(5)
+                yield b'second'
+
+            def close(self):
+                closed.set()
+
+        def wsgi_application(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/csv')])
+            return Body()
+
+        async def stream():
+            messages = []
+            first = asyncio.Event()
+
+            async def send(message):
+                messages.append(message)
+                if message.get('body') == b'first':
+                    first.set()
+
+            request = asyncio.ensure_future(self.call('/members/export/', send=send))
+            # the first chunk reaches the client while the application is still producing the second
+            await asyncio.wait_for(first.wait(), 2)
+            self.assertFalse(request.done())
+            release.set()
+            await asyncio.wait_for(request, 2)
+            return messages
+
+        with mock.patch.object(asgi, 'wsgi_application', wsgi_application):
+            messages = asyncio.run(stream())
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertEqual([message['body'] for message in messages[1:]], [b'first', b'second', b''])
+        self.assertTrue(closed.is_set())
@@ -1,42 +1,51 @@
-# base
-from datetime import date
-
 # django
+from django.db.models import Prefetch
 from django.urls import reverse
 from django.views.generic import ListView, CreateView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.http import HttpResponseRedirect
 from django.forms.formsets import all_valid
 from django.shortcuts import redirect
+from django.utils import timezone
 from django.utils.formats import date_format
 from django.utils.translation import gettext_lazy as _
 
 # additional
 from extra_views import UpdateWithInlinesView, NamedFormsetsMixin
+from extra_views.advanced import BaseUpdateWithInlinesView
 
 # local
 from .models import Fablog, FablogMemberships, FabDay
 from .forms import NewFablogForm, FablogForm, MachinesUsedInline, MaterialsUsedInline, FablogMembershipsInline
+from cashier.models import CashCount
+from digitalFablog.routers import ReplicaReadMixin
 from members.models import User
 from memberships.models import Membership
+from materials.models import material_prices
 
 
-class Home(LoginRequiredMixin, ListView):
+class Home(LoginRequiredMixin, ReplicaReadMixin, ListView):
     model = FabDay
     context_object_name = 'fabdays'
     template_name = "home.html"
     paginate_by = 3
 
     def get_queryset(self):
-        # if no fabday for today has been generated, make one
-        FabDay.objects.get_or_create(date=date.today())
-        queryset = super(Home, self).get_queryset()
+        queryset = super(Home, self).get_queryset().prefetch_related(
+            'cashcount', Prefetch('fablogs', queryset=Fablog.objects.with_positions()))
         if not self.request.user.has_perm('fablog.add_fablog'):
             queryset = queryset.filter(fablogs__member=self.request.user)
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        # today's fabday is created with its first fablog or cash count, until then an empty one is shown
+        fabdays = list(context['fabdays'])
+        if (context['page_obj'].number == 1 and self.request.user.has_perm('fablog.add_fablog')
+                and (not fabdays or fabdays[0].date != timezone.localdate())):
+            today = FabDay(date=timezone.localdate())
+            today._prefetched_objects_cache = {'fablogs': Fablog.objects.none(), 'cashcount': CashCount.objects.none()}
+            context['fabdays'] = context['object_list'] = [today] + fabdays
 
         # included_fablogs_dates = [i['created_at'].date() for i in context['fablogs'].values("created_at")]
         # context["cashcounts"] = CashCount.objects.filter(
@@ -45,14 +54,15 @@ class Home(LoginRequiredMixin, ListView):
 
 
 class FablogDetailView(LoginRequiredMixin, DetailView):
-    model = Fablog
+    queryset = Fablog.objects.with_positions().prefetch_related('fablogpayments_set__payment__payment_method')
     template_name = "fablog/fablog_detailview.html"
 
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
         if not self.object.closed_at and request.user.has_perm('fablog.add_fablog'):
             return redirect('fablog:update', **kwargs)
-        return super(FablogDetailView, self).get(request, *args, **kwargs)
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
 
 
 class FablogCreateView(PermissionRequiredMixin, CreateView):
@@ -68,8 +78,7 @@ class FablogCreateView(PermissionRequiredMixin, CreateView):
     def form_valid(self, form):
         self.object = form.save(commit=False)
         self.object.created_by = self.request.user
-        self.object.fabday, new = FabDay.objects.get_or_create(date=self.object.created_at)
-        self.object.save()
+        FabDay.objects.save_with(self.object, self.object.created_at)
         if not self.object.member.membership_valid():
             # add membership to fablog
             membership = Membership.objects.get(membership_type=0)
@@ -92,11 +101,15 @@ class FablogUpdateView(PermissionRequiredMixin, NamedFormsetsMixin, UpdateWithIn
     inlines = [MachinesUsedInline, MaterialsUsedInline, FablogMembershipsInline]
     inlines_names = ['machinesFS', 'materialsFS', "membershipsFS"]
 
+    def get_queryset(self):
+        return Fablog.objects.with_positions().prefetch_related('fablogpayments_set__payment')
+
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
         if self.object.closed_at:
             return redirect('fablog:detail', **kwargs)
-        return super(UpdateWithInlinesView, self).get(request, *args, **kwargs)
+        # skip BaseUpdateWithInlinesView.get, it would fetch the object (and its positions) again
+        return super(BaseUpdateWithInlinesView, self).get(request, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
         # form validation
@@ -122,6 +135,8 @@ class FablogUpdateView(PermissionRequiredMixin, NamedFormsetsMixin, UpdateWithIn
                     if not formset.close_check(member_is_valid):
                         inlines_check = False
                 if not inlines_check:
+                    # the prefetched positions are outdated now
+                    self.object = self.get_object()
                     return self.render_to_response(self.get_context_data(form=form, inlines=inlines))
                 else:
                     return HttpResponseRedirect(self.get_close_url())
@@ -130,16 +145,21 @@ class FablogUpdateView(PermissionRequiredMixin, NamedFormsetsMixin, UpdateWithIn
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        members = User.members.all()
         members_list = User.members.get_members_list()
         context['members_list'] = members_list
+        # price list prices per material and variant to prefill new material rows
+        prices = {}
+        for (material_id, variant), price in material_prices.prices_at(self.object.created_at).items():
+            prices.setdefault(material_id, {})[variant] = str(price)
+        context['material_prices'] = prices
+        context['material_variants'] = sorted({variant for variants in prices.values() for variant in variants} - {''})
         return context
 
     def get_success_url(self):
         return reverse('fablog:home')
 
     def get_close_url(self):
-        return reverse('fablog:payment', args=(self.get_object().id,))
+        return reverse('fablog:payment', args=(self.object.id,))
 
     def forms_valid(self, form, inlines):
         """
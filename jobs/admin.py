@@ -0,0 +1,38 @@
+# django
+from django.contrib import admin
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+# local
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'max_attempts', 'run_at', 'started_at', 'finished_at', 'worker')
+    list_filter = ('status', 'task')
+    readonly_fields = (
+        'task', 'args', 'kwargs', 'unique', 'status', 'attempts', 'created_at', 'started_at', 'finished_at', 'worker',
+        'last_error')
+    date_hierarchy = 'created_at'
+    actions = ['retry']
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry(self, request, queryset):
+        """Queue failed and waiting jobs to run now, with a fresh set of attempts"""
+        count = 0
+        for job in queryset.filter(status__in=[Job.QUEUED, Job.FAILED]):
+            try:
+                with transaction.atomic():
+                    count += Job.objects.filter(pk=job.pk).update(
+                        status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None)
+            except IntegrityError:
+                # a unique call that is already queued
+                pass
+        self.message_user(request, _("%(count)d jobs queued.") % {'count': count})
+    retry.short_description = _("Run the selected jobs again")
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,65 @@
+# base
+import multiprocessing
+import signal
+import time
+
+# django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# local
+from jobs.worker import Worker
+
+
+def work(batch, burst):
+    Worker(batch=batch, burst=burst).run()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the jobs of the database job queue (see jobs.queue) in a pool of worker processes. Workers "
+        "finish their current job on SIGTERM or SIGINT, crashed workers are replaced."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.JOB_WORKERS, help="worker processes (JOB_WORKERS)")
+        parser.add_argument('--batch', type=int, default=1, help="jobs claimed at once by a worker")
+        parser.add_argument('--burst', action='store_true', help="exit once no jobs are due")
+
+    def handle(self, *args, **options):
+        batch, burst = options['batch'], options['burst']
+        if options['processes'] <= 1:
+            processed = Worker(batch=batch, burst=burst).run()
+            self.stdout.write("Worker stopped after {0} jobs.".format(processed))
+            return
+
+        # the workers are forked with Django set up, but must not share the database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        stopping = []
+
+        def start():
+            process = context.Process(target=work, args=(batch, burst), daemon=True)
+            process.start()
+            return process
+
+        def stop(signum, frame):
+            stopping.append(signum)
+            for process in workers:
+                if process.is_alive():
+                    process.terminate()
+
+        workers = [start() for i in range(options['processes'])]
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write("Started {0} workers.".format(len(workers)))
+        while any(process.is_alive() for process in workers):
+            for i, process in enumerate(workers):
+                if not process.is_alive() and process.exitcode != 0 and not stopping and not burst:
+                    self.stderr.write("Worker {0} exited with {1}, restarting it.".format(
+                        process.pid, process.exitcode))
+                    workers[i] = start()
+            time.sleep(1)
+        self.stdout.write("All workers stopped.")
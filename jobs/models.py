@@ -0,0 +1,95 @@
+# base
+import json
+
+# django
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+# local
+from utils.indexes import PartialIndex
+
+
+class Job(models.Model):
+    """A call of a task (see jobs.queue), run by the workers of run_worker once it is due"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, _('queued')),
+        (RUNNING, _('running')),
+        (DONE, _('done')),
+        (FAILED, _('failed')),
+    )
+    task = models.CharField(
+        max_length=200,
+        verbose_name=_("task"))
+    args = models.TextField(
+        default='[]',
+        verbose_name=_("arguments"),
+        help_text=_("JSON list"))
+    kwargs = models.TextField(
+        default='{}',
+        verbose_name=_("keyword arguments"),
+        help_text=_("JSON object"))
+    status = models.CharField(
+        max_length=7,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+        verbose_name=_("status"))
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_("attempts"))
+    max_attempts = models.PositiveSmallIntegerField(
+        default=5,
+        verbose_name=_("max attempts"))
+    unique = models.BooleanField(
+        default=False,
+        verbose_name=_("unique"),
+        help_text=_("not queued twice and not run while the same call is running"))
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("created at"))
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("run at"),
+        help_text=_("due from, moved back by failed attempts"))
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("started at"))
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("finished at"))
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name=_("worker"))
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_("last error"))
+
+    class Meta:
+        verbose_name = _("job")
+        verbose_name_plural = _("jobs")
+        ordering = ['-id']
+        indexes = [
+            # the workers poll for due jobs, the few queued rows among all past jobs
+            PartialIndex(fields=['run_at', 'id'], where="status = 'queued'", name='job_queued_idx'),
+            # a unique call is queued at most once and running at most once, whatever the timing of the workers
+            PartialIndex(
+                fields=['task', 'args', 'kwargs', 'status'], where="\"unique\" AND status IN ('queued', 'running')",
+                unique=True, name='job_unique_call_idx'),
+            models.Index(fields=['status', 'finished_at']),
+            models.Index(fields=['started_at'])]
+
+    def __str__(self):
+        return "{0} {1} ({2})".format(self.pk, self.task, self.get_status_display())
+
+    def get_args(self):
+        return json.loads(self.args)
+
+    def get_kwargs(self):
+        return json.loads(self.kwargs)
@@ -0,0 +1,187 @@
+"""
+    durable job queue in the database
+
+    Functions decorated with @task can be enqueued with JSON serialisable arguments (ids rather than
+    objects). The workers of `manage.py run_worker` claim due jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+    so any number of them share the queue without waiting for each other, and run each job in a
+    transaction. A failed job is retried after JOB_RETRY_DELAY seconds, doubled with every attempt, until
+    its max_attempts are used up. Jobs must be safe to run twice: a job whose worker died is run again once
+    it has been running for JOB_TIMEOUT seconds. A unique index keeps unique calls from being queued or
+    running twice, see enqueue.
+"""
+# base
+import json
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+# django
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, Min, OuterRef, Q
+from django.utils import timezone
+
+# local
+from .models import Job
+
+# registered tasks by name
+tasks = {}
+
+
+def task(func):
+    """Register func as a task, under the dotted path of the function"""
+    tasks[task_name(func)] = func
+    return func
+
+
+def task_name(func):
+    return '{0}.{1}'.format(func.__module__, func.__qualname__)
+
+
+def get_task(name):
+    """The task registered as name, importing its module first (workers don't load all modules)"""
+    if name not in tasks:
+        import_module(name.rsplit('.', 1)[0])
+    return tasks[name]
+
+
+def enqueue(func, *args, run_at=None, max_attempts=None, unique=False, **kwargs):
+    """
+    Queue a call of the task func. With unique=True nothing is queued if the same call is already waiting,
+    so a burst of changes runs e.g. a refresh only once, and the call is not started while the same call is
+    running: a change during a refresh queues one more refresh, which waits for the running one.
+    """
+    name = task_name(func)
+    if name not in tasks:
+        raise ValueError("{0} is not a task".format(name))
+    job = Job(
+        task=name,
+        args=json.dumps(args, cls=DjangoJSONEncoder),
+        kwargs=json.dumps(kwargs, cls=DjangoJSONEncoder, sort_keys=True),
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        unique=unique)
+    if not unique:
+        job.save()
+        return job
+    if Job.objects.filter(status=Job.QUEUED, task=job.task, args=job.args, kwargs=job.kwargs).exists():
+        return None
+    # the same call queued since the check above is caught by the unique index
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
+
+
+def enqueue_on_commit(func, *args, **kwargs):
+    """Queue a call of the task func once the current transaction has been committed"""
+    transaction.on_commit(lambda: enqueue(func, *args, **kwargs))
+
+
+def claim(worker, limit=1):
+    """Mark up to limit due jobs as running for worker and return them, oldest first"""
+    now = timezone.now()
+    claimed = []
+    running = Job.objects.filter(
+        status=Job.RUNNING, unique=True, task=OuterRef('task'), args=OuterRef('args'), kwargs=OuterRef('kwargs'))
+    calls = set()
+    with transaction.atomic():
+        # rows locked by other workers are skipped instead of waited for, unique jobs whose call is running
+        # stay queued until it is done
+        due = Job.objects.select_for_update(skip_locked=True).annotate(call_running=Exists(running)).filter(
+            Q(unique=False) | Q(call_running=False), status=Job.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+        for job in due[:limit]:
+            if job.unique:
+                if (job.task, job.args, job.kwargs) in calls:
+                    continue
+                calls.add((job.task, job.args, job.kwargs))
+            # the status condition keeps databases without row locks (SQLite) from running a job twice, the
+            # unique index a unique call claimed by another worker that has not committed yet
+            try:
+                with transaction.atomic():
+                    updated = Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+                        status=Job.RUNNING, started_at=now, worker=worker, attempts=job.attempts + 1)
+            except IntegrityError:
+                continue
+            if updated:
+                job.status, job.started_at, job.worker, job.attempts = Job.RUNNING, now, worker, job.attempts + 1
+                claimed.append(job)
+    return claimed
+
+
+def retry_delay(attempts):
+    return min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+
+
+def run(job):
+    """Run a claimed job, return True if it succeeded"""
+    try:
+        with transaction.atomic():
+            get_task(job.task)(*job.get_args(), **job.get_kwargs())
+    except Exception:
+        fail(job, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+    return True
+
+
+def fail(job, error):
+    """Queue the job again after its retry delay, or give up after max_attempts"""
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        try:
+            with transaction.atomic():
+                Job.objects.filter(pk=job.pk).update(
+                    status=Job.QUEUED, run_at=now + timedelta(seconds=retry_delay(job.attempts)), last_error=error)
+            return
+        except IntegrityError:
+            # a unique call queued again while it was running, which retries it
+            pass
+    Job.objects.filter(pk=job.pk).update(status=Job.FAILED, finished_at=now, last_error=error)
+
+
+def requeue_stale():
+    """Retry (or fail) the jobs running longer than JOB_TIMEOUT, their worker is most likely gone"""
+    stale = Job.objects.filter(
+        status=Job.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT))
+    for job in stale:
+        fail(job, "Timed out on worker {0}".format(job.worker))
+    return len(stale)
+
+
+def purge():
+    """Delete the jobs done more than JOB_KEEP_DAYS days ago, failed jobs are kept"""
+    return Job.objects.filter(
+        status=Job.DONE, finished_at__lt=timezone.now() - timedelta(days=settings.JOB_KEEP_DAYS)).delete()[0]
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else None
+
+
+def metrics():
+    """
+    State of the queue: jobs per status, the lag of the oldest due job (how long it has been waiting),
+    and the lag of the jobs started in the last hour (from due to started), all in seconds.
+    """
+    now = timezone.now()
+    counts = dict(Job.objects.order_by().values_list('status').annotate(count=Count('id')))
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).aggregate(count=Count('id'), oldest=Min('run_at'))
+    lags = sorted(
+        round((started_at - run_at).total_seconds(), 3) for run_at, started_at in Job.objects.filter(
+            started_at__gte=now - timedelta(hours=1)).values_list('run_at', 'started_at') if started_at >= run_at)
+    return {
+        'jobs': {status: counts.get(status, 0) for status, label in Job.STATUS_CHOICES},
+        'due': due['count'],
+        'lag_seconds': round((now - due['oldest']).total_seconds(), 3) if due['oldest'] else 0,
+        'last_hour': {
+            'started': len(lags),
+            'lag_p50_seconds': percentile(lags, 0.5),
+            'lag_p95_seconds': percentile(lags, 0.95),
+            'lag_max_seconds': lags[-1] if lags else None,
+            'failed': Job.objects.filter(status=Job.FAILED, finished_at__gte=now - timedelta(hours=1)).count(),
+        },
+    }
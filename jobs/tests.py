@@ -0,0 +1,113 @@
+# base
+from datetime import timedelta
+
+# django
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+# local
+from jobs import queue
+from jobs.models import Job
+
+calls = []
+
+
+@queue.task
+def record(value):
+    calls.append(value)
+
+
+@queue.task
+def crash():
+    raise RuntimeError("crashed")
+
+
+@override_settings(JOB_RETRY_DELAY=10, JOB_RETRY_MAX_DELAY=60, JOB_TIMEOUT=600)
+class QueueTest(TestCase):
+    """Claiming, running, retrying and unique calls of jobs.queue"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_claim(self):
+        first = queue.enqueue(record, 1)
+        second = queue.enqueue(record, 2)
+        queue.enqueue(record, 3, run_at=timezone.now() + timedelta(hours=1))
+
+        jobs = queue.claim('worker', limit=5)
+        self.assertEqual([job.pk for job in jobs], [first.pk, second.pk])
+        self.assertEqual(
+            list(Job.objects.filter(pk__in=[first.pk, second.pk]).values_list('status', 'worker', 'attempts')),
+            [(Job.RUNNING, 'worker', 1)] * 2)
+        # claimed jobs and jobs not yet due are left alone
+        self.assertEqual(queue.claim('other'), [])
+
+        self.assertTrue(queue.run(jobs[0]))
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.objects.get(pk=first.pk).status, Job.DONE)
+
+    def test_retry_with_backoff(self):
+        self.assertEqual([queue.retry_delay(attempts) for attempts in range(1, 6)], [10, 20, 40, 60, 60])
+        job = queue.enqueue(crash, max_attempts=2)
+
+        before = timezone.now()
+        self.assertFalse(queue.run(queue.claim('worker')[0]))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=10))
+        self.assertIn("RuntimeError: crashed", job.last_error)
+        # not due before its retry delay
+        self.assertEqual(queue.claim('worker'), [])
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertFalse(queue.run(queue.claim('worker')[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_requeue_stale(self):
+        job = queue.enqueue(record, 1, max_attempts=2)
+        queue.claim('gone')
+        self.assertEqual(queue.requeue_stale(), 0)
+
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(seconds=601))
+        self.assertEqual(queue.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.last_error, "Timed out on worker gone")
+
+    def test_unique(self):
+        job = queue.enqueue(record, 1, unique=True)
+        self.assertIsNone(queue.enqueue(record, 1, unique=True))
+        self.assertIsNotNone(queue.enqueue(record, 2, unique=True))
+        self.assertIsNotNone(queue.enqueue(record, 1))
+
+        # queued once more while it runs, and not claimed before the running call is done
+        self.assertEqual(queue.claim('worker', limit=5)[0].pk, job.pk)
+        follow_up = queue.enqueue(record, 1, unique=True)
+        self.assertIsNotNone(follow_up)
+        self.assertNotIn(follow_up.pk, [claimed.pk for claimed in queue.claim('other', limit=5)])
+        self.assertTrue(queue.run(job))
+        self.assertEqual([claimed.pk for claimed in queue.claim('other')], [follow_up.pk])
+
+    def test_unique_in_the_database(self):
+        # what two workers committing at the same time would write
+        fields = {'task': queue.task_name(record), 'args': '[1]', 'unique': True}
+        Job.objects.create(status=Job.QUEUED, **fields)
+        Job.objects.create(status=Job.RUNNING, **fields)
+        for status in (Job.QUEUED, Job.RUNNING):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Job.objects.create(status=status, **fields)
+        Job.objects.create(status=Job.DONE, **fields)
+
+    def test_failed_unique_call_queued_again(self):
+        job = queue.enqueue(crash, unique=True)
+        queue.claim('worker')
+        follow_up = queue.enqueue(crash, unique=True)
+
+        # the queued call is the retry
+        self.assertFalse(queue.run(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(Job.objects.get(status=Job.QUEUED).pk, follow_up.pk)
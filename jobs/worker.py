@@ -0,0 +1,80 @@
+"""
+    worker loop of run_worker
+"""
+# base
+import logging
+import os
+import signal
+import socket
+import time
+
+# django
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+# local
+from . import queue
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """Claims and runs due jobs until stopped (SIGTERM, SIGINT) or, in burst mode, until none are due"""
+
+    def __init__(self, batch=1, burst=False):
+        self.name = '{0}:{1}'.format(socket.gethostname(), os.getpid())[:100]
+        self.batch = batch
+        self.burst = burst
+        self.stopping = False
+        self.last_maintenance = None
+
+    def stop(self, signum=None, frame=None):
+        # the running job is finished first
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        processed = 0
+        while not self.stopping:
+            try:
+                self.maintain()
+                jobs = queue.claim(self.name, self.batch)
+            except DatabaseError:
+                # e.g. the database restarted or is not migrated yet
+                logger.exception("worker %s could not claim jobs", self.name)
+                connections.close_all()
+                jobs = None
+            if not jobs:
+                if self.burst and jobs is not None:
+                    break
+                time.sleep(settings.JOB_POLL_INTERVAL)
+                continue
+            for job in jobs:
+                processed += 1
+                self.run_job(job)
+        connections.close_all()
+        return processed
+
+    def run_job(self, job):
+        start = time.perf_counter()
+        try:
+            succeeded = queue.run(job)
+        except DatabaseError:
+            # the outcome could not be stored, the job is retried once it times out
+            logger.exception("job %s: %s, result lost", job.pk, job.task)
+            connections.close_all()
+            return
+        logger.log(
+            logging.INFO if succeeded else logging.WARNING, "job %s: %s %s after %.1f ms, attempt %s of %s",
+            job.pk, job.task, "done" if succeeded else "failed", (time.perf_counter() - start) * 1000,
+            job.attempts, job.max_attempts)
+
+    def maintain(self):
+        """Every minute: retry jobs of dead workers and delete old finished jobs"""
+        if self.last_maintenance is not None and time.monotonic() - self.last_maintenance < 60:
+            return
+        self.last_maintenance = time.monotonic()
+        stale, purged = queue.requeue_stale(), queue.purge()
+        if stale or purged:
+            logger.info("%s stale jobs queued again, %s old jobs deleted", stale, purged)
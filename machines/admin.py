@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Machine, MachineStatus, Status
+from .models import Machine, MachinePrice, MachineStatus, Status
 
 
 class MachineStatusInline(admin.TabularInline):
@@ -7,8 +7,13 @@ class MachineStatusInline(admin.TabularInline):
     extra = 1
 
 
+class MachinePriceInline(admin.TabularInline):
+    model = MachinePrice
+    extra = 0
+
+
 class MachineAdmin(admin.ModelAdmin):
-    inlines = (MachineStatusInline,)
+    inlines = (MachinePriceInline, MachineStatusInline)
 
 
 admin.site.register(Machine, MachineAdmin)
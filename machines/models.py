@@ -8,6 +8,10 @@ from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 
+# local
+from utils.indexes import PartialIndex
+from utils.pricing import HISTORY_START, EffectivePriceIndex
+
 
 class Machine(models.Model):
     """Machines at the fablab"""
@@ -66,6 +70,53 @@ class Machine(models.Model):
             newMachineStatus.save()
         return current_status
 
+    def save(self, *args, **kwargs):
+        if self.pk is not None and not self.prices.exists():
+            # saved before the price history (or loaded from fixtures): the stored price was valid until now
+            stored = Machine.objects.filter(pk=self.pk).values_list('price_per_unit', flat=True).first()
+            if stored is not None:
+                MachinePrice.objects.create(machine_id=self.pk, price_per_unit=stored, valid_from=HISTORY_START)
+        super().save(*args, **kwargs)
+        # record price changes in the price history
+        last_price = self.prices.order_by('valid_from').last()
+        if last_price is None or last_price.price_per_unit != self.price_per_unit:
+            MachinePrice.objects.create(machine=self, price_per_unit=self.price_per_unit)
+
+    def price_at(self, timestamp):
+        """Price per unit valid at timestamp"""
+        return machine_prices.price_at(self.id, timestamp, default=self.price_per_unit)
+
+
+class MachinePrice(models.Model):
+    """ Effective-dated price history of a machine """
+    machine = models.ForeignKey(
+        "Machine",
+        related_name="prices",
+        on_delete=models.CASCADE,
+        verbose_name=_("machine"))
+    price_per_unit = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        validators=[MinValueValidator(0)],
+        verbose_name=_("price/unit"),
+        help_text=_("price per unit"))
+    valid_from = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("valid from"),
+        help_text=_("Price is valid from this date and time until the next price change"))
+
+    class Meta:
+        verbose_name = _("machine price")
+        verbose_name_plural = _("machine prices")
+        ordering = ["machine", "-valid_from"]
+        indexes = [models.Index(fields=["machine", "valid_from"])]
+
+    def __str__(self):
+        return "{0}: {1} ({2})".format(self.machine, self.price_per_unit, self.valid_from.strftime('%d.%m.%Y'))
+
+
+machine_prices = EffectivePriceIndex("machines.MachinePrice", "machine", "price_per_unit")
+
 
 class MachineStatusManager(models.Manager):
     def current(self):
@@ -79,7 +130,9 @@ class MachineStatus(models.Model):
     machine = models.ForeignKey(
         "Machine",
         on_delete=models.SET_NULL,
-        null=True)
+        null=True,
+        # no index of its own, the composite indexes in Meta.indexes start with it
+        db_index=False)
     status = models.ForeignKey(
         "Status",
         on_delete=models.SET_NULL,
@@ -103,6 +156,11 @@ class MachineStatus(models.Model):
         verbose_name = _("Machine Satus")
         verbose_name_plural = _("Machine Statuses")
         ordering = ["-start_time"]
+        # current statuses: ended in the future, or open ended
+        indexes = [
+            models.Index(fields=["machine", "-start_time"]),
+            models.Index(fields=["end_time"]),
+            PartialIndex(fields=["start_time"], where="end_time IS NULL", name="machinestatus_open_idx")]
 
     def is_current(self):
         if not self.end_time or self.end_time > timezone.now():
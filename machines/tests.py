@@ -1,3 +1,57 @@
+# base
+from datetime import date, timedelta
+from decimal import Decimal
+
+# django
 from django.test import TestCase
+from django.utils import timezone
+
+# local
+from fablog.models import FabDay, Fablog, MachinesUsed
+from machines.models import Machine, MachinePrice, machine_prices
+from members.models import User
+from utils.pricing import HISTORY_START
+
+
+class MachinePriceTest(TestCase):
+    """A machine used in a fablog costs the price valid when it was started"""
+
+    def setUp(self):
+        # ids are reused after the rollback of a test, the cache of this process is not
+        machine_prices.invalidate()
+        user = User.objects.create_user(
+            email='labmanager@example.com', first_name='Lab', last_name='Manager', street_and_number='-',
+            zip_code='8000', city='Zürich', phone='-', birthday=date(1990, 1, 1))
+        self.fablog = Fablog.objects.create(
+            created_by=user, member=user, fabday=FabDay.objects.create(date=timezone.localdate()))
+
+    def use(self, machine, start_time):
+        # two units of 30 minutes
+        return MachinesUsed.objects.create(
+            fablog=self.fablog, machine=machine, start_time=start_time, end_time=start_time + timedelta(hours=1))
+
+    def test_price_change(self):
+        machine = Machine.objects.create(name='Laser', price_per_unit=Decimal('10.00'))
+        before = self.use(machine, timezone.now() - timedelta(hours=2))
+
+        machine.price_per_unit = Decimal('15.00')
+        machine.save()
+        after = self.use(Machine.objects.get(pk=machine.pk), timezone.now())
+
+        self.assertEqual(MachinesUsed.objects.get(pk=before.pk).price(), Decimal('20.00'))
+        self.assertEqual(MachinesUsed.objects.get(pk=after.pk).price(), Decimal('30.00'))
+
+    def test_price_change_without_history(self):
+        # a machine of a fixture, or from before the price history, and a fablog of last year
+        machine = Machine.objects.create(name='Laser', price_per_unit=Decimal('10.00'))
+        MachinePrice.objects.filter(machine=machine).delete()
+        before = self.use(machine, timezone.now() - timedelta(days=365))
+
+        machine.price_per_unit = Decimal('15.00')
+        machine.save()
 
-# Create your tests here.
+        self.assertEqual(
+            list(machine.prices.order_by('valid_from').values_list('valid_from', 'price_per_unit'))[0],
+            (HISTORY_START, Decimal('10.00')))
+        self.assertEqual(MachinesUsed.objects.get(pk=before.pk).price(), Decimal('20.00'))
+        self.assertEqual(self.use(machine, timezone.now()).price(), Decimal('30.00'))
@@ -1,5 +1,39 @@
 from django.contrib import admin
-from .models import Material
+from .models import Material, MaterialPrice, StockMovement
+from digitalFablog.routers import ReplicaChangelistMixin
 
 
-admin.site.register(Material)
+class MaterialPriceInline(admin.TabularInline):
+    model = MaterialPrice
+    fields = ('variant', 'unit', 'price_per_unit', 'valid_from')
+    extra = 0
+
+
+class MaterialAdmin(admin.ModelAdmin):
+    inlines = (MaterialPriceInline,)
+    list_display = ('name', 'stock', 'low_stock_threshold')
+    readonly_fields = ('stock', )
+
+
+class StockMovementAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ('created_at', 'material', 'movement_type', 'quantity', 'materials_used', 'created_by')
+    list_filter = ('movement_type', 'material')
+    list_select_related = ('material', 'created_by')
+
+    readonly_fields = ('materials_used', )
+
+    # the ledger is append-only, stock is only updated when movements are added
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+
+admin.site.register(Material, MaterialAdmin)
+admin.site.register(StockMovement, StockMovementAdmin)
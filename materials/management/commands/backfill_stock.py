@@ -0,0 +1,39 @@
+# django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+# local
+from fablog.models import MaterialsUsed
+from materials.models import StockMovement
+
+
+class Command(BaseCommand):
+    help = "Replay all materials used without stock movements into the stock ledger and recompute the stock"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="stock movements per INSERT")
+
+    def handle(self, *args, **options):
+        materials_used = MaterialsUsed.objects.filter(
+            material__isnull=False,
+            units__gt=0,
+            stock_movements__isnull=True
+        ).select_related('fablog').order_by('pk')
+
+        movements = [
+            StockMovement(
+                material_id=used.material_id,
+                movement_type=StockMovement.USAGE,
+                quantity=-used.units,
+                materials_used=used,
+                created_at=used.fablog.created_at if used.fablog else timezone.now(),
+                notes="Fablog {0}".format(used.fablog_id))
+            for used in materials_used.iterator()]
+
+        with transaction.atomic():
+            # bulk_create skips the signals, so the stock is recomputed from the ledger afterwards
+            StockMovement.objects.bulk_create(movements, batch_size=options['batch_size'])
+            StockMovement.objects.recompute_stock()
+
+        self.stdout.write(self.style.SUCCESS("Replayed {0} materials used.".format(len(movements))))
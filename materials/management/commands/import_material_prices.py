@@ -0,0 +1,83 @@
+# base
+import csv
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+# django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+
+# local
+from materials.models import Material, MaterialPrice, material_prices
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import the material price catalog from a CSV file with the columns "
+        "material, variant, unit, price_per_unit and valid_from (the last four may be empty). "
+        "Other worker processes pick up the new prices within the price cache ttl."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help="path to the CSV file")
+        parser.add_argument('--delimiter', default=',', help="CSV delimiter")
+        parser.add_argument('--create-materials', action='store_true', help="create unknown materials")
+
+    def parse_valid_from(self, value):
+        if not value:
+            return self.now
+        valid_from = parse_datetime(value)
+        if valid_from is None:
+            parsed_date = parse_date(value)
+            if parsed_date is None:
+                raise ValueError(value)
+            valid_from = datetime.combine(parsed_date, time.min)
+        if timezone.is_naive(valid_from):
+            valid_from = timezone.make_aware(valid_from)
+        return valid_from
+
+    def handle(self, *args, **options):
+        self.now = timezone.now()
+        try:
+            with open(options['csv_file'], newline='') as csv_file:
+                rows = list(csv.DictReader(csv_file, delimiter=options['delimiter']))
+        except OSError as e:
+            raise CommandError(e)
+
+        materials = dict(Material.objects.values_list('name', 'pk'))
+        unknown = {row['material'].strip() for row in rows} - set(materials)
+        if unknown and not options['create_materials']:
+            raise CommandError("Unknown materials: {0}".format(", ".join(sorted(unknown))))
+
+        with transaction.atomic():
+            if unknown:
+                Material.objects.bulk_create([Material(name=name) for name in sorted(unknown)])
+                materials = dict(Material.objects.values_list('name', 'pk'))
+
+            existing = set(MaterialPrice.objects.values_list('material', 'variant', 'valid_from'))
+            current = material_prices.prices_at(self.now)
+            new_prices = []
+            for line, row in enumerate(rows, start=2):
+                try:
+                    price = MaterialPrice(
+                        material_id=materials[row['material'].strip()],
+                        variant=(row.get('variant') or '').strip(),
+                        unit=(row.get('unit') or '').strip(),
+                        price_per_unit=Decimal(row['price_per_unit']),
+                        valid_from=self.parse_valid_from((row.get('valid_from') or '').strip()))
+                except (InvalidOperation, KeyError, ValueError, TypeError) as e:
+                    raise CommandError("Line {0}: invalid value {1}".format(line, e))
+                key = (price.material_id, price.variant, price.valid_from)
+                # rows without a date only add a price if it differs from the current one
+                unchanged = not row.get('valid_from') and current.get(key[:2]) == price.price_per_unit
+                if key not in existing and not unchanged:
+                    existing.add(key)
+                    new_prices.append(price)
+            MaterialPrice.objects.bulk_create(new_prices)
+
+        # bulk_create sends no signals
+        material_prices.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            "Imported {0} prices ({1} already present).".format(len(new_prices), len(rows) - len(new_prices))))
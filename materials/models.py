@@ -1,7 +1,21 @@
 # django
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Sum, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.core.validators import MinValueValidator
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+# local
+from utils.pricing import EffectivePriceIndex
+
+
+class MaterialManager(models.Manager):
+    def low_stock(self):
+        """Materials at or below their low stock threshold"""
+        return self.filter(low_stock_threshold__isnull=False, stock__lte=F('low_stock_threshold'))
+
 
 class Material(models.Model):
     """ Materials """
@@ -14,6 +28,162 @@ class Material(models.Model):
         default="3000",
         verbose_name=_("account to"),
         help_text=_("account to bill to"))
+    # materialized sum of all stock movements, only ever change with F() expressions
+    stock = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("stock"),
+        help_text=_("units in stock"))
+    low_stock_threshold = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("low stock threshold"),
+        help_text=_("Material is listed as low on stock at or below this number of units"))
+
+    objects = MaterialManager()
+
+    class Meta:
+        indexes = [models.Index(fields=["low_stock_threshold", "stock"])]
 
     def __str__(self):
         return self.name
+
+    def price_at(self, timestamp, variant=''):
+        """Price per unit valid at timestamp, None if the material has no price"""
+        return material_prices.price_at(self.id, timestamp, variant=variant)
+
+
+class MaterialPrice(models.Model):
+    """ Price catalog of a material, effective-dated per variant """
+    material = models.ForeignKey(
+        "Material",
+        related_name="prices",
+        on_delete=models.CASCADE,
+        verbose_name=_("material"))
+    variant = models.CharField(
+        max_length=50,
+        blank=True,
+        verbose_name=_("variant"),
+        help_text=_("e.g. thickness or color, leave empty for the default price of the material"))
+    unit = models.CharField(
+        max_length=50,
+        blank=True,
+        verbose_name=_("unit"),
+        help_text=_("unit size the price refers to, e.g. 60 x 30 cm sheet"))
+    price_per_unit = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        validators=[MinValueValidator(0)],
+        verbose_name=_("price/unit"),
+        help_text=_("price per unit"))
+    valid_from = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("valid from"),
+        help_text=_("Price is valid from this date and time until the next price change"))
+
+    class Meta:
+        verbose_name = _("material price")
+        verbose_name_plural = _("material prices")
+        ordering = ["material", "variant", "-valid_from"]
+        unique_together = ("material", "variant", "valid_from")
+
+    def __str__(self):
+        name = " ".join(x for x in (self.material.name, self.variant) if x)
+        return "{0}: {1} ({2})".format(name, self.price_per_unit, self.valid_from.strftime('%d.%m.%Y'))
+
+
+class StockMovementManager(models.Manager):
+    def record_usage(self, materials_used, deleted=False):
+        """
+        Bring the usage movements of a MaterialsUsed row in line with its current material and units.
+
+        With deleted=True the usage is reversed. Those movements are not linked to the row, since it
+        is about to be deleted.
+        """
+        target = {}
+        if materials_used.material_id and materials_used.units and not deleted:
+            target[materials_used.material_id] = -materials_used.units
+        with transaction.atomic():
+            # concurrent saves of the same row would both add the same delta, the second waits here
+            locked = type(materials_used).objects.select_for_update().filter(pk=materials_used.pk)
+            if not locked.exists():
+                # deleted concurrently, its usage is already reversed
+                return
+            recorded = dict(self.filter(materials_used=materials_used).order_by().values(
+                'material').annotate(quantity=Sum('quantity')).values_list('material', 'quantity'))
+            for material_id in set(target) | set(recorded):
+                delta = target.get(material_id, 0) - recorded.get(material_id, 0)
+                if delta:
+                    self.create(
+                        material_id=material_id,
+                        movement_type=StockMovement.USAGE,
+                        quantity=delta,
+                        materials_used=None if deleted else materials_used,
+                        notes=_("Fablog {fablog}").format(fablog=materials_used.fablog_id))
+
+    def recompute_stock(self):
+        """Set the stock of all materials to the sum of their movements"""
+        movements = self.filter(material=OuterRef('pk')).order_by().values(
+            'material').annotate(total=Sum('quantity')).values('total')
+        Material.objects.update(stock=Coalesce(Subquery(movements), 0))
+
+
+class StockMovement(models.Model):
+    """ Append-only ledger of material going in and out of the stock """
+    PURCHASE = 0
+    USAGE = 1
+    CORRECTION = 2
+    MOVEMENT_TYPE_CHOICES = (
+        (PURCHASE, _("Purchase")),
+        (USAGE, _("Usage")),
+        (CORRECTION, _("Correction")),
+    )
+    material = models.ForeignKey(
+        "Material",
+        related_name="stock_movements",
+        on_delete=models.PROTECT,
+        verbose_name=_("material"))
+    movement_type = models.PositiveSmallIntegerField(
+        choices=MOVEMENT_TYPE_CHOICES,
+        default=PURCHASE,
+        verbose_name=_("type"),
+        help_text=_("type of stock movement"))
+    quantity = models.IntegerField(
+        verbose_name=_("quantity"),
+        help_text=_("units added to (positive) or taken from (negative) the stock"))
+    materials_used = models.ForeignKey(
+        "fablog.MaterialsUsed",
+        related_name="stock_movements",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("material used"))
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name="stock_movements",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        verbose_name=_("created by"))
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("created at"))
+    notes = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name=_("notes"))
+
+    objects = StockMovementManager()
+
+    class Meta:
+        verbose_name = _("stock movement")
+        verbose_name_plural = _("stock movements")
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["material", "created_at"])]
+
+    def __str__(self):
+        return "{0}: {1:+d} ({2})".format(self.material, self.quantity, self.get_movement_type_display())
+
+
+material_prices = EffectivePriceIndex("materials.MaterialPrice", "material", "price_per_unit", variant_field="variant")
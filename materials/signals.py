@@ -0,0 +1,29 @@
+# Django
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+# local
+from .models import Material, StockMovement
+
+
+@receiver(post_save, sender=StockMovement)
+def add_stock_movement(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Material.objects.filter(pk=instance.material_id).update(stock=F('stock') + instance.quantity)
+
+
+@receiver(post_delete, sender=StockMovement)
+def remove_stock_movement(sender, instance, **kwargs):
+    Material.objects.filter(pk=instance.material_id).update(stock=F('stock') - instance.quantity)
+
+
+@receiver(post_save, sender='fablog.MaterialsUsed')
+def record_material_usage(sender, instance, raw=False, **kwargs):
+    if not raw:
+        StockMovement.objects.record_usage(instance)
+
+
+@receiver(pre_delete, sender='fablog.MaterialsUsed')
+def reverse_material_usage(sender, instance, **kwargs):
+    StockMovement.objects.record_usage(instance, deleted=True)
@@ -1,3 +1,53 @@
+# base
+from datetime import date
+from decimal import Decimal
+
+# django
 from django.test import TestCase
+from django.utils import timezone
+
+# local
+from fablog.models import FabDay, Fablog, MaterialsUsed
+from materials.models import Material, StockMovement
+from members.models import User
+
+
+class StockTest(TestCase):
+    """The stock of a material follows its purchases and its usage in fablogs"""
+
+    def setUp(self):
+        user = User.objects.create_user(
+            email='labmanager@example.com', first_name='Lab', last_name='Manager', street_and_number='-',
+            zip_code='8000', city='Zürich', phone='-', birthday=date(1990, 1, 1))
+        self.fablog = Fablog.objects.create(
+            created_by=user, member=user, fabday=FabDay.objects.create(date=timezone.localdate()))
+        self.plywood = Material.objects.create(name='Plywood')
+        self.acrylic = Material.objects.create(name='Acrylic')
+        for material in (self.plywood, self.acrylic):
+            StockMovement.objects.create(material=material, quantity=10)
+
+    def stock(self):
+        return dict(Material.objects.values_list('name', 'stock'))
+
+    def test_usage(self):
+        used = MaterialsUsed.objects.create(
+            fablog=self.fablog, material=self.plywood, units=3, price_per_unit=Decimal('5.00'))
+        self.assertEqual(self.stock(), {'Plywood': 7, 'Acrylic': 10})
+
+        # saved again unchanged, e.g. with the rest of the fablog form
+        used.save()
+        self.assertEqual(self.stock(), {'Plywood': 7, 'Acrylic': 10})
+
+        used.units = 5
+        used.save()
+        self.assertEqual(self.stock(), {'Plywood': 5, 'Acrylic': 10})
+
+        used.material = self.acrylic
+        used.save()
+        self.assertEqual(self.stock(), {'Plywood': 10, 'Acrylic': 5})
 
-# Create your tests here.
+        used.delete()
+        self.assertEqual(self.stock(), {'Plywood': 10, 'Acrylic': 10})
+        # the ledger adds up to the stock
+        StockMovement.objects.recompute_stock()
+        self.assertEqual(self.stock(), {'Plywood': 10, 'Acrylic': 10})
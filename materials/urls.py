@@ -0,0 +1,10 @@
+# django
+from django.urls import path
+
+# local
+from . import views
+
+app_name = 'materials'
+urlpatterns = [
+    path("low-stock/", views.LowStockListView.as_view(), name="low_stock")
+]
@@ -1,3 +1,17 @@
-from django.shortcuts import render
+# django
+from django.views.generic import ListView
+from django.contrib.auth.mixins import PermissionRequiredMixin
 
-# Create your views here.
+# local
+from .models import Material
+from digitalFablog.routers import ReplicaReadMixin
+
+
+class LowStockListView(PermissionRequiredMixin, ReplicaReadMixin, ListView):
+    permission_required = 'fablog.add_fablog'
+
+    template_name = "materials/material_lowstock_listview.html"
+    context_object_name = 'materials'
+
+    def get_queryset(self):
+        return Material.objects.low_stock().order_by('name')
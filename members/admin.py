@@ -1,16 +1,35 @@
 # django
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.forms import FileInput
+from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
 # local
-from .models import User, Membership
+from .models import User, Membership, MembershipReminder
 from fablog.models import Fablog
+from digitalFablog.routers import ReplicaChangelistMixin
 
 
 class MembershipInline(admin.TabularInline):
     model = Membership
     extra = 1
+    readonly_fields = ("legitimation_preview", )
+
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        # don't link the full size original, the preview links the size capped version
+        if db_field.name == 'legitimation':
+            kwargs['widget'] = FileInput
+        return super().formfield_for_dbfield(db_field, request, **kwargs)
+
+    def legitimation_preview(self, obj):
+        thumbnail_url = obj.legitimation_url('thumbnail')
+        if not thumbnail_url:
+            return _("pending") if obj.legitimation else "-"
+        return format_html(
+            '<a href="{0}"><img src="{1}" style="max-height: 60px"></a>',
+            obj.legitimation_url('web'), thumbnail_url)
+    legitimation_preview.short_description = _("legitimation")
 
 
 class FablogInline(admin.TabularInline):
@@ -19,7 +38,7 @@ class FablogInline(admin.TabularInline):
     extra = 1
 
 
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(ReplicaChangelistMixin, UserAdmin):
     inlines = (MembershipInline, FablogInline)
 
     fieldsets = (
@@ -54,3 +73,4 @@ class CustomUserAdmin(UserAdmin):
 
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Membership)
+admin.site.register(MembershipReminder)
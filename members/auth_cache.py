@@ -0,0 +1,44 @@
+"""
+    cache keys and invalidation of cached users and permissions (see members.backends)
+"""
+# base
+import time
+
+# django
+from django.core.cache import cache
+from django.db import transaction
+
+USER_KEY = 'auth:user:{0}'
+PERMISSIONS_KEY = 'auth:permissions:{0}:{1}'
+PERMISSIONS_VERSION_KEY = 'auth:permissions:version'
+
+
+def permissions_version():
+    version = cache.get(PERMISSIONS_VERSION_KEY)
+    if version is None:
+        # never reuse an old version, its entries might still be in the cache
+        cache.add(PERMISSIONS_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(PERMISSIONS_VERSION_KEY)
+    return version
+
+
+def invalidate_permissions():
+    """Drop the cached permissions of all users, once the current transaction is committed"""
+    def bump():
+        try:
+            cache.incr(PERMISSIONS_VERSION_KEY)
+        except ValueError:
+            cache.set(PERMISSIONS_VERSION_KEY, int(time.time() * 1000), None)
+    transaction.on_commit(bump)
+
+
+def invalidate_user(user_id):
+    """
+    Drop the cached user and its permissions, now and once the current transaction is committed.
+
+    The permissions depend on is_superuser and is_active, which change with the user itself.
+    """
+    def delete():
+        cache.delete_many([USER_KEY.format(user_id), PERMISSIONS_KEY.format(permissions_version(), user_id)])
+    delete()
+    transaction.on_commit(delete)
@@ -0,0 +1,40 @@
+"""
+    authentication backend keeping users and their permissions in the shared cache
+"""
+# django
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+# local
+from .auth_cache import PERMISSIONS_KEY, USER_KEY, permissions_version
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend caching the user of a session and the permissions of a user.
+
+    Users and their permissions are dropped from the cache when the user is saved, permissions are cached
+    under a version which is bumped whenever group memberships or permissions change (see members.signals).
+    """
+
+    def get_user(self, user_id):
+        key = USER_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.AUTH_CACHE_TIMEOUT)
+        return user
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            key = PERMISSIONS_KEY.format(permissions_version(), user_obj.pk)
+            permissions = cache.get(key)
+            if permissions is None:
+                permissions = super().get_all_permissions(user_obj)
+                cache.set(key, permissions, settings.AUTH_CACHE_TIMEOUT)
+            user_obj._perm_cache = permissions
+        return user_obj._perm_cache
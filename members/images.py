@@ -0,0 +1,87 @@
+"""
+    derivatives of legitimation images
+
+    Phone photos of student IDs are large and carry EXIF data (location, device). For display a
+    thumbnail and a size capped version are generated, both re-encoded without metadata. Their file
+    names contain a hash of the original, so they can be cached forever.
+"""
+# base
+import hashlib
+from io import BytesIO
+from os import path
+
+# django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# additional
+from PIL import Image
+
+DERIVATIVE_SIZES = {
+    'thumbnail': (240, 240),
+    'web': (1600, 1600),
+}
+DERIVATIVE_DIR = 'legitimation_images/derivatives'
+JPEG_QUALITY = 85
+EXIF_ORIENTATION = 274
+ORIENTATION_TRANSPOSE = {
+    2: (Image.FLIP_LEFT_RIGHT, ),
+    3: (Image.ROTATE_180, ),
+    4: (Image.FLIP_TOP_BOTTOM, ),
+    5: (Image.ROTATE_90, Image.FLIP_TOP_BOTTOM),
+    6: (Image.ROTATE_270, ),
+    7: (Image.ROTATE_270, Image.FLIP_TOP_BOTTOM),
+    8: (Image.ROTATE_90, ),
+}
+
+
+def upright(image):
+    """Apply the EXIF orientation, since the EXIF data is dropped from the derivatives"""
+    try:
+        orientation = image._getexif().get(EXIF_ORIENTATION)
+    except Exception:
+        orientation = None
+    for method in ORIENTATION_TRANSPOSE.get(orientation, ()):
+        image = image.transpose(method)
+    return image
+
+
+def render_derivative(image, size):
+    """Return JPEG bytes of image scaled to fit into size, without any metadata"""
+    derivative = image.copy()
+    derivative.thumbnail(size, Image.LANCZOS)
+    output = BytesIO()
+    derivative.save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def build_derivatives(name, storage=default_storage):
+    """Create all derivatives of the original image `name`, return a dict of variant -> file name"""
+    with storage.open(name, 'rb') as original:
+        data = original.read()
+    digest = hashlib.sha256(data).hexdigest()[:24]
+    names = {}
+    image = None
+    for variant, size in DERIVATIVE_SIZES.items():
+        derivative_name = path.join(DERIVATIVE_DIR, '{0}_{1}.jpg'.format(digest, variant))
+        if not storage.exists(derivative_name):
+            if image is None:
+                image = upright(Image.open(BytesIO(data))).convert('RGB')
+            storage.save(derivative_name, ContentFile(render_derivative(image, size)))
+        names[variant] = derivative_name
+    return names
+
+
+def update_derivatives(membership_id):
+    """Build the derivatives of a membership's legitimation image and store their names"""
+    from .models import Membership
+    membership = Membership.objects.filter(pk=membership_id).only('legitimation').first()
+    if membership is None or not membership.legitimation:
+        return
+    source = membership.legitimation.name
+    names = build_derivatives(source)
+    # only if the original has not been replaced in the meantime
+    Membership.objects.filter(pk=membership_id, legitimation=source).update(
+        legitimation_thumbnail=names['thumbnail'],
+        legitimation_web=names['web'],
+        legitimation_source=source)
@@ -0,0 +1,46 @@
+# base
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# django
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+
+# local
+from members.images import build_derivatives
+from members.models import Membership
+
+
+class Command(BaseCommand):
+    help = "Generate missing thumbnails and size capped versions of legitimation images in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="image processing processes")
+        parser.add_argument('--all', action='store_true', help="rebuild the derivatives of all images")
+
+    def handle(self, *args, **options):
+        memberships = Membership.objects.exclude(legitimation='').exclude(legitimation__isnull=True)
+        if not options['all']:
+            memberships = memberships.exclude(legitimation_source=F('legitimation'))
+        todo = dict(memberships.values_list('pk', 'legitimation'))
+
+        # forked workers must not share the database connection
+        connections.close_all()
+        done = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            futures = {pool.submit(build_derivatives, name): pk for pk, name in todo.items()}
+            for future in as_completed(futures):
+                pk = futures[future]
+                try:
+                    names = future.result()
+                except Exception as e:
+                    self.stderr.write("Membership {0}: {1}".format(pk, e))
+                    continue
+                Membership.objects.filter(pk=pk, legitimation=todo[pk]).update(
+                    legitimation_thumbnail=names['thumbnail'],
+                    legitimation_web=names['web'],
+                    legitimation_source=todo[pk])
+                done += 1
+        self.stdout.write(self.style.SUCCESS("Built derivatives of {0} of {1} images.".format(done, len(todo))))
@@ -0,0 +1,183 @@
+# base
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# django
+import django
+from django.contrib.auth.hashers import make_password, identify_hasher
+from django.contrib.auth.models import Group
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+# local
+from members.models import User, Membership
+
+USER_FIELDS = ('email', 'first_name', 'middle_name', 'last_name', 'street_and_number',
+               'zip_code', 'city', 'phone', 'birthday')
+
+
+def read_rows(path, file_format):
+    """Yield (line number, dict) pairs from a CSV or JSON lines file without loading it into memory"""
+    with open(path, newline='') as input_file:
+        if file_format == 'csv':
+            for line, row in enumerate(csv.DictReader(input_file), start=2):
+                yield line, row
+        else:
+            for line, text in enumerate(input_file, start=1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except ValueError as e:
+                        yield line, e
+
+
+def text(value):
+    """A cell as stripped text, JSON values may be numbers or missing"""
+    return '' if value is None else str(value).strip()
+
+
+def parse_memberships(value):
+    """
+    Memberships are given as a list of {"start_date": ..., "end_date": ...} objects (JSON) or as
+    "start:end;start:end" (CSV), dates in ISO format.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [dict(zip(('start_date', 'end_date'), x.split(':'))) for x in value.split(';') if x.strip()]
+    memberships = []
+    for membership in value:
+        if not isinstance(membership, dict):
+            raise ValidationError("invalid membership {0}".format(membership))
+        start_date = parse_date(str(membership.get('start_date', '')).strip())
+        end_date = parse_date(str(membership.get('end_date', '')).strip())
+        if not start_date or not end_date or end_date < start_date:
+            raise ValidationError("invalid membership {0}".format(membership))
+        memberships.append((start_date, end_date))
+    return memberships
+
+
+class Command(BaseCommand):
+    help = (
+        "Import members and their membership history from a CSV or JSON lines file. "
+        "Columns: email, first_name, middle_name, last_name, street_and_number, zip_code, city, phone, "
+        "birthday, password or password_hash (optional) and memberships (optional). "
+        "Members whose email already exists are skipped, so an interrupted import can simply be rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input_file', help="CSV or JSON lines (.jsonl) file")
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help="input format, default from file extension")
+        parser.add_argument('--chunk-size', type=int, default=500, help="members written per transaction")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="password hashing processes")
+        parser.add_argument('--errors', help="write rejected rows to this CSV file")
+        parser.add_argument('--group', default='members', help="group the imported members are added to")
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or ('jsonl' if options['input_file'].endswith(('.json', '.jsonl')) else 'csv')
+        if not os.path.exists(options['input_file']):
+            raise CommandError("File {0} does not exist".format(options['input_file']))
+
+        self.group, _new = Group.objects.get_or_create(name=options['group'])
+        self.errors = []
+        self.imported = 0
+        self.skipped = 0
+
+        rows = read_rows(options['input_file'], file_format)
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                self.import_chunk(chunk, pool)
+                self.stdout.write("{0} imported, {1} skipped, {2} errors".format(
+                    self.imported, self.skipped, len(self.errors)))
+
+        if self.errors:
+            if options['errors']:
+                with open(options['errors'], 'w', newline='') as error_file:
+                    writer = csv.writer(error_file)
+                    writer.writerow(['line', 'email', 'error'])
+                    writer.writerows(self.errors)
+            else:
+                for error in self.errors:
+                    self.stderr.write("line {0} ({1}): {2}".format(*error))
+        self.stdout.write(self.style.SUCCESS("Imported {0} members, skipped {1} existing, {2} errors.".format(
+            self.imported, self.skipped, len(self.errors))))
+
+    def validate(self, line, row):
+        """Return (user, password, memberships) or None and record the error"""
+        if isinstance(row, Exception):
+            self.errors.append((line, '', row))
+            return None
+        if not isinstance(row, dict):
+            self.errors.append((line, '', "not a JSON object"))
+            return None
+        email = text(row.get('email'))
+        try:
+            user = User(**{field: text(row.get(field)) for field in USER_FIELDS})
+            user.clean()
+            user.full_clean(exclude=['password'], validate_unique=False)
+            memberships = parse_memberships(row.get('memberships'))
+            password_hash = text(row.get('password_hash'))
+            if password_hash:
+                identify_hasher(password_hash)
+        except ValidationError as e:
+            if hasattr(e, 'error_dict'):
+                message = "; ".join(
+                    "{0}: {1}".format(field, " ".join(messages)) for field, messages in e.message_dict.items())
+            else:
+                message = " ".join(e.messages)
+            self.errors.append((line, email, message))
+            return None
+        except (ValueError, TypeError) as e:
+            self.errors.append((line, email, str(e)))
+            return None
+        if password_hash:
+            user.password = password_hash
+        # bulk_create skips save() and the membership signals
+        user.update_search_name()
+        user.membership_end_date = max((end_date for _start, end_date in memberships), default=None)
+        return user, text(row.get('password')) or None, memberships
+
+    def import_chunk(self, chunk, pool):
+        candidates = {}
+        for line, row in chunk:
+            validated = self.validate(line, row)
+            if validated is None:
+                continue
+            user = validated[0]
+            if user.email in candidates:
+                self.errors.append((line, user.email, "duplicate email in input"))
+                continue
+            candidates[user.email] = validated
+
+        existing = set(User.objects.filter(email__in=candidates).values_list('email', flat=True))
+        self.skipped += len(existing)
+        new = [candidates[email] for email in candidates if email not in existing]
+
+        # hash passwords in parallel, members without a password get an unusable one
+        to_hash = [(user, password) for user, password, _memberships in new if password and not user.password]
+        hashes = pool.map(make_password, [password for _user, password in to_hash], chunksize=16)
+        for (user, _password), password_hash in zip(to_hash, hashes):
+            user.password = password_hash
+        for user, _password, _memberships in new:
+            if not user.password:
+                user.set_unusable_password()
+
+        with transaction.atomic():
+            User.objects.bulk_create([user for user, _password, _memberships in new])
+            user_ids = dict(User.objects.filter(
+                email__in=[user.email for user, _password, _memberships in new]).values_list('email', 'pk'))
+            Membership.objects.bulk_create([
+                Membership(member_id=user_ids[user.email], start_date=start_date, end_date=end_date)
+                for user, _password, memberships in new
+                for start_date, end_date in memberships])
+            User.groups.through.objects.bulk_create([
+                User.groups.through(user_id=user_id, group_id=self.group.pk) for user_id in user_ids.values()])
+        self.imported += len(new)
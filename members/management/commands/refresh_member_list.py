@@ -0,0 +1,21 @@
+# django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Value
+from django.db.models.functions import Concat, Lower
+
+# local
+from members.models import User, Membership
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized search name and membership end date of all members"
+
+    def handle(self, *args, **options):
+        end_dates = Membership.objects.filter(member=OuterRef('pk')).order_by().values(
+            'member').annotate(end_date=Max('end_date')).values('end_date')
+        with transaction.atomic():
+            updated = User.objects.update(
+                search_name=Lower(Concat('last_name', Value(' '), 'first_name')),
+                membership_end_date=Subquery(end_dates))
+        self.stdout.write(self.style.SUCCESS("Updated {0} members.".format(updated)))
@@ -0,0 +1,68 @@
+# base
+from datetime import date, timedelta
+
+# django
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.template.loader import render_to_string
+from django.utils import translation
+
+# local
+from members.models import User, MembershipReminder
+
+
+class Command(BaseCommand):
+    help = (
+        "Send a reminder to every active member whose latest membership ends within the given window. "
+        "Sent reminders are recorded, so every member is reminded only once per membership."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-days', type=int, default=0, help="window start, days from today")
+        parser.add_argument('--to-days', type=int, default=14, help="window end, days from today")
+        parser.add_argument('--batch-size', type=int, default=50, help="messages sent per batch")
+        parser.add_argument('--dry-run', action='store_true', help="only list the members to remind")
+
+    def get_members(self, start, end):
+        already_sent = MembershipReminder.objects.filter(
+            member=OuterRef('pk'), membership_end_date=OuterRef('membership_end_date'))
+        return User.objects.filter(
+            is_active=True,
+            membership_end_date__range=(start, end)
+        ).annotate(reminded=Exists(already_sent)).filter(reminded=False).order_by('pk')
+
+    def render_message(self, member):
+        context = {'member': member, 'end_date': member.membership_end_date}
+        subject = render_to_string('members/email/membership_reminder_subject.txt', context)
+        body = render_to_string('members/email/membership_reminder_body.txt', context)
+        return EmailMessage(" ".join(subject.split()), body, settings.DEFAULT_FROM_EMAIL, [member.email])
+
+    def handle(self, *args, **options):
+        today = date.today()
+        members = list(self.get_members(
+            today + timedelta(days=options['from_days']), today + timedelta(days=options['to_days'])))
+
+        if options['dry_run']:
+            for member in members:
+                self.stdout.write("{0} <{1}>: {2}".format(member, member.email, member.membership_end_date))
+            return
+
+        sent = 0
+        translation.activate(settings.LANGUAGE_CODE)
+        connection = get_connection()
+        connection.open()
+        try:
+            batch_size = options['batch_size']
+            for i in range(0, len(members), batch_size):
+                batch = members[i:i + batch_size]
+                connection.send_messages([self.render_message(member) for member in batch])
+                # record each batch right after sending, so an aborted run resumes where it stopped
+                MembershipReminder.objects.bulk_create([
+                    MembershipReminder(member=member, membership_end_date=member.membership_end_date)
+                    for member in batch])
+                sent += len(batch)
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS("Sent {0} membership reminders.".format(sent)))
@@ -9,8 +9,12 @@ from django.utils import timezone
 from django.utils.formats import date_format
 from django.utils.translation import gettext_lazy as _
 from django.template.defaultfilters import slugify
+from django.urls import reverse
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 
+# local
+from .auth_cache import invalidate_user
+
 
 class CustomUserManager(BaseUserManager):
     use_in_migrations = True
@@ -67,6 +71,11 @@ class CustomUserManager(BaseUserManager):
                                  zip_code, city, phone, birthday,
                                  password, **extra_fields)
 
+    def search(self, term):
+        """Users whose name or email starts with term"""
+        # prefix matches can use the indexes on search_name and email
+        return self.filter(Q(search_name__startswith=term.lower()) | Q(email__startswith=term))
+
 
 class MemberUserManager(models.Manager):
     def get_queryset(self):
@@ -151,6 +160,18 @@ class User(AbstractBaseUser, PermissionsMixin):
     )
     date_joined = models.DateTimeField(_('date joined'), default=timezone.now)
 
+    # denormalized for the member list: lower case "last_name first_name" and the end of the latest membership
+    search_name = models.CharField(
+        max_length=511,
+        db_index=True,
+        editable=False,
+        verbose_name=_('search name'))
+    membership_end_date = models.DateField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_('membership end date'))
+
     objects = CustomUserManager()
     members = MemberUserManager()
 
@@ -166,14 +187,37 @@ class User(AbstractBaseUser, PermissionsMixin):
         ordering = ['last_name', 'first_name']
         permissions = (
             ("view_members", _("Can view members")),)
+        indexes = [
+            models.Index(fields=['search_name', 'id']),
+            models.Index(fields=['membership_end_date', 'id'])]
 
     def __str__(self):
         return self.get_full_name()
 
+    def save(self, *args, **kwargs):
+        self.update_search_name()
+        super().save(*args, **kwargs)
+
     def clean(self):
         super().clean()
         self.email = self.__class__.objects.normalize_email(self.email)
 
+    def update_search_name(self):
+        self.search_name = "{0} {1}".format(self.last_name, self.first_name).strip().lower()
+
+    def update_membership_end_date(self):
+        """Recompute the end of the latest membership from the database"""
+        self.membership_end_date = self.membership.aggregate(end_date=Max('end_date'))['end_date']
+        self.__class__.objects.filter(pk=self.pk).update(membership_end_date=self.membership_end_date)
+        invalidate_user(self.pk)
+
+    def membership_status(self):
+        if self.membership_end_date is None:
+            return 'new'
+        elif self.membership_end_date >= date.today():
+            return 'active'
+        return 'expired'
+
     def get_full_name(self):
         if self.middle_name:
             initial = " {0} ".format(self.middle_name[0].upper())
@@ -213,7 +257,9 @@ class Membership(models.Model):
         User,
         related_name="membership",
         on_delete=models.PROTECT,
-        null=True)
+        null=True,
+        # no index of its own, the composite indexes in Meta.indexes start with it
+        db_index=False)
     fablog = models.OneToOneField(
         "fablog.Fablog",
         on_delete=models.PROTECT,
@@ -231,12 +277,64 @@ class Membership(models.Model):
         upload_to=legitimation_image_path,
         null=True,
         blank=True)
+    # derivatives of the legitimation image, generated in the background (see members.images)
+    legitimation_thumbnail = models.ImageField(
+        null=True,
+        blank=True,
+        editable=False)
+    legitimation_web = models.ImageField(
+        null=True,
+        blank=True,
+        editable=False)
+    legitimation_source = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        help_text=_("Legitimation image the derivatives were generated from"))
 
     class Meta:
         verbose_name = _('Membership')
         verbose_name_plural = _('Membership')
         ordering = ['end_date', ]
+        indexes = [models.Index(fields=['member', 'end_date'])]
 
     def __str__(self):
         return _("Membership %(year)s") % {
             "year": self.start_date.year}
+
+    def derivatives_outdated(self):
+        return bool(self.legitimation) and self.legitimation.name != self.legitimation_source
+
+    def legitimation_url(self, variant):
+        """URL of the thumbnail, web or original version of the legitimation image, None if missing"""
+        image = {
+            'thumbnail': self.legitimation_thumbnail,
+            'web': self.legitimation_web,
+            'original': self.legitimation}[variant]
+        if not image:
+            return None
+        return reverse('members:legitimation', args=[self.pk, variant, path.basename(image.name)])
+
+
+class MembershipReminder(models.Model):
+    """Record of a sent membership expiry reminder, one per member and membership end date"""
+    member = models.ForeignKey(
+        User,
+        related_name="membership_reminders",
+        on_delete=models.CASCADE,
+        verbose_name=_("member"))
+    membership_end_date = models.DateField(
+        verbose_name=_("membership end date"),
+        help_text=_("End date of the membership the reminder was sent for"))
+    sent_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("sent at"))
+
+    class Meta:
+        verbose_name = _('membership reminder')
+        verbose_name_plural = _('membership reminders')
+        ordering = ['-sent_at']
+        unique_together = ('member', 'membership_end_date')
+
+    def __str__(self):
+        return "{0} ({1})".format(self.member, self.membership_end_date)
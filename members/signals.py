@@ -0,0 +1,43 @@
+# Django
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+# local
+from .auth_cache import invalidate_permissions, invalidate_user
+from .models import Membership, User
+from .images import update_derivatives
+from utils.background import submit_on_commit
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def update_membership_end_date(sender, instance, raw=False, **kwargs):
+    if instance.member_id and not raw:
+        instance.member.update_membership_end_date()
+
+
+@receiver(post_save, sender=Membership)
+def schedule_legitimation_derivatives(sender, instance, raw=False, **kwargs):
+    if instance.derivatives_outdated() and not raw:
+        submit_on_commit(update_derivatives, instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_cached_permissions(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_permissions()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidate_cached_permissions_on_delete(sender, **kwargs):
+    invalidate_permissions()
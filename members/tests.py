@@ -1,3 +1,82 @@
+# base
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+
+# django
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+# local
+from members.models import User
+from utils.pagination import KeysetPaginator
+
+
+class ImportMembersTest(TestCase):
+    """import_members reports bad rows and goes on with the others"""
+
+    def import_lines(self, lines):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as input_file:
+            input_file.write("\n".join(lines) + "\n")
+        self.addCleanup(os.remove, input_file.name)
+        errors = StringIO()
+        call_command('import_members', input_file.name, workers=1, stdout=StringIO(), stderr=errors)
+        return errors.getvalue()
+
+    def member(self, email, **fields):
+        row = {
+            'email': email, 'first_name': 'Ada', 'last_name': 'Lovelace', 'street_and_number': 'Hauptstrasse 1',
+            'zip_code': '8000', 'city': 'Zürich', 'phone': '044 000 00 00', 'birthday': '1990-01-01',
+            'memberships': [{'start_date': '2020-01-01', 'end_date': '2020-12-31'}]}
+        row.update(fields)
+        return json.dumps(row)
+
+    def test_non_string_values(self):
+        errors = self.import_lines([self.member('number@example.com', zip_code=8000, phone=440000000)])
+        self.assertEqual(errors, '')
+        user = User.objects.get(email='number@example.com')
+        self.assertEqual((user.zip_code, user.phone), ('8000', '440000000'))
+        self.assertEqual(user.membership.count(), 1)
+
+    def test_bad_rows_are_reported(self):
+        errors = self.import_lines([
+            '["not", "an", "object"]',
+            '{"email": ',
+            self.member('membership@example.com', memberships=['2020-01-01']),
+            self.member('good@example.com'),
+        ])
+        self.assertIn("line 1 (): not a JSON object", errors)
+        self.assertIn("line 2 ()", errors)
+        self.assertIn("line 3 (membership@example.com): invalid membership", errors)
+        self.assertEqual(list(User.objects.values_list('email', flat=True)), ['good@example.com'])
+
+
+class KeysetPaginatorTest(TestCase):
+    """Following the cursors visits every member once, in the order of the sort"""
+
+    def setUp(self):
+        for i, end_date in enumerate([None, 3, 1, None, 3, 2, None, 1, 3]):
+            User.objects.create_user(
+                email='member{0}@example.com'.format(i), first_name='Member', last_name=str(i % 4),
+                street_and_number='-', zip_code='8000', city='Zürich', phone='-', birthday=date(1990, 1, 1),
+                membership_end_date=end_date and date(2020, 1, 1) + timedelta(days=end_date))
+
+    def walk(self, field, descending):
+        paginator = KeysetPaginator(User.objects.all(), field, descending=descending, per_page=2)
+        members, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            members += [member.pk for member in page]
+            if not page.has_next():
+                return members
+            cursor = page.next_cursor
+
+    def test_pages(self):
+        for field, descending in [('search_name', False), ('membership_end_date', False),
+                                  ('membership_end_date', True)]:
+            members = list(User.objects.values_list(field, 'pk'))
+            # NULL last ascending, first descending
+            members.sort(key=lambda member: (member[0] is None, member[0] or date.min, member[1]), reverse=descending)
+            self.assertEqual(self.walk(field, descending), [pk for value, pk in members], field)
@@ -6,5 +6,8 @@ app_name = 'members'
 # login and registration views have their urls in the main digitalFablog/url.py
 
 urlpatterns = [
-    path("", views.MemberListView.as_view(), name="members_list")
+    path("", views.MemberListView.as_view(), name="members_list"),
+    path("csv", views.MemberListCSVView.as_view(), name="members_list_csv"),
+    path("legitimation/<int:pk>/<str:variant>/<str:name>", views.LegitimationImageView.as_view(),
+         name="legitimation")
 ]
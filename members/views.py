@@ -1,12 +1,24 @@
+# base
+import csv
+import mimetypes
+from datetime import date
+from os import path
+
 # django
 from django.contrib.auth.views import LoginView, LogoutView
-from django.views.generic import CreateView, ListView
+from django.db import router
+from django.views.generic import CreateView, ListView, View
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
+from django.utils.translation import gettext as _
 from django.contrib.auth.mixins import PermissionRequiredMixin
 
 # local
 from .forms import CustomUserCreationForm
-from .models import User
+from .models import User, Membership
+from utils.pagination import KeysetPaginator, estimate_count
+from digitalFablog.routers import ReplicaReadMixin
 
 
 class Login(LoginView):
@@ -26,15 +38,130 @@ class Registration(CreateView):
         return reverse('fablog:home')
 
 
-class MemberListView(PermissionRequiredMixin, ListView):
+class MemberListView(PermissionRequiredMixin, ReplicaReadMixin, ListView):
+    """
+    Member list with keyset pagination.
+
+    Sorting, filtering and search only use the indexed search_name and membership_end_date columns,
+    so every page costs the same however many members there are.
+    """
     permission_required = 'members.view_members'
 
     template_name = "members/members_listview.html"
     context_object_name = 'members'
+    paginate_by = 50
+
+    # sort option: (field, descending)
+    sort_options = {
+        'name': ('search_name', False),
+        'end_date': ('membership_end_date', False),
+        'status': ('membership_end_date', True)}
+    status_options = ('active', 'expired', 'new')
+
+    def get_sort(self):
+        sort = self.request.GET.get('sort')
+        return sort if sort in self.sort_options else 'name'
+
+    def get_status(self):
+        status = self.request.GET.get('status')
+        return status if status in self.status_options else ''
+
+    def get_search(self):
+        return self.request.GET.get('q', '').strip()
 
     def get_queryset(self):
-        return User.members.all()
+        queryset = User.objects.all()
+        status = self.get_status()
+        if status == 'active':
+            queryset = queryset.filter(membership_end_date__gte=date.today())
+        elif status == 'expired':
+            queryset = queryset.filter(membership_end_date__lt=date.today())
+        elif status == 'new':
+            queryset = queryset.filter(membership_end_date__isnull=True)
+        search = self.get_search()
+        if search:
+            queryset = queryset & User.objects.search(search)
+        return queryset
+
+    def paginate_queryset(self, queryset, page_size):
+        field, descending = self.sort_options[self.get_sort()]
+        paginator = KeysetPaginator(queryset, field, descending=descending, per_page=page_size)
+        page = paginator.page(self.request.GET.get('after'))
+        return (paginator, page, page.object_list, page.has_next() or page.cursor is not None)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['member_count'] = estimate_count(self.object_list)
+        context['sort'] = self.get_sort()
+        context['status'] = self.get_status()
+        context['q'] = self.get_search()
+        context['sort_options'] = self.sort_options
+        context['status_options'] = self.status_options
         return context
+
+
+class Echo:
+    """File-like object for csv.writer which hands the written line back"""
+
+    def write(self, value):
+        return value
+
+
+class MemberListCSVView(MemberListView):
+    """The filtered member list as CSV, all pages, streamed"""
+    fields = ('id', 'email', 'first_name', 'middle_name', 'last_name', 'street_and_number', 'zip_code', 'city',
+              'membership_end_date')
+
+    def get(self, request, *args, **kwargs):
+        field, descending = self.sort_options[self.get_sort()]
+        # the rows are read while the response streams, after dispatch left the replica routing
+        members = self.get_queryset().using(router.db_for_read(User)).order_by(
+            '-' + field if descending else field, 'id').values_list(*self.fields).iterator()
+        writer = csv.writer(Echo())
+        header = ['#', _('Email'), _('First Name'), _('Middle Name'), _('Last Name'), _('Adress'), _('ZIP'),
+                  _('City'), _('enddate')]
+        lines = (writer.writerow(row) for row in self.rows(header, members))
+        response = StreamingHttpResponse(lines, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="members.csv"'
+        return response
+
+    @staticmethod
+    def rows(header, members):
+        yield header
+        for member in members:
+            yield ['' if value is None else value for value in member]
+
+
+class LegitimationImageView(PermissionRequiredMixin, View):
+    """
+    Stream a legitimation image (or one of its derivatives) in chunks.
+
+    Derivative names contain a hash of their content, so they may be cached for good.
+    """
+    permission_required = 'members.view_members'
+    fields = {
+        'thumbnail': 'legitimation_thumbnail',
+        'web': 'legitimation_web',
+        'original': 'legitimation'}
+
+    def get(self, request, pk, variant, name):
+        if variant not in self.fields:
+            raise Http404
+        membership = get_object_or_404(Membership.objects.only(self.fields[variant]), pk=pk)
+        image = getattr(membership, self.fields[variant])
+        if not image:
+            raise Http404
+        if path.basename(image.name) != name:
+            # the image has been replaced since the link was rendered
+            return redirect(membership.legitimation_url(variant))
+        try:
+            image_file = image.storage.open(image.name, 'rb')
+        except OSError:
+            raise Http404
+        content_type = mimetypes.guess_type(image.name)[0] or 'application/octet-stream'
+        response = FileResponse(image_file, content_type=content_type)
+        if variant == 'original':
+            response['Cache-Control'] = 'private, no-cache'
+        else:
+            response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import Membership
+from .models import Membership, MembershipPrice
 
 
-admin.site.register(Membership)
+class MembershipPriceInline(admin.TabularInline):
+    model = MembershipPrice
+    extra = 0
+
+
+class MembershipAdmin(admin.ModelAdmin):
+    inlines = (MembershipPriceInline,)
+
+
+admin.site.register(Membership, MembershipAdmin)
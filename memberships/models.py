@@ -1,8 +1,12 @@
 # django
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+# local
+from utils.pricing import HISTORY_START, EffectivePriceIndex
+
 
 class Membership(models.Model):
     """ Services """
@@ -40,3 +44,50 @@ class Membership(models.Model):
 
     def __str__(self):
         return "{0} ({1})".format(self.name, self.price)
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None and not self.prices.exists():
+            # saved before the price history (or loaded from fixtures): the stored price was valid until now
+            stored = Membership.objects.filter(pk=self.pk).values_list('price', flat=True).first()
+            if stored is not None:
+                MembershipPrice.objects.create(membership_id=self.pk, price=stored, valid_from=HISTORY_START)
+        super().save(*args, **kwargs)
+        # record price changes in the price history
+        last_price = self.prices.order_by('valid_from').last()
+        if last_price is None or last_price.price != self.price:
+            MembershipPrice.objects.create(membership=self, price=self.price)
+
+    def price_at(self, timestamp):
+        """Price valid at timestamp"""
+        return membership_prices.price_at(self.id, timestamp, default=self.price)
+
+
+class MembershipPrice(models.Model):
+    """ Effective-dated price history of a membership """
+    membership = models.ForeignKey(
+        "Membership",
+        related_name="prices",
+        on_delete=models.CASCADE,
+        verbose_name=_("membership"))
+    price = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        validators=[MinValueValidator(0)],
+        verbose_name=_("price"),
+        help_text=_("price of membership"))
+    valid_from = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("valid from"),
+        help_text=_("Price is valid from this date and time until the next price change"))
+
+    class Meta:
+        verbose_name = _("membership price")
+        verbose_name_plural = _("membership prices")
+        ordering = ["membership", "-valid_from"]
+        indexes = [models.Index(fields=["membership", "valid_from"])]
+
+    def __str__(self):
+        return "{0}: {1} ({2})".format(self.membership.name, self.price, self.valid_from.strftime('%d.%m.%Y'))
+
+
+membership_prices = EffectivePriceIndex("memberships.MembershipPrice", "membership", "price")
@@ -0,0 +1,16 @@
+from django.contrib import admin
+from .models import MonthlyStats, MonthlyRevenue, Watermark
+
+
+class MonthlyStatsAdmin(admin.ModelAdmin):
+    list_display = ('month', 'active_members', 'new_members', 'frozen', 'computed_at')
+
+
+class MonthlyRevenueAdmin(admin.ModelAdmin):
+    list_display = ('month', 'dimension', 'key', 'label', 'amount')
+    list_filter = ('dimension', )
+
+
+admin.site.register(MonthlyStats, MonthlyStatsAdmin)
+admin.site.register(MonthlyRevenue, MonthlyRevenueAdmin)
+admin.site.register(Watermark)
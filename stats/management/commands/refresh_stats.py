@@ -0,0 +1,13 @@
+# django
+from django.core.management.base import BaseCommand
+
+# local
+from stats.rollups import refresh
+
+
+class Command(BaseCommand):
+    help = "Update the monthly statistics rollups (run e.g. every 15 minutes from cron)"
+
+    def handle(self, *args, **options):
+        computed = refresh()
+        self.stdout.write(self.style.SUCCESS("Rollups up to date, {0} months computed in full.".format(computed)))
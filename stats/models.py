@@ -0,0 +1,101 @@
+# django
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class MonthlyStats(models.Model):
+    """Rollup of member numbers per month. Frozen months are never recomputed."""
+    month = models.DateField(
+        unique=True,
+        verbose_name=_("month"),
+        help_text=_("first day of the month"))
+    active_members = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("active members"),
+        help_text=_("members with a membership during the month"))
+    new_members = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("new registrations"),
+        help_text=_("members registered during the month"))
+    frozen = models.BooleanField(
+        default=False,
+        verbose_name=_("frozen"),
+        help_text=_("the month is closed and will not be recomputed"))
+    computed_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("computed at"))
+
+    class Meta:
+        verbose_name = _("monthly statistics")
+        verbose_name_plural = _("monthly statistics")
+        ordering = ['month']
+        permissions = (
+            ('view_dashboard', _('Can view the statistics dashboard')),)
+
+    def __str__(self):
+        return self.month.strftime('%m.%Y')
+
+
+class MonthlyRevenue(models.Model):
+    """Rollup of revenue per month and contra account or machine"""
+    ACCOUNT = 0
+    MACHINE = 1
+    DIMENSION_CHOICES = (
+        (ACCOUNT, _('contra account')),
+        (MACHINE, _('machine')),
+    )
+    month = models.DateField(
+        verbose_name=_("month"),
+        help_text=_("first day of the month"))
+    dimension = models.PositiveSmallIntegerField(
+        choices=DIMENSION_CHOICES,
+        verbose_name=_("dimension"))
+    key = models.CharField(
+        max_length=50,
+        verbose_name=_("key"),
+        help_text=_("account number or machine id"))
+    label = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name=_("label"))
+    amount = models.DecimalField(
+        default=0,
+        max_digits=12,
+        decimal_places=2,
+        verbose_name=_("amount"))
+    pending = models.DecimalField(
+        default=0,
+        max_digits=12,
+        decimal_places=2,
+        verbose_name=_("pending"),
+        help_text=_("part of the amount from rows after the watermarks, recounted by the next refresh"))
+
+    class Meta:
+        verbose_name = _("monthly revenue")
+        verbose_name_plural = _("monthly revenues")
+        ordering = ['month', 'dimension', 'key']
+        unique_together = ('month', 'dimension', 'key')
+
+    def __str__(self):
+        return "{0} {1} {2}: {3}".format(self.month.strftime('%m.%Y'), self.get_dimension_display(),
+                                         self.label or self.key, self.amount)
+
+
+class Watermark(models.Model):
+    """Timestamp up to which source rows have been added to the current month's rollups for good"""
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name=_("name"))
+    last_timestamp = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("last timestamp"))
+
+    class Meta:
+        verbose_name = _("watermark")
+        verbose_name_plural = _("watermarks")
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,189 @@
+"""
+    monthly rollups
+
+    Closed months are computed once from the source tables and frozen. The current month's member
+    numbers are recomputed on every refresh, its revenue is updated incrementally from the bookings
+    and closed fablogs dated after the watermarks. Bookings and fablogs get their timestamps before their
+    transaction commits, so the watermarks stay STATS_SETTLE_SECONDS behind the refresh: newer rows are
+    added as pending, taken back and added again by the next refresh, together with the rows committed
+    meanwhile. At the turn of the month the previous month is recomputed in full before it is frozen,
+    which also corrects any drift.
+"""
+# base
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+# django
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+# local
+from .models import MonthlyStats, MonthlyRevenue, Watermark
+from jobs.queue import task
+from utils.cache import Namespace
+
+# the rendered dashboard, dropped on every refresh
+stats_cache = Namespace('stats', timeout=24 * 3600)
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def next_month(month):
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+
+def month_bounds(month):
+    """Aware datetimes of the start of the month and the start of the next month"""
+    return (timezone.make_aware(datetime.combine(month, time.min)),
+            timezone.make_aware(datetime.combine(next_month(month), time.min)))
+
+
+def local_month(timestamp):
+    return month_start(timezone.localtime(timestamp).date())
+
+
+def member_stats(month):
+    Membership = apps.get_model('members', 'Membership')
+    User = apps.get_model('members', 'User')
+    start, end = month_bounds(month)
+    active_members = Membership.objects.filter(
+        start_date__lt=next_month(month), end_date__gte=month).values('member').distinct().count()
+    new_members = User.objects.filter(date_joined__gte=start, date_joined__lt=end).count()
+    return active_members, new_members
+
+
+def account_revenue(bookings):
+    """{(month, account): amount} of a queryset of bookings"""
+    Booking = apps.get_model('cashier', 'Booking')
+    revenue = defaultdict(Decimal)
+    for timestamp, account, amount in bookings.filter(booking_type=Booking.BOOKING).values_list(
+            'timestamp', 'account', 'amount'):
+        revenue[(local_month(timestamp), account)] += amount
+    return revenue
+
+
+def machine_revenue(machines_used):
+    """{(month, machine id): amount} and {machine id: name} of a queryset of machines used"""
+    revenue = defaultdict(Decimal)
+    labels = {}
+    for used in machines_used.filter(machine__isnull=False).select_related('machine', 'fablog'):
+        revenue[(local_month(used.fablog.closed_at), used.machine_id)] += used.price()
+        labels[used.machine_id] = used.machine.name
+    return revenue, labels
+
+
+def add_revenue(dimension, revenue, labels=None, pending=False):
+    """Add amounts to the revenue rollups, pending amounts are taken back by the next refresh"""
+    labels = labels or {}
+    for (month, key), amount in revenue.items():
+        row, _new = MonthlyRevenue.objects.get_or_create(
+            month=month, dimension=dimension, key=str(key),
+            defaults={'label': labels.get(key, str(key))})
+        if pending:
+            MonthlyRevenue.objects.filter(pk=row.pk).update(
+                amount=F('amount') + amount, pending=F('pending') + amount)
+        else:
+            MonthlyRevenue.objects.filter(pk=row.pk).update(amount=F('amount') + amount)
+
+
+def add_bookings_and_fablogs(bookings, machines_used, settled=None):
+    """Add the revenue of bookings and closed fablogs, the ones after `settled` as pending"""
+    if settled is None:
+        add_revenue(MonthlyRevenue.ACCOUNT, account_revenue(bookings))
+        add_revenue(MonthlyRevenue.MACHINE, *machine_revenue(machines_used))
+        return
+    add_revenue(MonthlyRevenue.ACCOUNT, account_revenue(bookings.filter(timestamp__lte=settled)))
+    add_revenue(MonthlyRevenue.ACCOUNT, account_revenue(bookings.filter(timestamp__gt=settled)), pending=True)
+    add_revenue(MonthlyRevenue.MACHINE, *machine_revenue(machines_used.filter(fablog__closed_at__lte=settled)))
+    add_revenue(MonthlyRevenue.MACHINE, *machine_revenue(machines_used.filter(fablog__closed_at__gt=settled)),
+                pending=True)
+
+
+def compute_month(month, frozen, settled=None):
+    """Compute all rollups of a month from scratch, the rows after `settled` as pending"""
+    Booking = apps.get_model('cashier', 'Booking')
+    MachinesUsed = apps.get_model('fablog', 'MachinesUsed')
+    start, end = month_bounds(month)
+    bookings = Booking.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    machines_used = MachinesUsed.objects.filter(fablog__closed_at__gte=start, fablog__closed_at__lt=end)
+    active_members, new_members = member_stats(month)
+    with transaction.atomic():
+        MonthlyStats.objects.update_or_create(month=month, defaults={
+            'active_members': active_members,
+            'new_members': new_members,
+            'frozen': frozen,
+            'computed_at': timezone.now()})
+        MonthlyRevenue.objects.filter(month=month).delete()
+        add_bookings_and_fablogs(bookings, machines_used, settled)
+
+
+def first_month():
+    Booking = apps.get_model('cashier', 'Booking')
+    User = apps.get_model('members', 'User')
+    candidates = [
+        Booking.objects.aggregate(first=Min('timestamp'))['first'],
+        User.objects.aggregate(first=Min('date_joined'))['first']]
+    candidates = [local_month(x) for x in candidates if x]
+    return min(candidates) if candidates else month_start(date.today())
+
+
+@task
+def refresh():
+    """Bring the rollups up to date, return the number of months computed in full"""
+    Booking = apps.get_model('cashier', 'Booking')
+    MachinesUsed = apps.get_model('fablog', 'MachinesUsed')
+    current = month_start(timezone.localdate())
+    computed = 0
+
+    Watermark.objects.get_or_create(name='booking')
+    Watermark.objects.get_or_create(name='fablog')
+    with transaction.atomic():
+        # concurrent refreshes (several workers, a worker and cron) wait here for each other, so no month is
+        # computed twice at once and no booking is added twice. The watermarks move with the revenue they cover.
+        marks = {mark.name: mark for mark in Watermark.objects.select_for_update().filter(
+            name__in=('booking', 'fablog'))}
+        booking_mark, fablog_mark = marks['booking'], marks['fablog']
+
+        now = timezone.now()
+        # rows dated up to here have committed by now, unless their transaction took longer
+        settled = now - timedelta(seconds=settings.STATS_SETTLE_SECONDS)
+
+        # freeze all closed months, the previous one only once its last rows have settled
+        frozen = set(MonthlyStats.objects.filter(frozen=True).values_list('month', flat=True))
+        month = first_month()
+        while month < current:
+            if month not in frozen:
+                compute_month(month, frozen=month_bounds(month)[1] <= settled)
+                computed += 1
+            month = next_month(month)
+
+        start, end = month_bounds(current)
+        settled = max(settled, start)
+        marked = [booking_mark.last_timestamp, fablog_mark.last_timestamp]
+        if None in marked or min(marked) < start or not MonthlyStats.objects.filter(month=current).exists():
+            # new month (or first run): start the current month from scratch
+            compute_month(current, frozen=False, settled=settled)
+            computed += 1
+        else:
+            active_members, new_members = member_stats(current)
+            MonthlyStats.objects.filter(month=current).update(
+                active_members=active_members, new_members=new_members, computed_at=now)
+            MonthlyRevenue.objects.filter(month=current).exclude(pending=0).update(
+                amount=F('amount') - F('pending'), pending=0)
+            add_bookings_and_fablogs(
+                Booking.objects.filter(timestamp__gt=booking_mark.last_timestamp, timestamp__lt=end),
+                MachinesUsed.objects.filter(
+                    fablog__closed_at__gt=fablog_mark.last_timestamp, fablog__closed_at__lt=end),
+                settled)
+        Watermark.objects.filter(pk__in=[booking_mark.pk, fablog_mark.pk]).update(last_timestamp=settled)
+    # run as a job the refresh commits with the job, until then the dashboard would be cached from the old rows
+    transaction.on_commit(stats_cache.invalidate)
+    return computed
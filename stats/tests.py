@@ -0,0 +1,68 @@
+# base
+from datetime import date, timedelta
+from decimal import Decimal
+
+# django
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+
+# local
+from cashier.models import Booking, Journal
+from fablog.models import FabDay, Fablog, MachinesUsed
+from machines.models import Machine
+from members.models import User
+from stats.models import MonthlyRevenue
+from stats.rollups import month_bounds, month_start, refresh
+
+
+class RefreshTest(TestCase):
+    """The rollups of the current month count every committed row once"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='labmanager@example.com', first_name='Lab', last_name='Manager', street_and_number='-',
+            zip_code='8000', city='Zürich', phone='-', birthday=date(1990, 1, 1))
+        self.journal = Journal.objects.create(number=1000, name='Kasse', default_account=True)
+        now = timezone.now()
+        # one unit of 30 minutes
+        self.fablog = Fablog.objects.create(
+            created_by=self.user, member=self.user, fabday=FabDay.objects.create(date=timezone.localdate()))
+        MachinesUsed.objects.create(
+            fablog=self.fablog, machine=Machine.objects.create(name='Laser', price_per_unit=Decimal('10.00')),
+            start_time=now - timedelta(minutes=40), end_time=now - timedelta(minutes=10))
+
+    def revenue(self, dimension):
+        return MonthlyRevenue.objects.filter(
+            month=month_start(timezone.localdate()), dimension=dimension).aggregate(sum=Sum('amount'))['sum'] or 0
+
+    def close(self, closed_at):
+        Fablog.objects.filter(pk=self.fablog.pk).update(closed_at=closed_at, closed_by=self.user)
+
+    def test_close_committed_after_a_refresh(self):
+        refresh()
+        # the closing request sets closed_at, a refresh runs before its transaction commits
+        closed_at = timezone.now()
+        refresh()
+        self.close(closed_at)
+        # the refresh queued on commit
+        refresh()
+        self.assertEqual(self.revenue(MonthlyRevenue.MACHINE), Decimal('10.00'))
+
+    def test_booking_committed_after_a_refresh(self):
+        refresh()
+        timestamp = timezone.now()
+        refresh()
+        booking = Booking.objects.create(journal=self.journal, account='3000', amount=Decimal('5.00'))
+        Booking.objects.filter(pk=booking.pk).update(timestamp=timestamp)
+        refresh()
+        self.assertEqual(self.revenue(MonthlyRevenue.ACCOUNT), Decimal('5.00'))
+
+    def test_rows_counted_once(self):
+        # a settled close and a recent booking, which is pending until it settles
+        self.close(max(timezone.now() - timedelta(hours=1), month_bounds(month_start(timezone.localdate()))[0]))
+        Booking.objects.create(journal=self.journal, account='3000', amount=Decimal('5.00'))
+        for i in range(3):
+            refresh()
+            self.assertEqual(self.revenue(MonthlyRevenue.MACHINE), Decimal('10.00'))
+            self.assertEqual(self.revenue(MonthlyRevenue.ACCOUNT), Decimal('5.00'))
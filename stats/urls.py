@@ -0,0 +1,10 @@
+# django
+from django.urls import path
+
+# local
+from . import views
+
+app_name = 'stats'
+urlpatterns = [
+    path("", views.DashboardView.as_view(), name="dashboard")
+]
@@ -0,0 +1,49 @@
+# base
+from collections import OrderedDict
+
+# django
+from django.views.generic import TemplateView
+from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.utils.functional import SimpleLazyObject
+
+# local
+from .models import MonthlyStats, MonthlyRevenue
+from .rollups import stats_cache  # noqa: F401, registers the namespace of the template
+from digitalFablog.routers import ReplicaReadMixin
+
+
+class DashboardView(PermissionRequiredMixin, ReplicaReadMixin, TemplateView):
+    """Charts of members and revenue per month, read from the rollups only"""
+    permission_required = 'stats.view_dashboard'
+
+    template_name = "stats/dashboard.html"
+    months = 24
+
+    def revenue_table(self, months, dimension):
+        """rows of (label, [amount per month]) for one revenue dimension"""
+        rows = OrderedDict()
+        for revenue in MonthlyRevenue.objects.filter(month__in=months, dimension=dimension).order_by('key'):
+            rows.setdefault(revenue.label or revenue.key, {})[revenue.month] = revenue.amount
+        return [(label, [amounts.get(month, 0) for month in months]) for label, amounts in rows.items()]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # only read when the template misses the cached fragment
+        context['dashboard'] = SimpleLazyObject(self.dashboard)
+        return context
+
+    def dashboard(self):
+        """the rollups shown on the dashboard"""
+        context = {}
+        stats = list(MonthlyStats.objects.order_by('-month')[:self.months])[::-1]
+        months = [x.month for x in stats]
+        max_members = max([x.active_members for x in stats] + [1])
+        context['stats'] = [
+            {'month': x.month, 'active_members': x.active_members, 'new_members': x.new_members,
+             'frozen': x.frozen, 'percent': 100 * x.active_members // max_members}
+            for x in stats]
+        context['months'] = months
+        context['account_revenue'] = self.revenue_table(months, MonthlyRevenue.ACCOUNT)
+        context['machine_revenue'] = self.revenue_table(months, MonthlyRevenue.MACHINE)
+        context['computed_at'] = stats[-1].computed_at if stats else None
+        return context
@@ -0,0 +1,50 @@
+"""
+    local background worker
+
+    Runs short jobs off the request path in a thread pool of the current process. Jobs are not
+    persisted, so they must be safe to lose and to redo (e.g. by a backfill command).
+"""
+# base
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+# django
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_WORKERS', 2),
+                    thread_name_prefix='background')
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception("background job %s failed", func.__name__)
+    finally:
+        # threads get their own connection, don't leak it
+        connection.close()
+
+
+def submit(func, *args, **kwargs):
+    """Run func(*args, **kwargs) in the background worker pool"""
+    return get_executor().submit(_run, func, args, kwargs)
+
+
+def submit_on_commit(func, *args, **kwargs):
+    """Run func(*args, **kwargs) in the background once the current transaction has been committed"""
+    transaction.on_commit(lambda: submit(func, *args, **kwargs))
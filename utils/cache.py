@@ -0,0 +1,202 @@
+"""
+    two tier cache for application data
+
+    Values live in the shared cache (CACHES['default'], common to all worker processes) and, for at most
+    TIERED_CACHE_LOCAL_TIMEOUT seconds, in a small in-process tier in front of it. Keys are grouped in
+    namespaces. Every namespace has a version in the shared cache, which is part of all its keys;
+    invalidating a namespace bumps the version and so orphans all its entries in both tiers at once.
+    Other processes see the new version once their local copy of it expires.
+
+    Every namespace counts its local hits, shared hits and misses per process (see stats()).
+"""
+# base
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# django
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.safestring import mark_safe
+
+MISSING = object()
+
+
+class LocalCache:
+    """Size bounded in-process LRU cache with expiring entries"""
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > settings.TIERED_CACHE_LOCAL_MAX_ENTRIES:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalCache()
+namespaces = {}
+
+
+class Namespace:
+    """
+    A group of cache keys invalidated together.
+
+    `timeout` is the lifetime of entries in the shared cache, `local_timeout` the one in the process
+    (defaults to TIERED_CACHE_LOCAL_TIMEOUT, 0 skips the local tier). Values may be anything picklable
+    except None, which can't be told apart from a miss.
+    """
+
+    def __init__(self, name, timeout=300, local_timeout=None):
+        if name in namespaces:
+            raise ValueError("cache namespace {0} already exists".format(name))
+        self.name = name
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self.counters = Counter()
+        self.version_key = 'ns:{0}:version'.format(name)
+        namespaces[name] = self
+
+    @property
+    def shared(self):
+        return caches['default']
+
+    def get_local_timeout(self):
+        if self.local_timeout is None:
+            return settings.TIERED_CACHE_LOCAL_TIMEOUT
+        return self.local_timeout
+
+    def version(self):
+        version = local_cache.get(self.version_key)
+        if version is MISSING:
+            version = self.shared.get(self.version_key)
+            if version is None:
+                # never reuse an old version, its entries might still be in the cache
+                self.shared.add(self.version_key, int(time.time() * 1000), None)
+                version = self.shared.get(self.version_key)
+            if self.get_local_timeout():
+                local_cache.set(self.version_key, version, self.get_local_timeout())
+        return version
+
+    def make_key(self, key):
+        return '{0}:{1}:{2}'.format(self.name, self.version(), key)
+
+    def get(self, key, default=None):
+        return self._get(self.make_key(key), default)
+
+    def _get(self, full_key, default=None):
+        value = local_cache.get(full_key)
+        if value is not MISSING:
+            self.counters['local_hits'] += 1
+            return value
+        value = self.shared.get(full_key)
+        if value is None:
+            self.counters['misses'] += 1
+            return default
+        self.counters['shared_hits'] += 1
+        if self.get_local_timeout():
+            local_cache.set(full_key, value, self.get_local_timeout())
+        return value
+
+    def set(self, key, value, timeout=None):
+        self._set(self.make_key(key), value, timeout)
+
+    def _set(self, full_key, value, timeout=None):
+        self.shared.set(full_key, value, self.timeout if timeout is None else timeout)
+        if self.get_local_timeout():
+            local_cache.set(full_key, value, self.get_local_timeout())
+
+    def delete(self, key):
+        full_key = self.make_key(key)
+        self.shared.delete(full_key)
+        local_cache.delete(full_key)
+
+    def get_or_set(self, key, default, timeout=None):
+        """Return the cached value of `key`, compute and cache it with the callable `default` on a miss"""
+        # the version is read before computing the value: if the namespace is invalidated meanwhile, the
+        # value is stored under the old version and never served
+        full_key = self.make_key(key)
+        value = self._get(full_key)
+        if value is None:
+            value = default()
+            self._set(full_key, value, timeout)
+        return value
+
+    def query(self, key, queryset, timeout=None):
+        """Cached list of the results of a queryset (or any iterable)"""
+        return self.get_or_set(key, lambda: list(queryset), timeout)
+
+    def fragment(self, key, render, timeout=None):
+        """Cached html fragment, `render` returns the html on a miss"""
+        return mark_safe(self.get_or_set(key, lambda: str(render()), timeout))
+
+    def invalidate(self):
+        """Drop all entries of the namespace, once the current transaction is committed"""
+        def bump():
+            try:
+                self.shared.incr(self.version_key)
+            except ValueError:
+                self.shared.set(self.version_key, int(time.time() * 1000), None)
+            local_cache.delete(self.version_key)
+        transaction.on_commit(bump)
+
+    def invalidate_on(self, *models):
+        """Invalidate the namespace whenever an instance of one of the models is saved or deleted"""
+        for model in models:
+            for signal in (post_save, post_delete):
+                signal.connect(self._invalidate_receiver, sender=model, weak=False,
+                               dispatch_uid='tiered_cache:{0}'.format(self.name))
+
+    def _invalidate_receiver(self, **kwargs):
+        self.invalidate()
+
+
+def hash_key(*parts):
+    """Short cache key for arbitrary (e.g. SQL) parts"""
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def stats():
+    """Hits and misses of all namespaces in this process"""
+    result = {}
+    for name, namespace in sorted(namespaces.items()):
+        counters = namespace.counters
+        lookups = counters['local_hits'] + counters['shared_hits'] + counters['misses']
+        result[name] = {
+            'local_hits': counters['local_hits'],
+            'shared_hits': counters['shared_hits'],
+            'misses': counters['misses'],
+            'hit_ratio': round(1 - counters['misses'] / lookups, 3) if lookups else None,
+        }
+    return result
+
+
+def clear_local():
+    """Empty the in-process tier, e.g. after clearing the shared cache"""
+    local_cache.clear()
@@ -0,0 +1,38 @@
+"""
+    template tags of the two tier cache (see utils.cache)
+
+    {% load cache_tags %}
+    {% cachedfragment "stats" "dashboard" LANGUAGE_CODE %} ... {% endcachedfragment %}
+
+    caches the enclosed fragment in the given namespace, under a key made of the remaining arguments.
+"""
+# django
+from django import template
+
+# local
+from .cache import hash_key, namespaces
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+
+    def __init__(self, nodelist, namespace, vary_on):
+        self.nodelist = nodelist
+        self.namespace = namespace
+        self.vary_on = vary_on
+
+    def render(self, context):
+        namespace = namespaces[self.namespace.resolve(context)]
+        key = 'fragment:' + hash_key(*[var.resolve(context) for var in self.vary_on])
+        return namespace.fragment(key, lambda: self.nodelist.render(context))
+
+
+@register.tag('cachedfragment')
+def do_cachedfragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError("'{0}' tag requires at least a namespace.".format(bits[0]))
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(x) for x in bits[2:]])
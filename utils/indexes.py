@@ -0,0 +1,37 @@
+"""
+    partial indexes
+"""
+# django
+from django.db import models
+
+
+class PartialIndex(models.Index):
+    """
+    Index over the rows matching `where`, a raw SQL condition on the columns of the table:
+
+        PartialIndex(fields=['fabday'], where='closed_at IS NULL', name='fablog_open_fabday_idx')
+
+    Much smaller than a full index when few rows match, e.g. open fablogs among all fablogs. The planner only
+    uses it for queries with the same condition. With unique=True no two matching rows may have the same
+    values, e.g. one queued job per call. Supported by PostgreSQL and SQLite. Django 2.2 adds the `condition`
+    argument to Index and UniqueConstraint, which replace this class.
+    """
+
+    def __init__(self, *, where, unique=False, **kwargs):
+        self.where = where
+        self.unique = unique
+        super().__init__(**kwargs)
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        statement = super().create_sql(model, schema_editor, using=using, **kwargs)
+        statement.template = '{0} WHERE {1}'.format(statement.template, self.where.replace('%', '%%'))
+        if self.unique:
+            statement.template = statement.template.replace('CREATE INDEX', 'CREATE UNIQUE INDEX', 1)
+        return statement
+
+    def deconstruct(self):
+        path, args, kwargs = super().deconstruct()
+        kwargs['where'] = self.where
+        if self.unique:
+            kwargs['unique'] = True
+        return path, args, kwargs
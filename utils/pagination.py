@@ -0,0 +1,159 @@
+"""
+    keyset pagination and cheap row count estimates
+"""
+# base
+import base64
+import json
+
+# django
+from django.db import connections
+from django.db.models import Field, Lookup
+from django.db.models.expressions import Col
+
+# local
+from .cache import Namespace, hash_key
+
+ESTIMATE_TIMEOUT = 300
+
+count_cache = Namespace('counts', timeout=ESTIMATE_TIMEOUT)
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class RowValueLookup(Lookup):
+    """
+    `field__seek_gt=(value, pk)` compares the row values (field, pk) > (value, pk), which an index on
+    (field, pk) answers with a range scan from that position. The equivalent
+    `field > value OR (field = value AND pk > pk)` can't be used as the start of an index scan.
+    """
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, params = compiler.compile(self.lhs)
+        pk = self.lhs.target.model._meta.pk
+        pk_sql, pk_params = compiler.compile(Col(self.lhs.alias, pk))
+        value, pk_value = self.rhs
+        params = list(params) + list(pk_params) + [
+            self.lhs.output_field.get_db_prep_value(value, connection), pk.get_db_prep_value(pk_value, connection)]
+        return '({0}, {1}) {2} (%s, %s)'.format(lhs_sql, pk_sql, self.operator), params
+
+
+@Field.register_lookup
+class SeekAfter(RowValueLookup):
+    lookup_name = 'seek_gt'
+    operator = '>'
+
+
+@Field.register_lookup
+class SeekBefore(RowValueLookup):
+    lookup_name = 'seek_lt'
+    operator = '<'
+
+
+class KeysetPaginator:
+    """
+    Keyset ("seek") pagination over a queryset ordered by one field and the primary key.
+
+    Unlike OFFSET pagination every page costs the same, given an index on (field, pk). NULL values sort
+    last ascending and first descending, like a btree index on (field, pk) read forwards and backwards.
+    The rows with and without a value are read separately, each as a range of the index, a page at the
+    border of both needs a second query.
+    """
+
+    def __init__(self, queryset, field, descending=False, per_page=50):
+        self.queryset = queryset
+        self.field = field
+        self.model_field = queryset.model._meta.get_field(field)
+        self.descending = descending
+        self.per_page = per_page
+
+    def encode_cursor(self, obj):
+        value = self.model_field.value_to_string(obj) if getattr(obj, self.field) is not None else None
+        data = json.dumps([value, obj.pk]).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            return self.model_field.to_python(value), int(pk)
+        except Exception:
+            return None
+
+    def parts(self):
+        """The parts in page order: False for the rows with a value, True for the NULL rows"""
+        if not self.model_field.null:
+            return [False]
+        return [True, False] if self.descending else [False, True]
+
+    def seek(self, null, position=None):
+        """The rows of one part, in page order, after `position` if it lies in that part"""
+        order = '-' if self.descending else ''
+        if null:
+            queryset = self.queryset.filter(**{self.field + '__isnull': True}).order_by(order + 'pk')
+            if position is not None:
+                queryset = queryset.filter(**{'pk__lt' if self.descending else 'pk__gt': position[1]})
+            return queryset
+        queryset = self.queryset.order_by(order + self.field, order + 'pk')
+        if position is not None:
+            lookup = '__seek_lt' if self.descending else '__seek_gt'
+            return queryset.filter(**{self.field + lookup: position})
+        if self.model_field.null:
+            queryset = queryset.filter(**{self.field + '__isnull': False})
+        return queryset
+
+    def page(self, cursor=None):
+        """Return the page following `cursor`, the first page if the cursor is empty or invalid"""
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is not None and position[0] is None and not self.model_field.null:
+            position = None
+        if position is None:
+            cursor = None
+        parts = self.parts()
+        if position is not None and self.model_field.null:
+            # continue in the part of the cursor
+            parts = parts[parts.index(position[0] is None):]
+        # fetch one row more to know whether there is a next page
+        object_list = []
+        for null in parts:
+            part_position = position if position is not None and (position[0] is None) == null else None
+            object_list += list(self.seek(null, part_position)[:self.per_page + 1 - len(object_list)])
+            if len(object_list) > self.per_page:
+                break
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = self.encode_cursor(object_list[-1])
+        return KeysetPage(object_list, next_cursor, cursor)
+
+
+def estimate_count(queryset, timeout=ESTIMATE_TIMEOUT):
+    """
+    Estimated number of rows of a queryset, cached.
+
+    On PostgreSQL this is the planner estimate, which is cheap however large the table is. Other
+    databases fall back to an exact count.
+    """
+    sql, params = queryset.query.sql_with_params()
+
+    def count():
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return int(plan[0]['Plan']['Plan Rows'])
+        return queryset.count()
+    return count_cache.get_or_set(hash_key(sql, params), count, timeout)
@@ -0,0 +1,99 @@
+"""
+    effective-dated price lookups
+
+    Price tables are tiny and change rarely, so every process keeps a sorted copy of them in memory and
+    answers "price at timestamp" with a binary search instead of a query per priced row.
+"""
+# base
+import time
+from bisect import bisect_right
+from datetime import datetime
+from threading import Lock
+
+# django
+from django.apps import apps
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+# valid_from of the prices that were in effect before the price history was recorded
+HISTORY_START = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+class EffectivePriceIndex:
+    """
+    Process level cache of one effective-dated price table.
+
+    `model` is an 'app_label.ModelName' string of a model with a foreign key `owner_field`, a
+    `valid_from` datetime and a `price_field`. A price is valid from its `valid_from` until the next
+    price of the same owner (and variant, if the table has a `variant_field`). Timestamps before the
+    first recorded price resolve to the first price.
+    """
+
+    def __init__(self, model, owner_field, price_field, variant_field=None, ttl=300):
+        self.model = model
+        self.owner_field = owner_field
+        self.price_field = price_field
+        self.variant_field = variant_field
+        self.ttl = ttl
+        self._index = None
+        self._loaded_at = 0
+        self._lock = Lock()
+        # drop the cache of this process whenever a price changes
+        post_save.connect(self._invalidate_receiver, sender=model, weak=False)
+        post_delete.connect(self._invalidate_receiver, sender=model, weak=False)
+
+    def _invalidate_receiver(self, **kwargs):
+        self.invalidate()
+
+    def invalidate(self):
+        self._index = None
+
+    def _load(self):
+        Model = apps.get_model(self.model)
+        owner_attname = Model._meta.get_field(self.owner_field).attname
+        if self.variant_field:
+            rows = Model.objects.order_by(owner_attname, self.variant_field, 'valid_from').values_list(
+                owner_attname, self.variant_field, 'valid_from', self.price_field)
+            rows = (((owner_id, variant), valid_from, price) for owner_id, variant, valid_from, price in rows)
+        else:
+            rows = Model.objects.order_by(owner_attname, 'valid_from').values_list(
+                owner_attname, 'valid_from', self.price_field)
+        index = {}
+        for key, valid_from, price in rows:
+            dates, prices = index.setdefault(key, ([], []))
+            dates.append(valid_from)
+            prices.append(price)
+        return index
+
+    def get_index(self):
+        index = self._index
+        if index is None or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                index = self._load()
+                self._index = index
+                self._loaded_at = time.monotonic()
+        return index
+
+    @staticmethod
+    def _resolve(entry, timestamp):
+        dates, prices = entry
+        if timestamp is None:
+            return prices[-1]
+        position = bisect_right(dates, timestamp) - 1
+        return prices[max(position, 0)]
+
+    def price_at(self, owner_id, timestamp, default=None, variant=''):
+        """Return the price of `owner_id` valid at `timestamp`, or `default` if it has no prices"""
+        key = (owner_id, variant) if self.variant_field else owner_id
+        entry = self.get_index().get(key)
+        if entry is None:
+            return default() if callable(default) else default
+        return self._resolve(entry, timestamp)
+
+    def variants(self, owner_id):
+        """Return the sorted variants `owner_id` has prices for"""
+        return sorted(variant for key_owner_id, variant in self.get_index() if key_owner_id == owner_id)
+
+    def prices_at(self, timestamp):
+        """Return a dict of all prices valid at `timestamp`, keyed like the index"""
+        return {key: self._resolve(entry, timestamp) for key, entry in self.get_index().items()}
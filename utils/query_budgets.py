@@ -0,0 +1,61 @@
+"""
+    query count budgets of the views
+
+    Every url of the fablog, cashier and members apps has an entry in BUDGETS. The check_query_budgets
+    command renders each of them against datasets of growing size and fails if a view needs more queries
+    than its budget, or more queries on a larger dataset (i.e. a lookup per row crept into a template).
+"""
+# base
+from collections import namedtuple
+
+
+class ViewBudget(namedtuple('ViewBudget', 'url_name method args data max_queries')):
+    """
+    Budget of one view.
+
+    `args` and `data` are names of probe attributes (see check_query_budgets) resolving to the url
+    arguments and the POST data, `max_queries` the number of queries the view may run.
+    """
+
+    def __new__(cls, url_name, method='get', args=None, data=None, max_queries=10):
+        return super().__new__(cls, url_name, method, args, data, max_queries)
+
+    @property
+    def name(self):
+        return '{0} {1}'.format(self.method.upper(), self.url_name)
+
+
+BUDGETS = [
+    # fablog/urls.py
+    ViewBudget('fablog:home', max_queries=10),
+    ViewBudget('fablog:create', max_queries=1),
+    ViewBudget('fablog:update', args='open_fablog', max_queries=13),
+    ViewBudget('fablog:update', method='post', args='open_fablog', data='update_data', max_queries=29),
+    ViewBudget('fablog:detail', args='closed_fablog', max_queries=9),
+    ViewBudget('fablog:payment', args='open_fablog', max_queries=9),
+    ViewBudget('fablog:payment', method='post', args='open_fablog', data='payment_data', max_queries=48),
+    # cashier/urls.py
+    ViewBudget('cashier:account', args='journal', max_queries=4),
+    ViewBudget('cashier:new_cash_count', max_queries=2),
+    ViewBudget('cashier:new_cash_count', method='post', data='cash_count_data', max_queries=9),
+    ViewBudget('cashier:daily_report', args='fabday', max_queries=17),
+    ViewBudget('cashier:daily_report_csv', args='fabday', max_queries=17),
+    # members/urls.py
+    ViewBudget('members:members_list', max_queries=1),
+    ViewBudget('members:members_list_csv', max_queries=1),
+    ViewBudget('members:legitimation', args='legitimation', max_queries=1),
+]
+
+
+def form_data(form, data):
+    """Add the current values of a form to data, like a browser would submit them"""
+    for name, field in form.fields.items():
+        value = form[name].value()
+        if value is None or value is False:
+            continue
+        if value is True:
+            value = 'on'
+        elif hasattr(field, 'prepare_value') and not isinstance(value, (list, tuple)):
+            value = field.prepare_value(value)
+        data[form.add_prefix(name)] = value if isinstance(value, (list, tuple)) else str(value)
+    return data
@@ -0,0 +1,155 @@
+"""
+    template warmup and render profiling
+"""
+# base
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+# django
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.base import Node, Template, TokenType
+from django.template.loaders.cached import Loader as CachedLoader
+from django.template.utils import get_app_template_dirs
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def template_names(engine):
+    """Names of all templates in the template directories of an engine"""
+    directories = list(engine.dirs)
+    if engine.app_dirs or any('app_directories' in str(loader) for loader in engine.loaders):
+        directories += get_app_template_dirs('templates')
+    names = set()
+    for directory in directories:
+        for root, _dirs, files in os.walk(str(directory)):
+            for name in files:
+                if name.endswith(TEMPLATE_EXTENSIONS):
+                    names.add(os.path.relpath(os.path.join(root, name), str(directory)).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_templates():
+    """
+    Compile all templates into the cached template loader, so the first requests of a worker don't.
+
+    Does nothing without the cached loader. Returns the number of templates compiled.
+    """
+    compiled = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        if not any(isinstance(loader, CachedLoader) for loader in backend.engine.template_loaders):
+            continue
+        for name in template_names(backend.engine):
+            try:
+                backend.get_template(name)
+                compiled += 1
+            except (TemplateDoesNotExist, TemplateSyntaxError) as e:
+                # e.g. templates of optional features of installed apps
+                logger.debug('not warming template %s: %s', name, e)
+    return compiled
+
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+def template_name(origin):
+    return getattr(origin, 'template_name', None) or getattr(origin, 'name', None) or '<string>'
+
+
+def install():
+    """Wrap template and tag rendering, once per process. The wrappers only measure inside a TemplateProfile"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        render_template = Template._render
+        render_node = Node.render_annotated
+
+        def _render(self, context):
+            profile = getattr(_local, 'profile', None)
+            if profile is None:
+                return render_template(self, context)
+            return profile.measure(profile.templates, template_name(self.origin), render_template, self, context)
+
+        def render_annotated(self, context):
+            profile = getattr(_local, 'profile', None)
+            token = getattr(self, 'token', None)
+            if profile is None or token is None or token.token_type != TokenType.BLOCK:
+                return render_node(self, context)
+            contents = token.contents if len(token.contents) <= 80 else token.contents[:77] + '...'
+            key = '{0}:{1} {{% {2} %}}'.format(template_name(self.origin), token.lineno, contents)
+            return profile.measure(profile.tags, key, render_node, self, context)
+
+        Template._render = _render
+        Node.render_annotated = render_annotated
+        _installed = True
+
+
+class TemplateProfile:
+    """
+    Time spent rendering each template and each template tag ({% include %}, {% bootstrap_field %}, ...)
+    in the current thread, while the profile is active:
+
+        with TemplateProfile() as profile:
+            response = client.get(url)
+        print(profile.report())
+
+    Every entry has a count, the total time (including nested templates and tags) and the self time
+    (excluding them).
+    """
+
+    def __init__(self):
+        self.templates = defaultdict(lambda: [0, 0.0, 0.0])
+        self.tags = defaultdict(lambda: [0, 0.0, 0.0])
+        self._stack = []
+
+    def __enter__(self):
+        install()
+        _local.profile = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.profile = None
+
+    def measure(self, entries, key, render, *args):
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return render(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            entry = entries[key]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] += elapsed - nested
+
+    def total(self):
+        """Time spent rendering templates, outermost templates only"""
+        return sum(entry[2] for entry in self.templates.values()) + sum(entry[2] for entry in self.tags.values())
+
+    def rows(self, limit=None):
+        """(kind, key, count, total_ms, self_ms) by descending self time"""
+        rows = [('template', key) + tuple(entry) for key, entry in self.templates.items()]
+        rows += [('tag', key) + tuple(entry) for key, entry in self.tags.items()]
+        rows = [(kind, key, count, total * 1000, own * 1000) for kind, key, count, total, own in rows]
+        rows.sort(key=lambda row: row[4], reverse=True)
+        return rows[:limit]
+
+    def report(self, limit=20, per=1):
+        """Table of the most expensive entries, times divided by `per` (e.g. the number of requests)"""
+        lines = ["{0:>9} {1:>9} {2:>7}  {3}".format('self ms', 'total ms', 'count', 'template / tag')]
+        for kind, key, count, total, own in self.rows(limit):
+            lines.append("{0:>9.2f} {1:>9.2f} {2:>7}  {3}".format(own / per, total / per, count // per, key))
+        return "\n".join(lines)